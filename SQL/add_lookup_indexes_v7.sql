@@ -0,0 +1,27 @@
+-- Add indexes for the identifier lookups done by the DBAdaptor find_*
+-- methods to an existing v7 database. Without these,
+-- find_protein_ids() by sym, geneid or stringid, the find_*_by_xref()
+-- methods, incl_alias lookups and find_nhprotein_ids() are full table
+-- scans. The xref and alias indexes include the id columns the lookups
+-- return, so they are answered from the index alone.
+-- To confirm the find_* queries use them, run:
+--   python3 chk-Indexes.py --dbname tcrd7
+
+ALTER TABLE `protein`
+  ADD KEY `protein_idx3` (`sym`),
+  ADD KEY `protein_idx4` (`geneid`),
+  ADD KEY `protein_idx5` (`stringid`);
+
+ALTER TABLE `alias`
+  ADD KEY `alias_idx3` (`type`,`value`,`protein_id`);
+
+ALTER TABLE `xref`
+  ADD KEY `xref_idx7` (`xtype`,`value`,`protein_id`,`target_id`);
+
+ALTER TABLE `nhprotein`
+  ADD KEY `nhprotein_idx2` (`sym`,`species`),
+  ADD KEY `nhprotein_idx3` (`geneid`,`species`),
+  ADD KEY `nhprotein_idx4` (`name`,`species`);
+
+ALTER TABLE `uberon_xref`
+  ADD KEY `uberon_xref_idx2` (`db`,`value`);
@@ -0,0 +1,12 @@
+-- Add name indexes to the mondo and uberon tables of an existing v7
+-- database, for find_mondoid() and find_uberon_id() name lookups. These
+-- compare name = %s, which is case-insensitive under the tables'
+-- utf8_unicode_ci collation. (They used to compare LOWER(name) = %s,
+-- which no index can serve.) name is a text column, so the indexes are
+-- on a 255 character prefix.
+
+ALTER TABLE `mondo`
+  ADD KEY `mondo_idx1` (`name`(255));
+
+ALTER TABLE `uberon`
+  ADD KEY `uberon_idx1` (`name`(255));
@@ -0,0 +1,38 @@
+-- Add the target_summary table to an existing v7 database.
+-- One row per target with its (first) component protein's identifiers,
+-- TDL/family, TIN-X novelty, JensenLab PubMed score and annotation
+-- counts, for listing and filtering queries. It is rebuilt by
+-- DBAdaptor.refresh_target_summary(), which the loaders that change
+-- these values call when they finish. After creating it, populate it with:
+--   python3 -c "from TCRD.DBAdaptor import DBAdaptor; print(DBAdaptor({'dbname': 'tcrd7'}).refresh_target_summary())"
+
+DROP TABLE IF EXISTS `target_summary`;
+CREATE TABLE `target_summary` (
+  `target_id` int(11) NOT NULL,
+  `protein_id` int(11) NOT NULL,
+  `name` varchar(255) COLLATE utf8_unicode_ci NOT NULL,
+  `sym` varchar(20) COLLATE utf8_unicode_ci DEFAULT NULL,
+  `uniprot` varchar(20) COLLATE utf8_unicode_ci NOT NULL,
+  `geneid` int(11) DEFAULT NULL,
+  `tdl` enum('Tclin+','Tclin','Tchem+','Tchem','Tbio','Tgray','Tdark') COLLATE utf8_unicode_ci DEFAULT NULL,
+  `fam` enum('Enzyme','Epigenetic','GPCR','IC','Kinase','NR','oGPCR','TF','TF; Epigenetic','Transporter') COLLATE utf8_unicode_ci DEFAULT NULL,
+  `idg` tinyint(1) NOT NULL DEFAULT '0',
+  `novelty` decimal(34,16) DEFAULT NULL,
+  `pubmed_score` decimal(12,6) DEFAULT NULL,
+  `ab_count` int(11) NOT NULL DEFAULT '0',
+  `generif_count` int(11) NOT NULL DEFAULT '0',
+  `pubmed_count` int(11) NOT NULL DEFAULT '0',
+  `goa_count` int(11) NOT NULL DEFAULT '0',
+  `disease_count` int(11) NOT NULL DEFAULT '0',
+  `ortholog_count` int(11) NOT NULL DEFAULT '0',
+  `drug_activity_count` int(11) NOT NULL DEFAULT '0',
+  `cmpd_activity_count` int(11) NOT NULL DEFAULT '0',
+  PRIMARY KEY (`target_id`),
+  KEY `target_summary_idx1` (`protein_id`),
+  KEY `target_summary_idx2` (`sym`),
+  KEY `target_summary_idx3` (`uniprot`),
+  KEY `target_summary_idx4` (`tdl`,`fam`),
+  KEY `target_summary_idx5` (`idg`,`tdl`),
+  KEY `target_summary_idx6` (`novelty`),
+  CONSTRAINT `fk_target_summary__target` FOREIGN KEY (`target_id`) REFERENCES `target` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
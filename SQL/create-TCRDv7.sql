@@ -31,6 +31,7 @@ CREATE TABLE `alias` (
   PRIMARY KEY (`id`),
   KEY `alias_idx1` (`protein_id`),
   KEY `alias_idx2` (`dataset_id`),
+  KEY `alias_idx3` (`type`,`value`,`protein_id`),
   CONSTRAINT `fk_alias_dataset` FOREIGN KEY (`dataset_id`) REFERENCES `dataset` (`id`),
   CONSTRAINT `fk_alias_protein` FOREIGN KEY (`protein_id`) REFERENCES `protein` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
@@ -1194,7 +1195,10 @@ CREATE TABLE `nhprotein` (
   `taxid` int(11) NOT NULL,
   `geneid` int(11) DEFAULT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE KEY `nhprotein_idx1` (`uniprot`)
+  UNIQUE KEY `nhprotein_idx1` (`uniprot`),
+  KEY `nhprotein_idx2` (`sym`,`species`),
+  KEY `nhprotein_idx3` (`geneid`,`species`),
+  KEY `nhprotein_idx4` (`name`,`species`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -1644,7 +1648,10 @@ CREATE TABLE `protein` (
   `dtoclass` varchar(255) COLLATE utf8_unicode_ci DEFAULT NULL,
   PRIMARY KEY (`id`),
   UNIQUE KEY `protein_idx1` (`uniprot`),
-  UNIQUE KEY `protein_idx2` (`name`)
+  UNIQUE KEY `protein_idx2` (`name`),
+  KEY `protein_idx3` (`sym`),
+  KEY `protein_idx4` (`geneid`),
+  KEY `protein_idx5` (`stringid`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -1938,6 +1945,53 @@ LOCK TABLES `target` WRITE;
 /*!40000 ALTER TABLE `target` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `target_summary`
+--
+
+DROP TABLE IF EXISTS `target_summary`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `target_summary` (
+  `target_id` int(11) NOT NULL,
+  `protein_id` int(11) NOT NULL,
+  `name` varchar(255) COLLATE utf8_unicode_ci NOT NULL,
+  `sym` varchar(20) COLLATE utf8_unicode_ci DEFAULT NULL,
+  `uniprot` varchar(20) COLLATE utf8_unicode_ci NOT NULL,
+  `geneid` int(11) DEFAULT NULL,
+  `tdl` enum('Tclin+','Tclin','Tchem+','Tchem','Tbio','Tgray','Tdark') COLLATE utf8_unicode_ci DEFAULT NULL,
+  `fam` enum('Enzyme','Epigenetic','GPCR','IC','Kinase','NR','oGPCR','TF','TF; Epigenetic','Transporter') COLLATE utf8_unicode_ci DEFAULT NULL,
+  `idg` tinyint(1) NOT NULL DEFAULT '0',
+  `novelty` decimal(34,16) DEFAULT NULL,
+  `pubmed_score` decimal(12,6) DEFAULT NULL,
+  `ab_count` int(11) NOT NULL DEFAULT '0',
+  `generif_count` int(11) NOT NULL DEFAULT '0',
+  `pubmed_count` int(11) NOT NULL DEFAULT '0',
+  `goa_count` int(11) NOT NULL DEFAULT '0',
+  `disease_count` int(11) NOT NULL DEFAULT '0',
+  `ortholog_count` int(11) NOT NULL DEFAULT '0',
+  `drug_activity_count` int(11) NOT NULL DEFAULT '0',
+  `cmpd_activity_count` int(11) NOT NULL DEFAULT '0',
+  PRIMARY KEY (`target_id`),
+  KEY `target_summary_idx1` (`protein_id`),
+  KEY `target_summary_idx2` (`sym`),
+  KEY `target_summary_idx3` (`uniprot`),
+  KEY `target_summary_idx4` (`tdl`,`fam`),
+  KEY `target_summary_idx5` (`idg`,`tdl`),
+  KEY `target_summary_idx6` (`novelty`),
+  CONSTRAINT `fk_target_summary__target` FOREIGN KEY (`target_id`) REFERENCES `target` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `target_summary`
+--
+
+LOCK TABLES `target_summary` WRITE;
+/*!40000 ALTER TABLE `target_summary` DISABLE KEYS */;
+/*!40000 ALTER TABLE `target_summary` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `tdl_info`
 --
@@ -2206,7 +2260,8 @@ CREATE TABLE `uberon` (
   `name` text COLLATE utf8_unicode_ci NOT NULL,
   `def` text COLLATE utf8_unicode_ci,
   `comment` text COLLATE utf8_unicode_ci,
-  PRIMARY KEY (`uid`)
+  PRIMARY KEY (`uid`),
+  KEY `uberon_idx1` (`name`(255))
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -2256,6 +2311,7 @@ CREATE TABLE `uberon_xref` (
   `value` varchar(255) COLLATE utf8_unicode_ci NOT NULL,
   PRIMARY KEY (`uid`,`db`,`value`),
   KEY `uberon_xref_idx1` (`uid`),
+  KEY `uberon_xref_idx2` (`db`,`value`),
   CONSTRAINT `fk_uberon_xref__uberon` FOREIGN KEY (`uid`) REFERENCES `uberon` (`uid`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -2293,6 +2349,7 @@ CREATE TABLE `xref` (
   KEY `xref_idx2` (`target_id`),
   KEY `xref_idx4` (`protein_id`),
   KEY `xref_idx6` (`dataset_id`),
+  KEY `xref_idx7` (`xtype`,`value`,`protein_id`,`target_id`),
   KEY `fk_xref_nhprotein` (`nhprotein_id`),
   CONSTRAINT `fk_xref__xref_type` FOREIGN KEY (`xtype`) REFERENCES `xref_type` (`name`),
   CONSTRAINT `fk_xref_dataset` FOREIGN KEY (`dataset_id`) REFERENCES `dataset` (`id`),
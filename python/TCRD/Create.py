@@ -8,8 +8,45 @@ Time-stamp: <2021-09-28 12:10:00 smathias>
 '''
 from mysql.connector import Error
 from contextlib import closing
+import os,shutil,tempfile
 
 class CreateMethodsMixin:
+  # Column specs used by ins_many() to validate rows the same way the
+  # single-row ins_* methods do. Each table maps to a tuple of:
+  #   required columns,
+  #   groups of alternative columns (the first one present in a row is
+  #   used, as in eg. ins_xref()'s protein_id/target_id/nhprotein_id),
+  #   optional columns,
+  #   whether duplicate rows are silently skipped (as ins_xref() does)
+  _BulkInsertSpecs = {
+    'provenance': (['dataset_id', 'table_name'], [], ['column_name', 'where_clause', 'comment'], False),
+    'alias': (['protein_id', 'type', 'dataset_id', 'value'], [], [], False),
+    'xref': (['xtype', 'dataset_id', 'value'], [['protein_id', 'target_id', 'nhprotein_id']], ['xtra'], True),
+    'tdl_info': (['itype'], [['protein_id', 'target_id'], ['string_value', 'integer_value', 'number_value', 'boolean_value', 'date_value']], [], False),
+    'goa': (['protein_id', 'go_id'], [], ['go_term', 'evidence', 'goeco', 'assigned_by'], False),
+    'pathway': (['pwtype', 'name'], [['protein_id', 'target_id']], ['id_in_source', 'description', 'url'], False),
+    'disease': (['dtype', 'name'], [['protein_id', 'nhprotein_id']], ['did', 'evidence', 'zscore', 'conf', 'description', 'reference', 'drug_name', 'log2foldchange', 'pvalue', 'score', 'source', 'O2s', 'S2O'], False),
+    'phenotype': (['ptype'], [['protein_id', 'nhprotein_id']], ['trait', 'top_level_term_id', 'top_level_term_name', 'term_id', 'term_name', 'term_description', 'p_value', 'percentage_change', 'effect_size', 'procedure_name', 'parameter_name', 'gp_assoc', 'statistical_method', 'sex'], False),
+    'expression': (['etype', 'tissue'], [['protein_id', 'target_id']], ['qual_value', 'string_value', 'number_value', 'boolean_value', 'pubmed_id', 'evidence', 'zscore', 'conf', 'oid', 'confidence', 'url', 'cell_id', 'uberon_id'], False),
+    'feature': (['protein_id', 'type'], [], ['description', 'srcid', 'evidence', 'position', 'begin', 'end'], False),
+    'drgc_resource': (['rssid', 'resource_type', 'target_id', 'json'], [], [], False),
+    'pmscore': (['protein_id', 'year', 'score'], [], [], False),
+    'extlink': (['protein_id', 'source', 'url'], [], [], False),
+    'drug_activity': (['target_id', 'drug', 'dcid', 'has_moa'], [], ['act_value', 'act_type', 'action_type', 'source', 'reference', 'smiles', 'cmpd_chemblid', 'cmpd_pubchem_cid', 'nlm_drug_info'], False),
+    'cmpd_activity': (['target_id', 'catype', 'cmpd_id_in_src'], [], ['cmpd_name_in_src', 'smiles', 'act_value', 'act_type', 'reference', 'pubmed_ids', 'cmpd_pubchem_cid'], False),
+    'tinx_novelty': (['protein_id', 'score'], [], [], False),
+    'tinx_disease': (['doid', 'name'], [], ['parent_doid', 'num_children', 'summary', 'num_important_targets', 'score'], False),
+    'tinx_importance': (['protein_id', 'disease_id', 'score'], [], [], False),
+    'tinx_articlerank': (['importance_id', 'pmid', 'rank'], [], [], False),
+    'tiga': (['protein_id', 'ensg', 'efoid', 'trait'], [], ['n_study', 'n_snp', 'n_snpw', 'geneNtrait', 'geneNstudy', 'traitNgene', 'traitNstudy', 'pvalue_mlog_median', 'pvalue_mlog_max', 'or_median', 'n_beta', 'study_N_mean', 'rcras', 'meanRank', 'meanRankScore'], False),
+    'tiga_provenance': (['ensg', 'efoid', 'study_acc', 'pubmedid'], [], [], False),
+    'tdl_update_log': (['target_id', 'new_tdl', 'person'], [], ['old_tdl', 'explanation', 'application', 'app_version'], False),
+  }
+  _BulkInsertMaxRows = 10000
+  # characters the connector escapes with a backslash in statement text
+  _SQLEscapeChars = ('\\', "'", '"', '\0', '\n', '\r', '\x1a')
+  # max number of server warnings from a LOAD DATA to write to the log
+  _BulkLoadMaxWarnings = 20
   
   def ins_dataset(self, init):
     if 'name' in init and 'source' in init :
@@ -153,7 +190,7 @@ class CreateMethodsMixin:
     self._logger.debug(f"SQLpat: {sql}")
     self._logger.debug(f"SQLparams: {params}")
     protein_id = None
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql) as curs:
       try:
         curs.execute(sql, tuple(params))
         protein_id = curs.lastrowid
@@ -316,7 +353,7 @@ class CreateMethodsMixin:
     self._logger.debug(f"SQLpat: {sql}")
     self._logger.debug(f"SQLparams: {params}")
     protein_id = None
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql) as curs:
       try:
         curs.execute(sql, params)
       except Error as e:
@@ -374,7 +411,7 @@ class CreateMethodsMixin:
     sql += " VALUES (%s, %s, %s)"
     self._logger.debug(f"SQLpat: {sql}")
     self._logger.debug(f"SQLparams: {xid}, {itype}, {value}")
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql) as curs:
       try:
         curs.execute(sql, (xid, itype, value))
       except Error as  e:
@@ -1044,3 +1081,253 @@ class CreateMethodsMixin:
         self._conn.rollback()
         return False
     return True
+
+  def ins_many(self, table, rows, commit=True):
+    '''
+    Function  : Insert many rows into a table using multi-row INSERT statements.
+    Arguments : A table name, a list of dictionaries as would be sent to the
+                corresponding ins_* method, and an optional boolean
+    Returns   : Integer count of rows inserted, or False on error
+    Example   : ct = dba.ins_many('disease', [{'protein_id': 42, 'dtype': 'DisGeNET', 'name': 'Asthma'}, ...])
+    Scope     : Public
+    Comments  : Rows are validated as the single-row ins_* methods do;
+                invalid rows are skipped with a warning. Rows with the same
+                set of columns are grouped and inserted in batches sized to
+                fit within the server's max_allowed_packet.
+    '''
+    if table not in self._BulkInsertSpecs:
+      self.warning(f"Unsupported table sent to ins_many(): {table}")
+      return False
+    (reqcols, altcols, optcols, ignore) = self._BulkInsertSpecs[table]
+    groups = {} # column tuple => list of parameter tuples
+    bad_ct = 0
+    for init in rows:
+      cols = [col for col in reqcols if col in init]
+      if len(cols) != len(reqcols):
+        bad_ct += 1
+        continue
+      valid = True
+      for alts in altcols:
+        found = [col for col in alts if col in init]
+        if found:
+          cols.append(found[0])
+        else:
+          valid = False
+          break
+      if not valid:
+        bad_ct += 1
+        continue
+      cols.extend([col for col in optcols if col in init])
+      cols = tuple(cols)
+      if cols not in groups:
+        groups[cols] = []
+      groups[cols].append(tuple([init[col] for col in cols]))
+    if bad_ct:
+      self.warning(f"Skipped {bad_ct} invalid rows sent to ins_many() for table {table}")
+      self._logger.warning(f"Skipped {bad_ct} invalid rows sent to ins_many() for table {table}")
+    max_bytes = self._get_max_allowed_packet()
+    row_ct = 0
+    with closing(self._conn.cursor()) as curs:
+      for cols,params_list in groups.items():
+        max_rows = self._BulkInsertMaxRows
+        if self._max_params:
+          # backends with a cap on bound parameters (ie. SQLite)
+          max_rows = min(max_rows, self._max_params // len(cols))
+        if ignore:
+          sqlhead = "INSERT IGNORE INTO %s (%s) VALUES " % (table, ','.join(cols))
+        else:
+          sqlhead = "INSERT INTO %s (%s) VALUES " % (table, ','.join(cols))
+        rowpat = '(%s)' % ','.join(['%s']*len(cols))
+        batch = []
+        batch_bytes = len(sqlhead)
+        for params in params_list:
+          # size of this row once rendered into the statement
+          row_bytes = sum([self._sql_bytes(v) for v in params]) + 4*len(params) + 3
+          if batch and (batch_bytes + row_bytes > max_bytes or len(batch) >= max_rows):
+            ct = self._ins_batch(curs, table, sqlhead, rowpat, batch)
+            if ct is False:
+              return False
+            row_ct += ct
+            batch = []
+            batch_bytes = len(sqlhead)
+          batch.append(params)
+          batch_bytes += row_bytes
+        if batch:
+          ct = self._ins_batch(curs, table, sqlhead, rowpat, batch)
+          if ct is False:
+            return False
+          row_ct += ct
+    if commit:
+      try:
+        self._conn.commit()
+      except Error as e:
+        self._logger.error(f"MySQL commit error in ins_many(): {e}")
+        self._conn.rollback()
+        return False
+    return row_ct
+
+  def bulk_load_tsv(self, table, columns, src, ignore_lines=0, commit=True):
+    '''
+    Function  : Load rows into a table using LOAD DATA LOCAL INFILE.
+    Arguments : A table name, a list of column names, either the path to a
+                TSV file or an iterable of row tuples/lists (in column
+                order), an optional count of header lines to skip (files
+                only) and an optional boolean
+    Returns   : Integer count of rows loaded, or False on error
+    Example   : ct = dba.bulk_load_tsv('tinx_articlerank', ['doid', 'protein_id', 'pmid', 'rank'], fn, ignore_lines=1)
+    Scope     : Public
+    Comments  : Files are loaded as-is, with no backslash escape processing,
+                just as if each split line were sent to an INSERT. Rows from
+                an iterable are streamed to a temporary TSV file first, with
+                None written as NULL. With MySQL, files are loaded from the
+                DBAdaptor's load directory, where a file elsewhere is first
+                hard linked (or copied). The number of rows loaded is
+                checked against the number of lines sent, counted as the
+                server counts them (blank lines included), and any warnings
+                raised by the server are logged.
+    '''
+    if not columns:
+      self.warning(f"Invalid parameters sent to bulk_load_tsv(): no columns for table {table}")
+      return False
+    tmpfn = None
+    if isinstance(src, str):
+      if not os.path.isfile(src):
+        self.warning(f"Invalid parameters sent to bulk_load_tsv(): {src} is not a file")
+        return False
+      sent_ct = max(self._count_lines(src) - ignore_lines, 0)
+      if self._load_dir:
+        fn = tmpfn = self._stage_load_file(src, table)
+      else:
+        fn = src
+      escaped_by = "''"
+    else:
+      # write rows using LOAD DATA's default escaping
+      with tempfile.NamedTemporaryFile(mode='w', prefix=f"{table}-", suffix='.tsv', dir=self._load_dir, delete=False) as ofh:
+        tmpfn = ofh.name
+        sent_ct = 0
+        for row in src:
+          ofh.write('\t'.join([self._tsv_field(v) for v in row]) + '\n')
+          sent_ct += 1
+      fn = tmpfn
+      ignore_lines = 0
+      escaped_by = "'\\\\'"
+    sql = "LOAD DATA LOCAL INFILE %s INTO TABLE {} FIELDS TERMINATED BY '\\t' ESCAPED BY {} LINES TERMINATED BY '\\n' IGNORE {} LINES ({})".format(table, escaped_by, int(ignore_lines), ','.join([f"`{c}`" for c in columns]))
+    self._logger.debug(f"SQLpat: {sql}")
+    self._logger.debug(f"SQLparams: {fn}")
+    try:
+      with closing(self._conn.cursor()) as curs:
+        try:
+          curs.execute(sql, (fn,))
+          load_ct = curs.rowcount
+          curs.execute("SHOW WARNINGS")
+          warnings = curs.fetchall()
+        except Error as e:
+          self._logger.error(f"MySQL Error in bulk_load_tsv(): {e}")
+          self._logger.error(f"SQLpat: {sql}")
+          self._logger.error(f"SQLparams: {fn}")
+          self._conn.rollback()
+          return False
+    finally:
+      if tmpfn:
+        os.remove(tmpfn)
+    if warnings:
+      self._logger.warning(f"LOAD DATA into {table} raised {len(warnings)} warnings")
+      for w in warnings[:self._BulkLoadMaxWarnings]:
+        self._logger.warning(f"  {w[0]} {w[1]}: {w[2]}")
+    if load_ct != sent_ct:
+      msg = f"bulk_load_tsv() loaded {load_ct} of {sent_ct} rows into table {table}"
+      self.warning(msg)
+      self._logger.warning(msg)
+    if commit:
+      try:
+        self._conn.commit()
+      except Error as e:
+        self._logger.error(f"MySQL commit error in bulk_load_tsv(): {e}")
+        self._conn.rollback()
+        return False
+    return load_ct
+
+  def _count_lines(self, fn):
+    '''
+    Function  : Count the lines of a file as LOAD DATA does
+    Arguments : Path to a file
+    Returns   : Integer count of lines
+    Scope     : Private
+    Comments  : Every newline ends a line, blank or not, and so does the
+                end of the file after a last line with no newline.
+    '''
+    ct = 0
+    last = b'\n'
+    with open(fn, 'rb') as ifh:
+      for chunk in iter(lambda: ifh.read(1 << 20), b''):
+        ct += chunk.count(b'\n')
+        last = chunk[-1:]
+    if last != b'\n':
+      ct += 1
+    return ct
+
+  def _stage_load_file(self, fn, table):
+    '''
+    Function  : Put a file where LOAD DATA LOCAL INFILE can send it from
+    Arguments : Path to a file and a table name
+    Returns   : Path to the file in the DBAdaptor's load directory
+    Scope     : Private
+    Comments  : The file is hard linked, or copied if it can't be (eg. it is
+                on another filesystem). The caller removes it.
+    '''
+    (fd, staged) = tempfile.mkstemp(prefix=f"{table}-", suffix='.tsv', dir=self._load_dir)
+    os.close(fd)
+    os.remove(staged)
+    try:
+      os.link(fn, staged)
+    except OSError:
+      shutil.copyfile(fn, staged)
+    return staged
+
+  def _tsv_field(self, val):
+    if val is None:
+      return '\\N'
+    return str(val).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+  def _sql_bytes(self, val):
+    '''
+    Function  : Get the number of bytes a value takes up in a statement
+    Arguments : A parameter value
+    Returns   : Integer number of bytes
+    Scope     : Private
+    Comments  : Counts UTF-8 bytes, not characters, plus one for each
+                character the connector escapes with a backslash.
+    '''
+    if val is None:
+      return 4
+    sval = str(val)
+    return len(sval.encode('utf-8')) + sum([sval.count(c) for c in self._SQLEscapeChars])
+
+  def _ins_batch(self, curs, table, sqlhead, rowpat, batch):
+    sql = sqlhead + ','.join([rowpat]*len(batch))
+    params = [v for row in batch for v in row]
+    self._logger.debug(f"SQLpat: {sqlhead}{rowpat},... ({len(batch)} rows)")
+    try:
+      curs.execute(sql, params)
+    except Error as e:
+      self._logger.error(f"MySQL Error in ins_many() for table {table}: {e}")
+      self._logger.error(f"SQLpat: {sqlhead}{rowpat},... ({len(batch)} rows)")
+      self._logger.error(f"First row SQLparams: {batch[0]}")
+      self._conn.rollback()
+      return False
+    return curs.rowcount
+
+  def _get_max_allowed_packet(self):
+    '''
+    Function  : Get the server's max_allowed_packet, less some headroom
+    Arguments : N/A
+    Returns   : Integer number of bytes
+    Scope     : Private
+    '''
+    if not hasattr(self, '_max_allowed_packet'):
+      with closing(self._conn.cursor()) as curs:
+        curs.execute("SELECT @@max_allowed_packet")
+        mpb = int(curs.fetchone()[0])
+      # leave room for statement overhead and escaping
+      self._max_allowed_packet = int(mpb * 0.9)
+    return self._max_allowed_packet
@@ -5,19 +5,105 @@ Steve Mathias
 smathias@salud.unm.edu
 Time-stamp: <2021-02-25 08:07:53 smathias>
 '''
-import sys
+import os,sys,shutil,tempfile
 import platform
+import json
+import time
+import threading
+import atexit
 import mysql.connector
 from mysql.connector import Error
 from mysql.connector import errorcode
-from contextlib import closing
-from collections import defaultdict
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+from contextlib import closing, contextmanager
+from collections import defaultdict, OrderedDict
+from functools import wraps
 import logging
 from TCRD.Create import CreateMethodsMixin
 from TCRD.Read import ReadMethodsMixin
 from TCRD.Update import UpdateMethodsMixin
 from TCRD.Delete import DeleteMethodsMixin
+from TCRD import SQLite
+from TCRD.Instrument import Instrumentation, InstrumentedConnection, InstrumentedCursor
+from TCRD.DocCache import DocCache
   
+class _BatchConnection:
+  '''
+  Connection proxy used by DBAdaptor.batch(). Per-call commits from the
+  Create/Update/Delete methods are counted instead of executed, and a
+  real commit is done every commit_every writes. A rollback (which the
+  methods issue when a statement fails) discards only the current,
+  uncommitted batch and is recorded in failures.
+  '''
+  def __init__(self, conn, commit_every):
+    self._cnx = conn
+    self.commit_every = commit_every
+    self.pending = 0   # writes since the last real commit
+    self.write_ct = 0  # writes in this batch() block
+    self.commit_ct = 0 # real commits issued
+    self.batch_num = 1
+    self.failures = []
+    self.doc_invalidations = [] # document cache invalidations since the last real commit
+    self.on_commit = None # called after each real commit
+
+  def commit(self):
+    self.pending += 1
+    self.write_ct += 1
+    if self.pending >= self.commit_every:
+      self.flush()
+
+  def flush(self):
+    if self.pending:
+      self._cnx.commit()
+      self.commit_ct += 1
+      self.batch_num += 1
+      self.pending = 0
+      if self.on_commit:
+        self.on_commit(self)
+
+  def rollback(self):
+    self._cnx.rollback()
+    self.failures.append({'batch': self.batch_num,
+                          'first_write': self.write_ct - self.pending + 1,
+                          'last_write': self.write_ct,
+                          'lost_writes': self.pending})
+    self.batch_num += 1
+    self.pending = 0
+    self.doc_invalidations = []
+
+  def __getattr__(self, name):
+    return getattr(self._cnx, name)
+
+
+class _PreparedCursor:
+  '''
+  Cursor proxy for the prepared statement cache. MySQLCursorPrepared only
+  reuses its prepared statement when execute() is passed the very same
+  string object it was prepared from, so execute() swaps an equal SQL
+  string for the cached key object. Statements sent to the server to be
+  prepared are counted in stats['prepares'].
+  '''
+  def __init__(self, curs, sql, stats, lock):
+    self._curs = curs
+    self._sql = sql
+    self._stats = stats
+    self._lock = lock
+    self._prepared = None
+
+  def execute(self, sql, params=None, *args, **kwargs):
+    if sql == self._sql:
+      sql = self._sql
+    if sql is not self._prepared:
+      self._prepared = sql
+      with self._lock:
+        self._stats['prepares'] += 1
+    return self._curs.execute(sql, params, *args, **kwargs)
+
+  def __getattr__(self, name):
+    return getattr(self._curs, name)
+
+
 class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, DeleteMethodsMixin):
   # Default config
   _DBHost = 'localhost' ;
@@ -30,8 +116,35 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
     _PWFile = '/home/smathias/.dbirc'
   _LogFile = '/tmp/TCRDpy3_DBA.log'
   _LogLevel = logging.WARNING
+  _PoolName = 'TCRD_DBAdaptor'
+  _PoolTimeout = 60 # seconds to wait for a free pooled connection
+  _StmtCacheSize = 256 # prepared statements kept per connection
+  _StreamFetchSize = 1000 # rows per fetch from streaming cursors
+  _DocCacheTTL = 300 # seconds a cached target/protein document is kept
+  _DocCacheReplicaLag = 10 # seconds after a write that replica reads aren't cached
+  # Read methods whose results are kept in the document cache
+  _DocCacheReads = ('get_target', 'get_protein', 'get_targetprotein')
+  # Create methods that only ever add new rows, so can't change a cached document
+  _DocCacheNewRows = ('ins_dataset', 'ins_provenance', 'ins_target', 'ins_protein')
+  # Type caches, loaded by __getattr__ the first time they are used
+  _TypeCaches = {'_info_types': '_cache_info_types',
+                 '_xref_types': '_cache_xref_types',
+                 '_expression_types': '_cache_expression_types',
+                 '_phenotype_types': '_cache_phenotype_types',
+                 '_gene_attribute_types': '_cache_gene_attribute_types'}
 
   def __init__(self, init):
+    # Backend
+    # 'mysql' (the default) or 'sqlite'. The SQLite backend is an
+    # in-process stand-in for benchmarking and small builds: dbfile is
+    # the database file (or ':memory:'), which gets the TCRD schema from
+    # schema (default SQL/create-TCRDv7.sql) if it has no tables yet.
+    if 'backend' in init:
+      backend = init['backend']
+    else:
+      backend = 'mysql'
+    if backend not in ('mysql', 'sqlite'):
+      raise ValueError(f"Unknown DBAdaptor backend: {backend}")
     # DB Connection
     if 'dbhost' in init:
       dbhost = init['dbhost']
@@ -49,10 +162,64 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
       dbuser = init['dbuser']
     else:
       dbuser = self._DBUser
-    if 'pwfile' in init:
+    if backend == 'sqlite':
+      dbauth = None
+    elif 'pwfile' in init:
       dbauth = self._get_auth(init['pwfile'])
     else:
       dbauth = self._get_auth(self._PWFile)
+    # Connection pool
+    # With pool_size set, each thread checks out its own connection
+    # from the pool the first time it touches the database, so one
+    # DBAdaptor can be shared by the workers of a thread pool.
+    if 'pool_size' in init:
+      pool_size = init['pool_size']
+    else:
+      pool_size = None
+    # Read replica
+    # With replica_host set, the Read methods query that server while
+    # Create/Update/Delete methods write to dbhost. Reads go to dbhost
+    # instead inside a batch() or read_your_writes() block, or always if
+    # read_your_writes is set. The replica gets the same dbname, user
+    # and password, and pool_size if that is set.
+    if 'replica_host' in init and backend != 'sqlite':
+      replica_host = init['replica_host']
+      replica_port = init.get('replica_port', dbport)
+    else:
+      replica_host = None
+    self._read_your_writes = init.get('read_your_writes', False)
+    # Prepared statement cache
+    # Hot single-row methods (ins_protein, ins_xref, do_update, find_*,
+    # etc.) run their SQL through server-side prepared statements, cached
+    # per connection by SQL pattern. Set stmt_cache_size to 0 to disable.
+    if 'stmt_cache_size' in init:
+      self._stmt_cache_size = init['stmt_cache_size']
+    else:
+      self._stmt_cache_size = self._StmtCacheSize
+    # Instrumentation
+    # With instrument set, public methods are timed and every statement
+    # is recorded by SQL fingerprint; a summary is printed at exit.
+    # Statements taking at least slow_threshold seconds (default 1) are
+    # written to slow_log, if given.
+    instrument = init.get('instrument', False)
+    # Document cache
+    # With doc_cache_size set, results of get_target(), get_protein()
+    # and get_targetprotein() are kept in an LRU of that many entries,
+    # for at most doc_cache_ttl seconds (default 300), and dropped when
+    # a Create/Update/Delete method touches the related target or
+    # protein. Meant for long-running readers, eg. an API layer; note
+    # that writes made by other processes are only seen after the TTL.
+    # Reads inside a batch() block bypass the cache.
+    doc_cache_size = init.get('doc_cache_size', 0)
+    doc_cache_ttl = init.get('doc_cache_ttl', self._DocCacheTTL)
+    # Metadata snapshot
+    # With snapshot_dir set, the type caches are saved to a JSON file
+    # there, named for the database and its dbinfo.data_ver, and later
+    # DBAdaptors for the same data version load them from that file.
+    if 'snapshot_dir' in init:
+      self._snapshot_dir = init['snapshot_dir']
+    else:
+      self._snapshot_dir = None
     # Logging
     # levels are:
     # CRITICAL 50
@@ -83,17 +250,302 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
       self._logger.addHandler(fh)
 
     self._logger.debug('Instantiating new TCRD DBAdaptor')
-    self._connect(host=dbhost, port=dbport, db=dbname, user=dbuser, passwd=dbauth)
-      
-    self._cache_info_types()
-    self._cache_xref_types()
-    self._cache_expression_types()
-    self._cache_phenotype_types()
-    #self._cache_gene_attribute_types()
+    self._pool = None
+    self._rpool = None
+    self._rdbconn = None
+    self._load_dir = None # for bulk_load_tsv(), see _connect()
+    self._local = threading.local()
+    self._pool_lock = threading.Lock()
+    self._pooled_conns = set()
+    self._stmt_caches = {} # id(connection) => OrderedDict of SQL => prepared cursor
+    self._stmt_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'prepares': 0}
+    self._instr = None
+    self._doc_cache = None
+    if doc_cache_size:
+      self._enable_doc_cache(doc_cache_size, doc_cache_ttl)
+    if instrument:
+      self._instrument(init.get('slow_log'), init.get('slow_threshold', 1.0))
+    self._backend = backend
+    self._max_params = None # limit on bound parameters per statement
+    if backend == 'sqlite':
+      if pool_size:
+        self._logger.warning("pool_size is ignored by the sqlite backend")
+      self._connect_sqlite(init.get('dbfile', ':memory:'), init.get('schema', SQLite.SCHEMA_FILE))
+    else:
+      self._connect(host=dbhost, port=dbport, db=dbname, user=dbuser, passwd=dbauth, pool_size=pool_size)
+      if replica_host:
+        self._connect_replica(host=replica_host, port=replica_port, pool_size=pool_size)
+    # type caches (_info_types, etc.) are loaded lazily, see __getattr__
+
+  def __getattr__(self, name):
+    # Only called when normal attribute lookup fails, ie. for a type
+    # cache that has not been loaded yet.
+    if name in self._TypeCaches:
+      if self._snapshot_dir:
+        self._load_snapshot()
+      if name not in self.__dict__:
+        getattr(self, self._TypeCaches[name])()
+        if self._snapshot_dir:
+          self._save_snapshot()
+      return self.__dict__[name]
+    raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
   def __del__(self):
-    self._conn.close()
-    self._logger.debug('connection closed')
+    if self._pool:
+      # return any connections still checked out back to the pool
+      for conn in list(self._pooled_conns):
+        self._drop_stmt_cache(conn)
+        conn.close()
+      self._pooled_conns.clear()
+      self._logger.debug('pooled connections released')
+    else:
+      self._dbconn.close()
+      self._logger.debug('connection closed')
+    if self._rdbconn:
+      self._rdbconn.close()
+      self._logger.debug('replica connection closed')
+
+  @property
+  def _conn(self):
+    '''
+    Function  : Get the database connection for the calling thread
+    Arguments : N/A
+    Returns   : A MySQL connection object
+    Scope     : Private
+    Comments  : Without a pool, this is the single connection made at
+                instantiation. In pooled mode, the first access from a
+                thread checks out a connection which stays bound to that
+                thread until release_conn() is called. Inside a batch()
+                block this is the batch's connection proxy, and with
+                instrumentation on it is wrapped so statements are recorded.
+    '''
+    conn = getattr(self._local, 'batch', None)
+    if conn is None:
+      conn = self._thread_conn()
+    if self._instr:
+      return InstrumentedConnection(conn, self._instr)
+    return conn
+
+  def _thread_conn(self):
+    '''
+    Function  : Get the real (unwrapped) connection for the calling thread
+    Arguments : N/A
+    Returns   : A MySQL connection object
+    Scope     : Private
+    '''
+    if not self._pool:
+      return self._dbconn
+    conn = getattr(self._local, 'conn', None)
+    if conn is None:
+      conn = self._checkout_conn(self._pool)
+      self._local.conn = conn
+    return conn
+
+  @property
+  def _rconn(self):
+    '''
+    Function  : Get the database connection the Read methods should use
+    Arguments : N/A
+    Returns   : A MySQL connection object
+    Scope     : Private
+    Comments  : This is the calling thread's replica connection when there
+                is a replica and reads are not pinned to the primary (see
+                read_your_writes()), otherwise the same as _conn.
+    '''
+    if self._reads_from_primary():
+      return self._conn
+    conn = self._thread_rconn()
+    if self._instr:
+      return InstrumentedConnection(conn, self._instr)
+    return conn
+
+  def _thread_rconn(self):
+    '''
+    Function  : Get the real (unwrapped) connection for reads for the calling thread
+    Arguments : N/A
+    Returns   : A MySQL connection object
+    Scope     : Private
+    '''
+    if self._reads_from_primary():
+      return self._thread_conn()
+    if not self._rpool:
+      return self._rdbconn
+    conn = getattr(self._local, 'rconn', None)
+    if conn is None:
+      conn = self._checkout_conn(self._rpool)
+      self._local.rconn = conn
+    return conn
+
+  def _reads_from_primary(self):
+    if not self._rpool and not self._rdbconn:
+      return True
+    if self._read_your_writes:
+      return True
+    return getattr(self._local, 'ryw', 0) > 0 or getattr(self._local, 'batch', None) is not None
+
+  @contextmanager
+  def read_your_writes(self):
+    '''
+    Function  : Send reads to the primary for the duration of a block
+    Arguments : N/A
+    Returns   : A context manager
+    Scope     : Public
+    Example   : with dba.read_your_writes():
+                  pid = dba.ins_protein(init)
+                  p = dba.get_protein(pid)
+    Comments  : Only matters when the DBAdaptor was created with a
+                replica_host. Blocks are per-thread and can be nested.
+                Reads inside a batch() block always go to the primary,
+                since the batch's writes are not committed yet.
+    '''
+    self._local.ryw = getattr(self._local, 'ryw', 0) + 1
+    try:
+      yield
+    finally:
+      self._local.ryw -= 1
+
+  @contextmanager
+  def batch(self, commit_every=10000):
+    '''
+    Function  : Defer per-call commits and commit in batches
+    Arguments : An optional integer number of writes per commit
+    Returns   : A context manager yielding the batch, which has commit_ct,
+                write_ct and failures attributes
+    Scope     : Public
+    Example   : with dba.batch(commit_every=10000):
+                  for row in rows:
+                    dba.ins_disease(row)
+    Comments  : Each ins_*/upd_*/del_*/do_update call that would normally
+                commit counts as one write. If a statement fails, only the
+                writes since the last batch commit are rolled back; these
+                are reported in the log when the block exits. Anything
+                pending is committed on exit, or rolled back if an exception
+                escapes the block. Batches are per-thread, and nested
+                batch() blocks join the outer one.
+    '''
+    current = getattr(self._local, 'batch', None)
+    if current is not None:
+      yield current
+      return
+    batch = _BatchConnection(self._thread_conn(), commit_every)
+    if self._doc_cache:
+      batch.on_commit = self._reinvalidate_docs
+    self._local.batch = batch
+    try:
+      yield batch
+    except BaseException:
+      self._local.batch = None
+      batch._cnx.rollback()
+      if self._doc_cache:
+        # documents read inside the batch may include rolled back writes
+        self._doc_cache.clear()
+      self._logger.error(f"Exception in batch(): rolled back {batch.pending} uncommitted writes")
+      raise
+    self._local.batch = None
+    try:
+      batch.flush()
+    except Error as e:
+      self._logger.error(f"MySQL commit error in batch(): {e}")
+      batch.rollback()
+    self._logger.debug(f"batch(): {batch.write_ct} writes in {batch.commit_ct} commits")
+    if batch.failures:
+      if self._doc_cache:
+        self._doc_cache.clear()
+      lost_ct = sum([f['lost_writes'] for f in batch.failures])
+      self._logger.error(f"batch(): {len(batch.failures)} batches failed and were rolled back, losing {lost_ct} writes:")
+      for f in batch.failures:
+        if f['lost_writes']:
+          self._logger.error("  batch {}: statement failed; rolled back writes {}-{}".format(f['batch'], f['first_write'], f['last_write']))
+        else:
+          self._logger.error("  batch {}: statement failed; no earlier writes lost".format(f['batch']))
+      self.warning(f"{len(batch.failures)} batches failed and were rolled back, losing {lost_ct} writes. See logfile for details.")
+
+  def release_conn(self):
+    '''
+    Function  : Return the calling thread's pooled connection to the pool
+    Arguments : N/A
+    Returns   : N/A
+    Scope     : Public
+    Example   : def worker(rows):
+                  try:
+                    for row in rows:
+                      dba.ins_pmscore(row)
+                  finally:
+                    dba.release_conn()
+                with ThreadPoolExecutor(max_workers=8) as ex:
+                  ex.map(worker, slmf.chunker(rows, 10000))
+    Comments  : Uncommitted work on the connection is discarded when it
+                goes back to the pool. This is a no-op when the
+                DBAdaptor was not created with a pool_size.
+    '''
+    if not self._pool:
+      return
+    for attr in ('conn', 'rconn'):
+      conn = getattr(self._local, attr, None)
+      if conn is None:
+        continue
+      setattr(self._local, attr, None)
+      with self._pool_lock:
+        self._pooled_conns.discard(conn)
+      # the pool resets the session, deallocating its prepared statements
+      self._drop_stmt_cache(conn)
+      conn.close()
+      self._logger.debug(f"Released pooled {attr} for thread {threading.current_thread().name}")
+
+  def get_stmt_cache_stats(self):
+    '''
+    Function  : Get prepared statement cache statistics
+    Arguments : N/A
+    Returns   : Dictionary with keys hits, misses, evictions, prepares,
+                size and max_size
+    Scope     : Public
+    Comments  : size is the number of prepared statements currently cached,
+                summed over all connections. prepares counts statements
+                sent to the server to be prepared, which should equal
+                misses.
+    '''
+    with self._pool_lock:
+      stats = dict(self._stmt_stats)
+      stats['size'] = sum([len(c) for c in self._stmt_caches.values()])
+    stats['max_size'] = self._stmt_cache_size
+    return stats
+
+  def get_instrument_summary(self):
+    '''
+    Function  : Get the instrumentation summary collected so far
+    Arguments : N/A
+    Returns   : String containing summary tables, or None if the
+                DBAdaptor was not created with instrument set
+    Scope     : Public
+    '''
+    if not self._instr:
+      return None
+    return self._instr.summary()
+
+  def get_doc_cache_stats(self):
+    '''
+    Function  : Get document cache statistics
+    Arguments : N/A
+    Returns   : Dictionary with keys hits, misses, evictions, expirations,
+                invalidations, stale_puts, hit_rate, size, max_size and
+                ttl, or None
+                if the DBAdaptor was not created with doc_cache_size set
+    Scope     : Public
+    '''
+    if not self._doc_cache:
+      return None
+    return self._doc_cache.stats()
+
+  def clear_doc_cache(self):
+    '''
+    Function  : Drop all cached target/protein documents, eg. after
+                another process has loaded new data
+    Arguments : N/A
+    Returns   : N/A
+    Scope     : Public
+    '''
+    if self._doc_cache:
+      self._doc_cache.clear()
 
   def get_dbinfo(self):
     self._logger.debug('get_dbinfo() entry')
@@ -125,17 +577,32 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
   #
   # Private Methods
   #
-  def _connect(self, host, port, db, user, passwd):
+  def _connect(self, host, port, db, user, passwd, pool_size=None):
     '''
     Function  : Connect to a TCRD database
-    Arguments : N/A
+    Arguments : Connection parameters and an optional pool size
     Returns   : N/A
     Scope     : Private
-    Comments  : Database connection object is stored as private instance varibale
+    Comments  : Database connection object (or connection pool, if
+                pool_size is given) is stored as private instance varibale.
+                These connections can send local files to the server, for
+                LOAD DATA LOCAL INFILE, but only from the DBAdaptor's load
+                directory.
     '''
+    # bulk_load_tsv() stages its files in a private directory, and
+    # LOAD DATA LOCAL INFILE can only send the server files from there
+    self._load_dir = tempfile.mkdtemp(prefix='TCRDpy3-load-')
+    atexit.register(shutil.rmtree, self._load_dir, True)
+    self._dbconfig = {'host': host, 'port': port, 'database': db, 'user': user,
+                      'password': passwd, 'charset': 'utf8',
+                      'allow_local_infile_in_path': self._load_dir}
     try:
-      self._conn = mysql.connector.connect(host=host, port=port, db=db, user=user,
-                                         passwd=passwd, charset='utf8')
+      if pool_size:
+        self._pool = pooling.MySQLConnectionPool(pool_name=self._PoolName,
+                                                 pool_size=pool_size, **self._dbconfig)
+        self._dbconn = None
+      else:
+        self._dbconn = mysql.connector.connect(**self._dbconfig)
     except Error as e:
       if e.errno == errorcode.ER_ACCESS_DENIED_ERROR:
         self._logger.error("Error connecting to MySQL: Bad user name or password")
@@ -143,7 +610,348 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
         self._logger.error("Error connecting to MySQL: Database does not exist")
       else:
         self._logger.error(f"Error connecting to MySQL: {e}")
-    self._logger.debug(f"Successful connection to database {db}: {self._conn}")
+    if self._pool:
+      self._logger.debug(f"Successful connection to database {db}: pool of {pool_size} connections")
+    else:
+      self._logger.debug(f"Successful connection to database {db}: {self._dbconn}")
+
+  def _connect_replica(self, host, port, pool_size=None):
+    '''
+    Function  : Connect to a read replica of the TCRD database
+    Arguments : Replica host and port, and an optional pool size
+    Returns   : N/A
+    Scope     : Private
+    Comments  : Uses the same database name and credentials as the primary.
+                Replica connections are in autocommit mode: the Read
+                methods never commit, so otherwise each connection would
+                stay in the REPEATABLE READ snapshot of its first query
+                and never see rows replicated after it. They can't send
+                local files to the server. If the replica can't be reached,
+                an error is logged and reads go to the primary.
+    '''
+    self._rdbconfig = dict(self._read_dbconfig(), host=host, port=port, autocommit=True)
+    try:
+      if pool_size:
+        self._rpool = pooling.MySQLConnectionPool(pool_name=self._PoolName + '_replica',
+                                                  pool_size=pool_size, **self._rdbconfig)
+      else:
+        self._rdbconn = mysql.connector.connect(**self._rdbconfig)
+    except Error as e:
+      self._logger.error(f"Error connecting to MySQL replica {host}:{port}: {e}")
+      self.warning(f"Could not connect to replica {host}:{port}; reading from the primary")
+      return
+    self._logger.debug(f"Successful connection to replica {host}:{port}")
+
+  def _read_dbconfig(self):
+    '''
+    Function  : Get the primary's connection parameters for a read-only
+                connection
+    Arguments : N/A
+    Returns   : Dictionary
+    Scope     : Private
+    Comments  : Same as the primary's, without LOAD DATA LOCAL INFILE.
+    '''
+    return {k: v for (k, v) in self._dbconfig.items() if k != 'allow_local_infile_in_path'}
+
+  def _connect_sqlite(self, dbfile, schema):
+    '''
+    Function  : Open a SQLite TCRD database
+    Arguments : Path to database file and path to MySQL create script
+    Returns   : N/A
+    Scope     : Private
+    Comments  : The connection object is stored as private instance
+                variable, just like a non-pooled MySQL connection.
+    '''
+    try:
+      self._dbconn = SQLite.connect(dbfile, schema=schema)
+    except Error as e:
+      self._logger.error(f"Error opening SQLite database {dbfile}: {e}")
+      raise
+    self._max_params = SQLite.MAX_PARAMS
+    self._logger.debug(f"Successful connection to SQLite database {dbfile}")
+
+  def _checkout_conn(self, pool):
+    '''
+    Function  : Get a connection from a pool, waiting for one to be
+                released if the pool is exhausted
+    Arguments : The pool (primary or replica)
+    Returns   : A pooled MySQL connection object
+    Scope     : Private
+    '''
+    start = time.time()
+    while True:
+      try:
+        conn = pool.get_connection()
+        break
+      except PoolError:
+        if time.time() - start > self._PoolTimeout:
+          self._logger.error(f"Timed out waiting for a pooled connection after {self._PoolTimeout} seconds")
+          raise
+        time.sleep(0.05)
+    if pool is self._rpool:
+      # returning a connection to the pool resets its session, which
+      # can turn autocommit back off (see _connect_replica())
+      conn.autocommit = True
+    with self._pool_lock:
+      self._pooled_conns.add(conn)
+    self._logger.debug(f"Checked out pooled connection for thread {threading.current_thread().name}")
+    return conn
+
+  def _instrument(self, slow_log, slow_threshold):
+    '''
+    Function  : Turn on instrumentation
+    Arguments : Path to slow statement log (or None) and threshold in seconds
+    Returns   : N/A
+    Scope     : Private
+    Comments  : Public methods of the Create/Read/Update/Delete mixins are
+                replaced on this instance by timed wrappers.
+    '''
+    self._instr = Instrumentation(self._logger, slow_log=slow_log, slow_threshold=slow_threshold)
+    names = set(['get_dbinfo'])
+    for cls in (CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, DeleteMethodsMixin):
+      names.update([n for n in vars(cls) if not n.startswith('_') and callable(getattr(cls, n))])
+    for name in sorted(names):
+      setattr(self, name, self._instr.wrap(name, getattr(self, name)))
+    atexit.register(self._instr.report)
+    self._logger.debug(f"Instrumentation enabled for {len(names)} methods")
+
+  def _enable_doc_cache(self, size, ttl):
+    '''
+    Function  : Turn on the document cache
+    Arguments : Max number of documents and TTL in seconds (or None)
+    Returns   : N/A
+    Scope     : Private
+    Comments  : The _DocCacheReads methods, and all public Create/Update/
+                Delete methods except the _DocCacheNewRows ones, are
+                replaced on this instance by caching/invalidating
+                wrappers. This runs before _instrument(), so cache hits
+                are included in method timings.
+    '''
+    self._doc_cache = DocCache(size, ttl)
+    self._doc_cache_write_time = 0 # time of the last invalidating write
+    for name in self._DocCacheReads:
+      setattr(self, name, self._cached_read(name, getattr(self, name)))
+    names = set()
+    for cls in (CreateMethodsMixin, UpdateMethodsMixin, DeleteMethodsMixin):
+      names.update([n for n in vars(cls) if not n.startswith('_') and callable(getattr(cls, n))])
+    names.difference_update(self._DocCacheNewRows)
+    for name in sorted(names):
+      setattr(self, name, self._invalidating_write(name, getattr(self, name)))
+    self._logger.debug(f"Document cache enabled: size {size}, ttl {ttl}")
+
+  def _cached_read(self, name, method):
+    @wraps(method)
+    def cached(id, *args, **kwargs):
+      if getattr(self._local, 'batch', None) is not None:
+        # reads in a batch see its uncommitted writes, which must not be
+        # cached, and cached documents don't include them
+        return method(id, *args, **kwargs)
+      key = (name, id, repr(args), repr(sorted(kwargs.items())))
+      doc = self._doc_cache.get(key)
+      if doc is not None:
+        return doc
+      gen = self._doc_cache.generation()
+      doc = method(id, *args, **kwargs)
+      if doc and self._doc_cacheable():
+        if name == 'get_protein':
+          tags = [('protein', id)]
+        elif name == 'get_target':
+          tags = [('target', id)] + [('protein', p['id']) for p in doc['components']['protein'] if p]
+        else:
+          # get_targetprotein() rows don't include the protein id
+          tags = [('target', id), ('protein', None)]
+        # not stored if a write invalidated the cache during the read
+        self._doc_cache.put(key, doc, tags, generation=gen)
+      return doc
+    return cached
+
+  def _doc_cacheable(self):
+    '''
+    Function  : Check whether a document just read may be cached
+    Arguments : N/A
+    Returns   : Boolean
+    Scope     : Private
+    Comments  : Documents read from a replica within _DocCacheReplicaLag
+                seconds of a write may not include it yet, so they are
+                not cached.
+    '''
+    if self._reads_from_primary():
+      return True
+    return time.time() - self._doc_cache_write_time > self._DocCacheReplicaLag
+
+  def _invalidating_write(self, name, method):
+    @wraps(method)
+    def invalidating(*args, **kwargs):
+      try:
+        return method(*args, **kwargs)
+      finally:
+        tags = self._doc_write_tags(name, args)
+        self._invalidate_docs(tags)
+        self._doc_cache_write_time = time.time()
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+          # other threads can cache the pre-write rows until the batch
+          # commits, so this is done again after the commit
+          batch.doc_invalidations.append(tags)
+    return invalidating
+
+  def _reinvalidate_docs(self, batch):
+    for tags in batch.doc_invalidations:
+      self._invalidate_docs(tags)
+    batch.doc_invalidations = []
+
+  def _doc_write_tags(self, name, args):
+    '''
+    Function  : Get the cached documents a write may have changed
+    Arguments : Name of the write method and its positional arguments
+    Returns   : A list of ('target'|'protein', id) tags, or None for all
+                documents
+    Scope     : Private
+    Comments  : Writes whose target/protein can't be told from their
+                arguments affect all documents.
+    '''
+    if name == 'do_update' and args and args[0].get('table') in ('target', 'protein'):
+      return [(args[0]['table'], args[0]['id'])]
+    if name == 'upd_pms_tdlinfo' and args:
+      return [('protein', args[0])]
+    if name == 'ins_many' and len(args) > 1 and isinstance(args[1], list):
+      rows = args[1]
+    elif name.startswith('ins_') and args and isinstance(args[0], dict):
+      rows = [args[0]]
+    else:
+      rows = None
+    if rows and all(['protein_id' in r or 'target_id' in r for r in rows]):
+      tags = []
+      for r in rows:
+        if r.get('protein_id'):
+          tags.append( ('protein', r['protein_id']) )
+        if r.get('target_id'):
+          tags.append( ('target', r['target_id']) )
+      return tags
+    return None
+
+  def _invalidate_docs(self, tags):
+    if tags is None:
+      self._doc_cache.clear()
+    else:
+      for (kind, id) in tags:
+        self._doc_cache.invalidate(kind, id)
+
+  @contextmanager
+  def _stmt_cursor(self, sql, read=False):
+    '''
+    Function  : Get a cursor for a SQL pattern, using the prepared statement cache
+    Arguments : A SQL pattern with %s placeholders, and an optional
+                boolean which is True for Read methods' queries
+    Returns   : A context manager yielding a cursor
+    Scope     : Private
+    Example   : with self._stmt_cursor(sql) as curs:
+                  curs.execute(sql, params)
+    Comments  : Cached cursors are prepared once per connection and left open
+                for reuse; the least recently used one is closed when the
+                cache is full. Results must be fully fetched before the
+                cursor is used again. The cache is keyed by interned SQL
+                text, and the cursor executes the cached string object
+                (see _PreparedCursor), so callers can build their SQL
+                anew on each call. With the cache disabled, this yields
+                an ordinary cursor which is closed on exit.
+    '''
+    if not self._stmt_cache_size:
+      conn = self._rconn if read else self._conn
+      with closing(conn.cursor()) as curs:
+        yield curs
+      return
+    conn = self._thread_rconn() if read else self._thread_conn()
+    sql = sys.intern(sql)
+    with self._pool_lock:
+      cache = self._stmt_caches.get(id(conn))
+      if cache is None:
+        cache = self._stmt_caches[id(conn)] = OrderedDict()
+      curs = cache.get(sql)
+      if curs is not None:
+        self._stmt_stats['hits'] += 1
+      else:
+        self._stmt_stats['misses'] += 1
+    # each connection's cache is only used by the thread holding it
+    if curs is not None:
+      cache.move_to_end(sql)
+    else:
+      curs = conn.cursor(prepared=True)
+      if self._instr:
+        curs = InstrumentedCursor(curs, self._instr)
+      curs = _PreparedCursor(curs, sql, self._stmt_stats, self._pool_lock)
+      cache[sql] = curs
+      if len(cache) > self._stmt_cache_size:
+        (old_sql, old_curs) = cache.popitem(last=False)
+        old_curs.close()
+        with self._pool_lock:
+          self._stmt_stats['evictions'] += 1
+    yield curs
+
+  def _stream(self, sql, params=None, dictionary=True, chunk_size=None):
+    '''
+    Function  : Generator over the rows of a query, without buffering the
+                full result set
+    Arguments : SQL pattern, optional params, and optional boolean and
+                integer
+    Yields    : Rows (dictionaries unless dictionary=False), or lists of up
+                to chunk_size rows if chunk_size is given
+    Scope     : Private
+    Comments  : MySQL queries run on an unbuffered cursor on a dedicated
+                connection (to the replica, if reads go there), opened for
+                the life of the generator, so the
+                caller can keep using the DBAdaptor (eg. to update the rows
+                being read) while iterating. If the generator is closed
+                early (eg. the caller breaks out of its loop), the
+                connection's socket is shut down instead of the rest of
+                the result set being read, and the server aborts the
+                query when it next sends rows. With the sqlite backend,
+                the database's own connection is used.
+    '''
+    if self._backend == 'sqlite':
+      cnx = self._dbconn
+    else:
+      if self._reads_from_primary():
+        dbconfig = self._read_dbconfig()
+      else:
+        dbconfig = self._rdbconfig
+      cnx = mysql.connector.connect(**dbconfig)
+    conn = InstrumentedConnection(cnx, self._instr) if self._instr else cnx
+    curs = conn.cursor(dictionary=dictionary)
+    done = False
+    try:
+      self._logger.debug(f"Streaming SQLpat: {sql}")
+      curs.execute(sql, params)
+      fetch_size = chunk_size or self._StreamFetchSize
+      while True:
+        rows = curs.fetchmany(fetch_size)
+        if not rows:
+          break
+        if chunk_size:
+          yield rows
+        else:
+          yield from rows
+      done = True
+    finally:
+      if cnx is self._dbconn:
+        curs.close()
+      elif done:
+        curs.close()
+        cnx.close()
+      else:
+        # closing the cursor or connection normally would first read
+        # (or complain about) the unread rows
+        cnx.shutdown()
+
+  def _drop_stmt_cache(self, conn):
+    with self._pool_lock:
+      cache = self._stmt_caches.pop(id(conn), None)
+    if cache:
+      for curs in cache.values():
+        try:
+          curs.close()
+        except Error:
+          pass
 
   def _get_auth(self, pw_file):
     '''
@@ -157,8 +965,73 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
     pw = f.readline().strip()
     return pw
 
+  def _snapshot_file(self):
+    '''
+    Function  : Get the path of the metadata snapshot for this database
+    Arguments : N/A
+    Returns   : String
+    Scope     : Private
+    Comments  : Costs one query of dbinfo, the first time it is called.
+    '''
+    if '_snapshot_fn' not in self.__dict__:
+      dbi = self.get_dbinfo()
+      fn = f"TCRD-{dbi['dbname']}-{dbi['data_ver']}.json"
+      self._snapshot_fn = os.path.join(self._snapshot_dir, fn)
+    return self._snapshot_fn
+
+  def _load_snapshot(self):
+    '''
+    Function  : Set the type caches from the metadata snapshot, if there is one
+    Arguments : N/A
+    Returns   : N/A
+    Scope     : Private
+    Comments  : The snapshot is only read once per DBAdaptor.
+    '''
+    if '_snapshot_loaded' in self.__dict__:
+      return
+    self._snapshot_loaded = True
+    fn = self._snapshot_file()
+    if not os.path.exists(fn):
+      return
+    try:
+      with open(fn, 'r') as ifh:
+        snapshot = json.load(ifh)
+    except (OSError, ValueError) as e:
+      self._logger.warning(f"Error reading metadata snapshot {fn}: {e}")
+      return
+    for name in self._TypeCaches:
+      if name in snapshot and name not in self.__dict__:
+        self.__dict__[name] = snapshot[name]
+    self._logger.debug(f"Loaded metadata snapshot {fn}")
+
+  def _save_snapshot(self):
+    '''
+    Function  : Write all the type caches to the metadata snapshot
+    Arguments : N/A
+    Returns   : N/A
+    Scope     : Private
+    Comments  : Loads any caches not yet loaded, so the snapshot is
+                complete. The file is replaced atomically, so concurrent
+                processes never see a partial snapshot.
+    '''
+    for name in self._TypeCaches:
+      if name not in self.__dict__:
+        getattr(self, self._TypeCaches[name])()
+    snapshot = {name: self.__dict__[name] for name in self._TypeCaches}
+    fn = self._snapshot_file()
+    tmpfn = f"{fn}.{os.getpid()}.tmp"
+    try:
+      os.makedirs(self._snapshot_dir, exist_ok=True)
+      with open(tmpfn, 'w') as ofh:
+        json.dump(snapshot, ofh)
+      os.replace(tmpfn, fn)
+    except OSError as e:
+      self._logger.warning(f"Error writing metadata snapshot {fn}: {e}")
+      return
+    self._logger.debug(f"Wrote metadata snapshot {fn}")
+
   def _cache_info_types(self):
-    if hasattr(self, '_info_types'):
+    if '_info_types' in self.__dict__:
         return
     else:
       with closing(self._conn.cursor()) as curs:
@@ -180,7 +1053,7 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
           self._info_types[k] = v
 
   def _cache_xref_types(self):
-    if hasattr(self, '_xref_types'):
+    if '_xref_types' in self.__dict__:
         return
     else:
       with closing(self._conn.cursor()) as curs:
@@ -190,7 +1063,7 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
           self._xref_types.append(xt[0])
 
   def _cache_expression_types(self):
-    if hasattr(self, '_expression_types'):
+    if '_expression_types' in self.__dict__:
         return
     else:
       with closing(self._conn.cursor()) as curs:
@@ -208,7 +1081,7 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
           self._expression_types[k] = v
 
   def _cache_phenotype_types(self):
-    if hasattr(self, '_gene_phenotype_types'):
+    if '_phenotype_types' in self.__dict__:
         return
     else:
       with closing(self._conn.cursor()) as curs:
@@ -218,7 +1091,7 @@ class DBAdaptor(CreateMethodsMixin, ReadMethodsMixin, UpdateMethodsMixin, Delete
           self._phenotype_types.append(row[0])
 
   def _cache_gene_attribute_types(self):
-    if hasattr(self, '_gene_attribute_types'):
+    if '_gene_attribute_types' in self.__dict__:
         return
     else:
       with closing(self._conn.cursor()) as curs:
@@ -0,0 +1,145 @@
+'''
+Optional read-through cache of target and protein documents for
+TCRD.DBadaptor
+
+Enabled by passing 'doc_cache_size': N in the DBAdaptor init dict. The
+results of get_target(), get_protein() and get_targetprotein() are kept
+in an LRU of up to N entries, each for at most doc_cache_ttl seconds,
+and are invalidated by Create/Update/Delete methods that touch the
+related target or protein.
+
+Steve Mathias
+smathias@salud.unm.edu
+'''
+import time
+import copy
+import threading
+from collections import OrderedDict, defaultdict
+
+class DocCache:
+  '''
+  Size- and TTL-bounded LRU of documents, each tagged with the
+  ('target', id) and ('protein', id) rows it was built from. A tag with
+  id None matches every id of that kind.
+  '''
+  def __init__(self, max_size, ttl=None):
+    self._max_size = max_size
+    self._ttl = ttl
+    self._lock = threading.Lock()
+    self._docs = OrderedDict() # key => (expiry time or None, tags, doc)
+    self._tagged = defaultdict(set) # tag => keys
+    self._generation = 0 # bumped by every invalidate() and clear()
+    self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0, 'stale_puts': 0}
+
+  def get(self, key):
+    '''
+    Function  : Look up a document
+    Arguments : A cache key
+    Returns   : A copy of the cached document, or None
+    Scope     : Public
+    '''
+    with self._lock:
+      entry = self._docs.get(key)
+      if entry is None:
+        self._stats['misses'] += 1
+        return None
+      (expires, tags, doc) = entry
+      if expires is not None and expires < time.time():
+        self._remove(key)
+        self._stats['expirations'] += 1
+        self._stats['misses'] += 1
+        return None
+      self._docs.move_to_end(key)
+      self._stats['hits'] += 1
+    return copy.deepcopy(doc)
+
+  def generation(self):
+    '''
+    Function  : Get the invalidation generation
+    Arguments : N/A
+    Returns   : Integer
+    Scope     : Public
+    Comments  : Pass the generation from before a document was read to
+                put(), so it is not stored if a write invalidated the
+                cache while it was being read.
+    '''
+    with self._lock:
+      return self._generation
+
+  def put(self, key, doc, tags, generation=None):
+    '''
+    Function  : Store a document
+    Arguments : A cache key, the document, a list of (kind, id) tags and
+                an optional generation (see generation())
+    Returns   : True if the document was stored, False if there has been
+                an invalidation since generation
+    Scope     : Public
+    '''
+    doc = copy.deepcopy(doc)
+    expires = time.time() + self._ttl if self._ttl else None
+    with self._lock:
+      if generation is not None and generation != self._generation:
+        self._stats['stale_puts'] += 1
+        return False
+      if key in self._docs:
+        self._remove(key)
+      self._docs[key] = (expires, tags, doc)
+      for tag in tags:
+        self._tagged[tag].add(key)
+      while len(self._docs) > self._max_size:
+        self._remove(next(iter(self._docs)))
+        self._stats['evictions'] += 1
+    return True
+
+  def invalidate(self, kind, id):
+    '''
+    Function  : Drop documents built from a target or protein
+    Arguments : 'target' or 'protein', and an id
+    Returns   : N/A
+    Scope     : Public
+    '''
+    with self._lock:
+      self._generation += 1
+      keys = self._tagged.get((kind, id), set()) | self._tagged.get((kind, None), set())
+      for key in list(keys):
+        self._remove(key)
+        self._stats['invalidations'] += 1
+
+  def clear(self):
+    '''
+    Function  : Drop all documents
+    Arguments : N/A
+    Returns   : N/A
+    Scope     : Public
+    '''
+    with self._lock:
+      self._generation += 1
+      self._stats['invalidations'] += len(self._docs)
+      self._docs.clear()
+      self._tagged.clear()
+
+  def stats(self):
+    '''
+    Function  : Get cache statistics
+    Arguments : N/A
+    Returns   : Dictionary with keys hits, misses, evictions, expirations,
+                invalidations, stale_puts, hit_rate, size, max_size and ttl
+    Scope     : Public
+    '''
+    with self._lock:
+      stats = dict(self._stats)
+      stats['size'] = len(self._docs)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    stats['max_size'] = self._max_size
+    stats['ttl'] = self._ttl
+    return stats
+
+  def _remove(self, key):
+    (expires, tags, doc) = self._docs.pop(key)
+    for tag in tags:
+      keys = self._tagged.get(tag)
+      if keys is not None:
+        keys.discard(key)
+        if not keys:
+          del self._tagged[tag]
@@ -0,0 +1,275 @@
+'''
+Optional latency and row-count instrumentation for TCRD.DBadaptor
+
+Enabled by passing 'instrument': True in the DBAdaptor init dict. Every
+public Create/Read/Update/Delete method is timed, and every statement
+executed through the DBAdaptor's connection is recorded under a
+normalized SQL fingerprint. A summary table is printed and logged when
+the program exits.
+
+Steve Mathias
+smathias@salud.unm.edu
+'''
+import re
+import time
+import random
+import threading
+import inspect
+from functools import wraps
+
+class _Stats:
+  '''
+  Call count, total latency, rows and a bounded reservoir sample of
+  latencies (for percentiles) for a method or SQL fingerprint.
+  '''
+  ReservoirSize = 1000
+
+  def __init__(self):
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+    self.rows = 0
+    self.sample = []
+
+  def add(self, secs, rows=0):
+    self.count += 1
+    self.total += secs
+    self.rows += rows
+    if secs > self.max:
+      self.max = secs
+    if len(self.sample) < self.ReservoirSize:
+      self.sample.append(secs)
+    else:
+      i = random.randrange(self.count)
+      if i < self.ReservoirSize:
+        self.sample[i] = secs
+
+  def pctl(self, p):
+    if not self.sample:
+      return 0.0
+    s = sorted(self.sample)
+    return s[min(len(s)-1, int(p/100.0 * len(s)))]
+
+
+class Instrumentation:
+  '''
+  Collects per-method and per-statement statistics for a DBAdaptor.
+  '''
+  _StrLitRE = re.compile(r"'(?:[^'\\]|\\.)*'")
+  _NumLitRE = re.compile(r"\b\d+(?:\.\d+)?\b")
+  _PlaceholderRE = re.compile(r"%s|\?")
+  _ListRE = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+  _ValuesRE = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.I)
+  _SpaceRE = re.compile(r"\s+")
+
+  def __init__(self, logger, slow_log=None, slow_threshold=1.0):
+    self._logger = logger
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    self._methods = {}
+    self._stmts = {}
+    self._slow_threshold = slow_threshold
+    self._slow_fh = None
+    if slow_log:
+      self._slow_fh = open(slow_log, 'a')
+    self._start = time.time()
+
+  def fingerprint(self, sql):
+    '''
+    Function  : Normalize a SQL statement so that statements differing only
+                in literal values, IN lists or number of VALUES rows compare equal
+    Arguments : A SQL string
+    Returns   : A SQL string
+    Scope     : Public
+    '''
+    fp = self._StrLitRE.sub('?', sql)
+    fp = self._NumLitRE.sub('?', fp)
+    fp = self._PlaceholderRE.sub('?', fp)
+    fp = self._ListRE.sub('(...)', fp)
+    fp = self._ValuesRE.sub(r'\1,...', fp)
+    fp = self._SpaceRE.sub(' ', fp).strip()
+    return fp
+
+  def wrap(self, name, method):
+    '''
+    Function  : Wrap a bound DBAdaptor method so its calls are timed
+    Arguments : Method name and bound method
+    Returns   : The wrapped method (or the method itself for generator methods)
+    Scope     : Public
+    '''
+    if inspect.isgeneratorfunction(method):
+      # statements run by generators are still recorded via the cursor
+      return method
+    @wraps(method)
+    def timed(*args, **kwargs):
+      stack = self._stack()
+      stack.append([name, 0])
+      st = time.time()
+      try:
+        return method(*args, **kwargs)
+      finally:
+        secs = time.time() - st
+        (mname, rows) = stack.pop()
+        with self._lock:
+          if name not in self._methods:
+            self._methods[name] = _Stats()
+          self._methods[name].add(secs, rows)
+    return timed
+
+  def record_stmt(self, sql, params, secs, rows):
+    '''
+    Function  : Record one executed statement
+    Arguments : SQL pattern, parameters, elapsed seconds and row count
+    Returns   : Key of the statement's stats, for use with record_rows()
+    Scope     : Public
+    '''
+    stack = self._stack()
+    method = stack[-1][0] if stack else '-'
+    fp = self.fingerprint(sql)
+    key = (method, fp)
+    with self._lock:
+      if key not in self._stmts:
+        self._stmts[key] = _Stats()
+      self._stmts[key].add(secs)
+    self.record_rows(key, rows)
+    if self._slow_fh and secs >= self._slow_threshold:
+      if params is not None and len(str(params)) > 200:
+        params = str(params)[:200] + '...'
+      with self._lock:
+        self._slow_fh.write("{}\t{:.3f}\t{}\t{}\t{}\n".format(time.strftime('%Y-%m-%d %H:%M:%S'), secs, method, fp, params))
+        self._slow_fh.flush()
+    return key
+
+  def record_rows(self, key, rows):
+    '''
+    Function  : Add rows affected or fetched to a statement and the
+                method currently running it
+    Arguments : Key returned by record_stmt() and an integer
+    Returns   : N/A
+    Scope     : Public
+    '''
+    if rows <= 0:
+      return
+    stack = self._stack()
+    if stack:
+      stack[-1][1] += rows
+    with self._lock:
+      if key in self._stmts:
+        self._stmts[key].rows += rows
+
+  def summary(self):
+    '''
+    Function  : Format collected statistics as text tables
+    Arguments : N/A
+    Returns   : String
+    Scope     : Public
+    '''
+    lines = []
+    elapsed = time.time() - self._start
+    with self._lock:
+      methods = sorted(self._methods.items(), key=lambda kv: kv[1].total, reverse=True)
+      stmts = sorted(self._stmts.items(), key=lambda kv: kv[1].total, reverse=True)
+    db_total = sum([st.total for (k,st) in stmts])
+    lines.append(f"DBAdaptor instrumentation summary ({elapsed:.1f}s elapsed, {db_total:.1f}s in SQL statements)")
+    lines.append("{:<32} {:>10} {:>11} {:>9} {:>9} {:>9} {:>9} {:>12}".format('Method', 'Calls', 'Total(s)', 'p50(ms)', 'p95(ms)', 'p99(ms)', 'Max(ms)', 'Rows'))
+    for (name, st) in methods:
+      lines.append("{:<32} {:>10} {:>11.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>12}".format(name, st.count, st.total, 1000*st.pctl(50), 1000*st.pctl(95), 1000*st.pctl(99), 1000*st.max, st.rows))
+    lines.append('')
+    lines.append("{:<24} {:>10} {:>11} {:>9} {:>12}  {}".format('Method', 'Execs', 'Total(s)', 'p95(ms)', 'Rows', 'SQL fingerprint'))
+    for ((method, fp), st) in stmts:
+      if len(fp) > 120:
+        fp = fp[:117] + '...'
+      lines.append("{:<24} {:>10} {:>11.2f} {:>9.2f} {:>12}  {}".format(method, st.count, st.total, 1000*st.pctl(95), st.rows, fp))
+    return '\n'.join(lines)
+
+  def report(self):
+    '''
+    Function  : Print and log the summary; registered with atexit
+    Arguments : N/A
+    Returns   : N/A
+    Scope     : Public
+    '''
+    if not self._methods and not self._stmts:
+      return
+    summary = self.summary()
+    print('\n' + summary + '\n')
+    self._logger.info(summary)
+    if self._slow_fh:
+      self._slow_fh.close()
+      self._slow_fh = None
+
+  def _stack(self):
+    stack = getattr(self._local, 'stack', None)
+    if stack is None:
+      stack = self._local.stack = []
+    return stack
+
+
+class InstrumentedConnection:
+  '''
+  Connection proxy whose cursors record their statements.
+  '''
+  def __init__(self, conn, instr):
+    self._cnx = conn
+    self._instr = instr
+
+  def cursor(self, *args, **kwargs):
+    return InstrumentedCursor(self._cnx.cursor(*args, **kwargs), self._instr)
+
+  def __getattr__(self, name):
+    return getattr(self._cnx, name)
+
+
+class InstrumentedCursor:
+  '''
+  Cursor proxy that times execute()/executemany() and counts rows
+  affected, or rows fetched for statements that return a result set.
+  '''
+  def __init__(self, curs, instr):
+    self._curs = curs
+    self._instr = instr
+    self._key = None
+
+  def execute(self, sql, params=None, *args, **kwargs):
+    st = time.time()
+    try:
+      return self._curs.execute(sql, params, *args, **kwargs)
+    finally:
+      self._record(sql, params, time.time() - st)
+
+  def executemany(self, sql, seq_params, *args, **kwargs):
+    st = time.time()
+    try:
+      return self._curs.executemany(sql, seq_params, *args, **kwargs)
+    finally:
+      # seq_params may be an iterator, which has no len()
+      nrows = len(seq_params) if hasattr(seq_params, '__len__') else '?'
+      self._record(sql, f"<{nrows} rows>", time.time() - st)
+
+  def _record(self, sql, params, secs):
+    rows = 0
+    if not getattr(self._curs, 'with_rows', False) and self._curs.rowcount > 0:
+      rows = self._curs.rowcount
+    self._key = self._instr.record_stmt(sql, params, secs, rows)
+
+  def fetchone(self):
+    row = self._curs.fetchone()
+    if row is not None:
+      self._instr.record_rows(self._key, 1)
+    return row
+
+  def fetchmany(self, *args, **kwargs):
+    rows = self._curs.fetchmany(*args, **kwargs)
+    self._instr.record_rows(self._key, len(rows))
+    return rows
+
+  def fetchall(self):
+    rows = self._curs.fetchall()
+    self._instr.record_rows(self._key, len(rows))
+    return rows
+
+  def __iter__(self):
+    return iter(self.fetchone, None)
+
+  def __getattr__(self, name):
+    return getattr(self._curs, name)
@@ -6,6 +6,9 @@ smathias@salud.unm.edu
 Time-stamp: <2022-09-02 15:03:52 smathias>
 '''
 from contextlib import closing
+import array
+import copy
+import re
 from collections import defaultdict
 import logging
 
@@ -18,7 +21,7 @@ class ReadMethodsMixin:
     Scope     : Public
     '''
     sql = "SELECT id FROM target"
-    with closing(self._conn.cursor()) as curs:
+    with closing(self._rconn.cursor()) as curs:
       curs.execute(sql)
       ids = [row[0] for row in curs.fetchall()]
     return ids
@@ -31,7 +34,7 @@ class ReadMethodsMixin:
     Scope     : Public
     '''
     sql = "SELECT id FROM protein"
-    with closing(self._conn.cursor()) as curs:
+    with closing(self._rconn.cursor()) as curs:
       curs.execute(sql)
       ids = [row[0] for row in curs.fetchall()]
     return ids
@@ -45,11 +48,101 @@ class ReadMethodsMixin:
     Scope     : Public
     '''
     sql = "SELECT * FROM protein"
-    with closing(self._conn.cursor(dictionary=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
       curs.execute(sql)
       proteins = [row for row in curs.fetchall()]
     return proteins
 
+  def iter_proteins(self, chunk_size=None):
+    '''
+    Function  : Iterate over all TCRD protein rows.
+    Arguments : An optional integer
+    Yields    : Dictionaries, or lists of up to chunk_size dictionaries
+    Scope     : Public
+    Comments  : Streaming version of get_proteins(). Rows are read from a
+                server-side cursor on a separate connection.
+    '''
+    yield from self._stream("SELECT * FROM protein", chunk_size=chunk_size)
+
+  def get_row_count(self, table, where=None, distinct=None):
+    '''
+    Function  : Count rows in a table, eg. for progress reporting while
+                streaming rows with one of the iter_* methods
+    Arguments : A table name, and optional WHERE clause and comma-separated
+                list of columns to count distinct values of
+    Returns   : An integer
+    Example   : ct = dba.get_row_count('cmpd_activity', where="catype = 'ChEMBL'")
+    Scope     : Public
+    '''
+    if distinct:
+      sql = f"SELECT COUNT(*) FROM (SELECT DISTINCT {distinct} FROM {table}"
+      if where:
+        sql += f" WHERE {where}"
+      sql += ") AS d"
+    else:
+      sql = f"SELECT COUNT(*) FROM {table}"
+      if where:
+        sql += f" WHERE {where}"
+    with closing(self._rconn.cursor()) as curs:
+      curs.execute(sql)
+      ct = curs.fetchone()[0]
+    return ct
+
+  def get_table_checksums(self, tables):
+    '''
+    Function  : Get a live checksum of the contents of some tables, eg. to
+                tell if data derived from them is stale
+    Arguments : A list of table names
+    Returns   : Dictionary of table name => checksum (None for a table
+                that does not exist)
+    Scope     : Public
+    Comments  : Uses CHECKSUM TABLE, which reads every row of the tables.
+    '''
+    sql = "CHECKSUM TABLE {}".format(', '.join([f"`{t}`" for t in tables]))
+    with closing(self._rconn.cursor()) as curs:
+      curs.execute(sql)
+      rows = curs.fetchall()
+    # MySQL reports tables as dbname.table
+    return {row[0].split('.')[-1]: row[1] for row in rows}
+
+  def get_rows_checksum(self, table, cols, where=None, params=None):
+    '''
+    Function  : Get a live checksum of some columns of the rows of a table
+                that match a WHERE clause
+    Arguments : Table name, a list of column names, and an optional WHERE
+                clause with %s placeholders and its params
+    Returns   : A (row count, checksum) tuple
+    Example   : (ct, crc) = dba.get_rows_checksum('xref', ['id', 'protein_id', 'value'], "xtype = %s", ('STRING',))
+    Scope     : Public
+    Comments  : The checksum is an order-independent XOR of the CRC32 of
+                each row's columns. Unlike CHECKSUM TABLE, only the given
+                columns of the matching rows are read, so with an index
+                covering them, this doesn't touch the rest of the table.
+    '''
+    vals = ', '.join([f"IFNULL(`{c}`, '')" for c in cols])
+    sql = f"SELECT COUNT(*), BIT_XOR(CRC32(CONCAT_WS('|', {vals}))) FROM `{table}`"
+    if where:
+      sql += f" WHERE {where}"
+    with closing(self._rconn.cursor()) as curs:
+      curs.execute(sql, params)
+      (ct, crc) = curs.fetchone()
+    return (int(ct), int(crc or 0))
+
+  def iter_target_summaries(self, where=None, chunk_size=None):
+    '''
+    Function  : Iterate over target_summary rows, in target id order
+    Arguments : An optional WHERE clause and integer
+    Yields    : Dictionaries, or lists of up to chunk_size dictionaries
+    Example   : for ts in dba.iter_target_summaries(where="idg = 1 AND tdl = 'Tdark'"):
+    Scope     : Public
+    Comments  : target_summary is rebuilt by refresh_target_summary().
+    '''
+    sql = "SELECT * FROM target_summary"
+    if where:
+      sql += f" WHERE {where}"
+    sql += " ORDER BY target_id"
+    yield from self._stream(sql, chunk_size=chunk_size)
+
   def get_targetprotein(self, id):
     '''
     Function  : Get data from target and protein tables by target.id.
@@ -58,7 +151,7 @@ class ReadMethodsMixin:
     Scope     : Public
     '''
     sql = "SELECT t.id, t.tdl, t.idg, t.fam, t.famext, p.name, p.description, p.uniprot, p.sym, p.geneid, p.stringid, p.family, p.dtoid, p.dtoclass FROM target t, t2tc, protein p WHERE t.id = %s AND t.id = t2tc.target_id AND t2tc.protein_id = p.id"
-    with closing(self._conn.cursor(dictionary=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
       curs.execute(sql, (id,))
       tp = curs.fetchone()
     return tp
@@ -72,7 +165,7 @@ class ReadMethodsMixin:
     '''
     xrefs = {}
     sql = "SELECT value, xtra FROM xref WHERE protein_id = %s AND xtype = %s"
-    with closing(self._conn.cursor(dictionary=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
       for xt in ['Pfam', 'InterPro', 'PROSITE']:
         l = []
         curs.execute(sql, (pid, xt))
@@ -87,7 +180,7 @@ class ReadMethodsMixin:
     Scope     : Public
     '''
     sql = "SELECT name, did, dtype, zscore, conf FROM disease WHERE protein_id = %s AND dtype like 'JensenLab%' ORDER BY zscore DESC"
-    with closing(self._conn.cursor(dictionary=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
       curs.execute(sql, (pid, ))
       jlds = [d for d in curs.fetchall()]
     return jlds
@@ -100,11 +193,100 @@ class ReadMethodsMixin:
     Scope     : Public
     '''
     sql = "SELECT p.uniprot, t.tdl FROM target t, protein p, t2tc WHERE t.id = t2tc.target_id AND t2tc.protein_id = p.id"
-    with closing(self._conn.cursor(dictionary=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
       curs.execute(sql)
       proteins = [row for row in curs.fetchall()]
     return proteins
-  
+
+  def iter_uniprots_tdls(self, chunk_size=None):
+    '''
+    Function  : Iterate over all protein.uniprot and target.tdl values for export to UniProt Mapping file.
+    Arguments : An optional integer
+    Yields    : Dictionaries, or lists of up to chunk_size dictionaries
+    Scope     : Public
+    Comments  : Streaming version of get_uniprots_tdls(). There is one row per t2tc row.
+    '''
+    sql = "SELECT p.uniprot, t.tdl FROM target t, protein p, t2tc WHERE t.id = t2tc.target_id AND t2tc.protein_id = p.id"
+    yield from self._stream(sql, chunk_size=chunk_size)
+
+  def iter_protein_identifiers(self, chunk_size=None):
+    '''
+    Function  : Iterate over the identifier columns of all protein rows
+    Arguments : An optional integer
+    Yields    : Tuples of (id, sym, uniprot, geneid, stringid, name), or
+                lists of up to chunk_size tuples
+    Scope     : Public
+    Comments  : Used to build a TCRD.Resolver.
+    '''
+    sql = "SELECT id, sym, uniprot, geneid, stringid, name FROM protein"
+    yield from self._stream(sql, dictionary=False, chunk_size=chunk_size)
+
+  def iter_aliases(self, types=None, chunk_size=None):
+    '''
+    Function  : Iterate over alias rows, optionally of some types only
+    Arguments : An optional list of alias types and integer
+    Yields    : Tuples of (protein_id, type, value), or lists of up to
+                chunk_size tuples
+    Scope     : Public
+    '''
+    sql = "SELECT protein_id, type, value FROM alias"
+    params = None
+    if types:
+      sql += " WHERE type IN ({})".format(','.join(['%s']*len(types)))
+      params = tuple(types)
+    yield from self._stream(sql, params=params, dictionary=False, chunk_size=chunk_size)
+
+  def iter_protein_xrefs(self, xtypes, chunk_size=None):
+    '''
+    Function  : Iterate over protein xref rows of some xtypes
+    Arguments : A list of xtypes and an optional integer
+    Yields    : Tuples of (protein_id, xtype, value), or lists of up to
+                chunk_size tuples
+    Scope     : Public
+    Comments  : These are the rows find_protein_ids_by_xref() searches,
+                less nhprotein xrefs, which have no protein_id.
+    '''
+    sql = "SELECT protein_id, xtype, value FROM xref WHERE protein_id IS NOT NULL AND target_id IS NULL AND xtype IN ({})".format(','.join(['%s']*len(xtypes)))
+    yield from self._stream(sql, params=tuple(xtypes), dictionary=False, chunk_size=chunk_size)
+
+  def iter_nhprotein_identifiers(self, species=None, chunk_size=None):
+    '''
+    Function  : Iterate over the identifier columns of nhprotein rows,
+                optionally of some species only
+    Arguments : An optional list of species and integer
+    Yields    : Tuples of (id, species, sym, uniprot, geneid, name), or
+                lists of up to chunk_size tuples
+    Scope     : Public
+    Comments  : Used to build a TCRD.Resolver.NHProteinResolver.
+    '''
+    sql = "SELECT id, species, sym, uniprot, geneid, name FROM nhprotein"
+    params = None
+    if species:
+      sql += " WHERE species IN ({})".format(','.join(['%s']*len(species)))
+      params = tuple(species)
+    yield from self._stream(sql, params=params, dictionary=False, chunk_size=chunk_size)
+
+  def iter_nhprotein_xrefs(self, xtypes, chunk_size=None):
+    '''
+    Function  : Iterate over nhprotein xref rows of some xtypes
+    Arguments : A list of xtypes and an optional integer
+    Yields    : Tuples of (nhprotein_id, xtype, value), or lists of up to
+                chunk_size tuples
+    Scope     : Public
+    '''
+    sql = "SELECT nhprotein_id, xtype, value FROM xref WHERE nhprotein_id IS NOT NULL AND xtype IN ({})".format(','.join(['%s']*len(xtypes)))
+    yield from self._stream(sql, params=tuple(xtypes), dictionary=False, chunk_size=chunk_size)
+
+  def iter_t2tcs(self, chunk_size=None):
+    '''
+    Function  : Iterate over all t2tc rows
+    Arguments : An optional integer
+    Yields    : Tuples of (target_id, protein_id), or lists of up to
+                chunk_size tuples
+    Scope     : Public
+    '''
+    yield from self._stream("SELECT target_id, protein_id FROM t2tc", dictionary=False, chunk_size=chunk_size)
+
   def find_target_ids(self, q, incl_alias=False):
     '''
     Function  : Find id(s) of target(s) that satisfy the input query criteria
@@ -154,7 +336,7 @@ class ReadMethodsMixin:
     self._logger.debug(f"SQLparams: {params}")
   
     ids = []
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql, read=True) as curs:
       curs.execute(sql, params)
       ids = [row[0] for row in curs.fetchall()]
     return ids
@@ -177,13 +359,13 @@ class ReadMethodsMixin:
     # first look by target xrefs
     sql = "SELECT target_id FROM xref WHERE protein_id IS NULL AND xtype = %s AND value = %s"
     params = (q['xtype'], q['value'])
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql, read=True) as curs:
       curs.execute(sql, params)
       for row in curs.fetchall():
         ids.add(row[0])
     # then look by component xrefs
     sql ="SELECT t2tc.target_id FROM t2tc, protein p, xref x WHERE t2tc.protein_id = p.id and p.id = x.protein_id AND x.xtype = %s AND x.value = %s"
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql, read=True) as curs:
       curs.execute(sql, params)
       for row in curs.fetchall():
         ids.add(row[0])
@@ -241,11 +423,85 @@ class ReadMethodsMixin:
     self._logger.debug(f"SQLpat: {sql}")
     self._logger.debug(f"SQLparams: {params}")
     ids = []
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql, read=True) as curs:
       curs.execute(sql, params)
       ids = [row[0] for row in curs.fetchall()]
     return ids
 
+  # protein columns the find_*_ids_batch() methods can search, and the
+  # alias.type searched for each with incl_alias
+  _FindBatchFields = {'sym': 'symbol', 'uniprot': 'uniprot', 'name': None, 'geneid': None, 'stringid': None}
+  _FindBatchSize = 1000 # values per IN (...) list
+
+  def find_target_ids_batch(self, q, incl_alias=False):
+    '''
+    Function  : Find ids of targets for many values of one identifier type
+    Arguments : A dictionary with one of the find_target_ids() keys,
+                mapped to a list of values, and an optional boolean flag
+    Returns   : Dictionary of query value => list of target ids (empty
+                if none are found), or False if the query is invalid
+    Examples  : sym2tids = dba.find_target_ids_batch({'sym': ['CHERP', 'DRD2']}, incl_alias=True)
+    Scope     : Public
+    Comments  : Values are looked up _FindBatchSize at a time. Matching
+                is case-insensitive, as with find_target_ids() on MySQL.
+                With incl_alias, alias matches are mapped to target ids
+                through t2tc.
+    '''
+    sql = "SELECT p.{0}, t2tc.target_id FROM t2tc, protein p WHERE t2tc.protein_id = p.id AND p.{0} IN ({1})"
+    alias_sql = "SELECT a.value, t2tc.target_id FROM alias a, t2tc WHERE a.protein_id = t2tc.protein_id AND a.type = %s AND a.value IN ({1})"
+    return self._find_ids_batch('find_target_ids_batch', q, incl_alias, sql, alias_sql)
+
+  def find_protein_ids_batch(self, q, incl_alias=False):
+    '''
+    Function  : Find ids of proteins for many values of one identifier type
+    Arguments : A dictionary with one of the find_protein_ids() keys,
+                mapped to a list of values, and an optional boolean flag
+    Returns   : Dictionary of query value => list of protein ids (empty
+                if none are found), or False if the query is invalid
+    Examples  : up2pids = dba.find_protein_ids_batch({'uniprot': ['O00302', 'P14416']}, incl_alias=True)
+    Scope     : Public
+    Comments  : Values are looked up _FindBatchSize at a time. Matching
+                is case-insensitive, as with find_protein_ids() on MySQL.
+                The incl_alias flag only works for symbol and uniprot
+                queries, as for find_protein_ids().
+    '''
+    sql = "SELECT {0}, id FROM protein WHERE {0} IN ({1})"
+    alias_sql = "SELECT value, protein_id FROM alias WHERE type = %s AND value IN ({1})"
+    return self._find_ids_batch('find_protein_ids_batch', q, incl_alias, sql, alias_sql)
+
+  def _find_ids_batch(self, fn, q, incl_alias, sql, alias_sql):
+    if len(q) != 1 or list(q.keys())[0] not in self._FindBatchFields:
+      self.warning(f"Invalid query parameters sent to {fn}(): {q}")
+      return False
+    (field, values) = list(q.items())[0]
+    atype = self._FindBatchFields[field] if incl_alias else None
+    # MySQL compares with a case-insensitive collation, so match returned
+    # values back to query values case-insensitively
+    norm2vals = defaultdict(list)
+    for val in values:
+      norm2vals[str(val).lower()].append(val)
+    results = {val: [] for val in values}
+    keys = list(norm2vals.keys())
+    size = self._FindBatchSize
+    if self._max_params:
+      size = min(size, self._max_params // 2 - 1)
+    with closing(self._rconn.cursor()) as curs:
+      for i in range(0, len(keys), size):
+        batch = [norm2vals[k][0] for k in keys[i:i+size]]
+        marks = ','.join(['%s']*len(batch))
+        bsql = sql.format(field, marks)
+        params = list(batch)
+        if atype:
+          bsql += " UNION " + alias_sql.format(field, marks)
+          params += [atype] + batch
+        self._logger.debug(f"SQLpat: {bsql}")
+        curs.execute(bsql, tuple(params))
+        for (val, id) in curs.fetchall():
+          for qval in norm2vals.get(str(val).lower(), []):
+            if id not in results[qval]:
+              results[qval].append(id)
+    return results
+
   def find_protein_ids_by_xref(self, q):
     '''
     Function  : Find id(s) of protein(s) that satisfy the input query criteria of xref type and value
@@ -264,7 +520,7 @@ class ReadMethodsMixin:
     params = (q['xtype'], q['value'])
     self._logger.debug(f"SQLpat: {sql}")
     self._logger.debug(f"SQLparams: {params}")
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql, read=True) as curs:
       curs.execute(sql, params)
       ids = [row[0] for row in curs.fetchall()]
     return ids
@@ -313,17 +569,65 @@ class ReadMethodsMixin:
     self._logger.debug(f"SQLpat: {sql}")
     self._logger.debug(f"SQLparams: {params}")
     ids = []
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql, read=True) as curs:
       curs.execute(sql, params)
       ids = [row[0] for row in curs.fetchall()]
     return ids
 
-  def get_target(self, id, annot=False, gacounts=False):
+  # Annotation sections added by get_protein() with annot=True, in the
+  # order they are added. Each is (key, SQL pattern, column holding the
+  # protein id). The pattern's {} is filled with the protein id
+  # predicate: "= %s" for one protein or "IN (%s,...)" for many. Queries
+  # that don't return a protein_id column select it as _pid, which is
+  # removed from the rows.
+  _ProteinSections = [
+    ('aliases', "SELECT * FROM alias WHERE protein_id {}", 'protein_id'),
+    ('tdl_infos', "SELECT * FROM tdl_info WHERE protein_id {}", 'protein_id'),
+    ('xrefs', "SELECT * FROM xref WHERE protein_id {}", 'protein_id'),
+    ('generifs', "SELECT * FROM generif WHERE protein_id {}", 'protein_id'),
+    ('goas', "SELECT * FROM goa WHERE protein_id {}", 'protein_id'),
+    ('pmscores', "SELECT * FROM pmscore WHERE protein_id {}", 'protein_id'),
+    ('phenotypes', "SELECT * FROM phenotype WHERE protein_id {}", 'protein_id'),
+    ('gwases', "SELECT * FROM gwas WHERE protein_id {}", 'protein_id'),
+    ('impcs', "SELECT DISTINCT pt.term_id, pt.term_name, pt.p_value, o.protein_id AS _pid FROM ortholog o, nhprotein nhp, phenotype pt WHERE o.symbol = nhp.sym AND o.species = 'Mouse' AND nhp.species = 'Mus musculus' AND nhp.id = pt.nhprotein_id AND o.protein_id {}", '_pid'),
+    ('diseases', "SELECT * FROM disease WHERE protein_id {} ORDER BY zscore DESC", 'protein_id'),
+    ('ortholog_diseases', "SELECT od.did, od.name, od.ortholog_id, od.score, o.taxid, o.species, o.db_id, o.geneid, o.symbol, o.name, od.protein_id AS _pid FROM ortholog o, ortholog_disease od WHERE o.id = od.ortholog_id AND od.protein_id {}", '_pid'),
+    ('expressions', "SELECT * FROM expression WHERE protein_id {}", 'protein_id'),
+    ('gtexs', "SELECT * FROM gtex WHERE protein_id {}", 'protein_id'),
+    ('compartments', "SELECT * FROM compartment WHERE protein_id {}", 'protein_id'),
+    ('pathways', "SELECT * FROM pathway WHERE protein_id {}", 'protein_id'),
+    ('pubmeds', "SELECT pm.*, p2p.protein_id AS _pid FROM pubmed pm, protein2pubmed p2p WHERE pm.id = p2p.pubmed_id AND p2p.protein_id {}", '_pid'),
+    ('features', "SELECT * FROM feature WHERE protein_id {}", 'protein_id'),
+    ('panther_classes', "SELECT pc.pcid, pc.name, p2pc.protein_id AS _pid FROM panther_class pc, p2pc WHERE p2pc.panther_class_id = pc.id AND p2pc.protein_id {}", '_pid'),
+    ('orthologs', "SELECT * FROM ortholog WHERE protein_id {}", 'protein_id'),
+    ('patent_counts', "SELECT * FROM patent_count WHERE protein_id {}", 'protein_id'),
+    ('tinx_novelty', "SELECT * FROM tinx_novelty WHERE protein_id {}", 'protein_id'),
+    ('tinx_importances', "SELECT td.name, ti.score, ti.protein_id AS _pid FROM tinx_disease td, tinx_importance ti WHERE ti.protein_id {} AND ti.disease_id = td.id ORDER BY ti.score DESC", '_pid'),
+    ('gene_attribute_counts', "SELECT ga.protein_id AS _pid, gat.name AS type, COUNT(*) AS attr_count FROM gene_attribute_type gat, gene_attribute ga WHERE gat.id = ga.gat_id AND ga.protein_id {} GROUP BY _pid, type", '_pid'),
+    ('kegg_nearest_tclins', "SELECT p.name, p.geneid, p.uniprot, p.description, n.* FROM protein p, kegg_nearest_tclin n WHERE p.id = tclin_id AND n.protein_id {}", 'protein_id')
+    ]
+  # Same, for get_target() with annot=True
+  _TargetSections = [
+    ('tdl_infos', "SELECT * FROM tdl_info WHERE target_id {}", 'target_id'),
+    ('tdl_updates', "SELECT * FROM tdl_update_log WHERE target_id {}", 'target_id'),
+    ('xrefs', "SELECT * FROM xref WHERE target_id {}", 'target_id'),
+    ('drug_activities', "SELECT * FROM drug_activity WHERE target_id {}", 'target_id'),
+    ('cmpd_activities', "SELECT * FROM cmpd_activity WHERE target_id {}", 'target_id')
+    ]
+  # TIN-X diseases too general to be listed in tinx_importances
+  _TINXBadDiseases = ['disease', 'disease by infectious agent', 'bacterial infectious disease', 'fungal infectious disease', 'parasitic infectious disease', 'viral infectious disease', 'disease of anatomical entity', 'cardiovascular system disease', 'endocrine system disease', 'gastrointestinal system disease', 'immune system disease', 'integumentary system disease', 'musculoskeletal system disease', 'nervous system disease', 'reproductive system disease', 'respiratory system disease', 'thoracic disease', 'urinary system disease', 'disease of cellular proliferation', 'benign neoplasm', 'cancer', 'pre-malignant neoplasm', 'disease of mental health', 'cognitive disorder', 'developmental disorder of mental health', 'dissociative disorder', 'factitious disorder', 'gender identity disorder', 'impulse control disorder', 'personality disorder', 'sexual disorder', 'sleep disorder', 'somatoform disorder', 'substance-related disorder', 'disease of metabolism', 'acquired metabolic disease', 'inherited metabolic disorder', 'genetic disease', 'physical disorder', 'syndrome']
+  # Max number of ids per IN (...) query in the batched getters
+  _AnnotBatchSize = 1000
+  _ColumnRE = re.compile(r'^\w+$')
+
+  def get_target(self, id, annot=False, gacounts=False, columns=None, sections=None, protein_columns=None):
     '''
     Function  : Get target data by id
-    Arguments : An integer and two optional booleans
+    Arguments : An integer and two optional booleans. Optionally, lists of
+                target columns, annotation sections and protein columns.
     Returns   : Dictionary containing target data
     Example   : target = dba->get_target(42, annot=True) 
+    Example   : target = dba.get_target(42, sections=['xrefs', 'tdl_infos'], protein_columns=['sym', 'uniprot'])
     Scope     : Public
     Comments : By default, this returns only data in the target and
                 target component tables (ie. target, protein and/or
@@ -331,95 +635,317 @@ class ReadMethodsMixin:
                 (except Harmonizome gene attributes), call with
                 annot=True. To include counts of Harmonizome gene
                 attributes, call with gacounts=True.
+                To fetch only some annotations, pass their keys as
+                sections (this implies annot=True); keys apply to both
+                the target and its component proteins. columns and
+                protein_columns limit the target and protein table
+                columns returned (id is always included).
     '''
-    with closing(self._conn.cursor(dictionary=True)) as curs:
+    tsql = self._select_sql('target', columns)
+    secs = self._select_sections(self._TargetSections, annot, gacounts, sections)
+    if tsql is None or secs is None:
+      self.warning(f"Invalid parameters sent to get_target(): columns={columns} sections={sections}")
+      return False
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
       self._logger.debug("ID: %s" % id)
-      curs.execute("SELECT * FROM target WHERE id = %s", (id,))
+      curs.execute(tsql.format('= %s'), (id,))
       t = curs.fetchone()
       if not t: return False
-      if annot:
-        # tdl_info
-        t['tdl_infos'] = {}
-        curs.execute("SELECT * FROM tdl_info WHERE target_id = %s", (id,))
-        for ti in curs:
-          self._logger.debug("  tdl_info: %s" % str(ti))
-          itype = ti['itype']
-          val_col = self._info_types[itype]
-          t['tdl_infos'][itype] = {'id': ti['id'], 'value': ti[val_col]}
-        if not t['tdl_infos']: del(t['tdl_infos'])
-        # tdl_updates
-        t['tdl_updates'] = []
-        curs.execute("SELECT * FROM tdl_update_log WHERE target_id = %s", (id,))
-        for u in curs:
-          u['datetime'] = str(u['datetime'])
-          t['tdl_updates'].append(u)
-          if not t['tdl_updates']: del(t['tdl_updates'])
-        # xrefs
-        t['xrefs'] = {}
-        for xt in self._xref_types:
-          l = []
-          curs.execute("SELECT * FROM xref WHERE target_id = %s AND xtype = %s", (id, xt))
-          for x in curs:
-            init = {'id': x['id'], 'value': x['value']}
-            if x['xtra']:
-              init['xtra'] = x['xtra']
-            l.append(init)
-          if l:
-            t['xrefs'][xt] = l
-        if not t['xrefs']: del(t['xrefs'])
-        # Drug Activity
-        t['drug_activities'] = []
-        curs.execute("SELECT * FROM drug_activity WHERE target_id = %s", (id,))
-        for da in curs:
-          t['drug_activities'].append(da)
-        if not t['drug_activities']: del(t['drug_activities'])
-        # Cmpd Activity
-        t['cmpd_activities'] = []
-        curs.execute("SELECT * FROM cmpd_activity WHERE target_id = %s", (id,))
-        for ca in curs:
-          t['cmpd_activities'].append(ca)
-        if not t['cmpd_activities']: del(t['cmpd_activities'])
+      if secs:
+        rows = {}
+        for (key, sql, idcol) in secs:
+          curs.execute(sql.format('= %s'), (id,))
+          rows[key] = curs.fetchall()
+        self._assemble_target(t, rows)
       # Components
       t['components'] = {}
       t['components']['protein'] = []
       curs.execute("SELECT * FROM t2tc WHERE target_id = %s", (id,))
-      for tc in curs:
+      for tc in curs.fetchall():
         if tc['protein_id']:
-          p = self.get_protein(tc['protein_id'], annot, gacounts)
+          p = self.get_protein(tc['protein_id'], annot, gacounts, columns=protein_columns, sections=sections)
           t['components']['protein'].append(p)
         else:
           # for possible future targets with Eg. nucleic acid components
           pass
       return t
-  
-  def get_protein(self, id, annot=False, gacounts=False):
+
+  def get_targets(self, ids, annot=False, gacounts=False, columns=None, sections=None, protein_columns=None):
+    '''
+    Function  : Get target data for many target ids
+    Arguments : A list of integers, and the same optional arguments as
+                get_target()
+    Returns   : A list of dictionaries (or False for ids not found), in the
+                same order as ids
+    Example   : targets = dba.get_targets(dba.get_target_ids(), annot=True)
+    Scope     : Public
+    Comments  : Returns the same data as calling get_target() for each id,
+                but each annotation section is fetched with one
+                "IN (...)" query per batch of up to _AnnotBatchSize ids,
+                instead of one query per target.
+    '''
+    tsql = self._select_sql('target', columns)
+    secs = self._select_sections(self._TargetSections, annot, gacounts, sections)
+    if tsql is None or secs is None:
+      self.warning(f"Invalid parameters sent to get_targets(): columns={columns} sections={sections}")
+      return False
+    ids = list(ids)
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
+      targets = {}
+      for row in self._fetch_by_ids(curs, tsql, ids, 'id').values():
+        targets[row[0]['id']] = row[0]
+      found = list(targets.keys())
+      if secs:
+        fetched = {}
+        for (key, sql, idcol) in secs:
+          fetched[key] = self._fetch_by_ids(curs, sql, found, idcol)
+        for tid,t in targets.items():
+          rows = {key: fetched[key].get(tid, []) for key in fetched}
+          self._assemble_target(t, rows)
+      t2tcs = self._fetch_by_ids(curs, "SELECT * FROM t2tc WHERE target_id {}", found, 'target_id')
+    pids = [tc['protein_id'] for tid in found for tc in t2tcs.get(tid, []) if tc['protein_id']]
+    proteins = dict(zip(pids, self._get_proteins(pids, annot, gacounts, protein_columns, sections)))
+    used = set()
+    for tid,t in targets.items():
+      t['components'] = {}
+      t['components']['protein'] = []
+      for tc in t2tcs.get(tid, []):
+        if tc['protein_id']:
+          p = proteins[tc['protein_id']]
+          if tc['protein_id'] in used and p:
+            p = copy.deepcopy(p)
+          used.add(tc['protein_id'])
+          t['components']['protein'].append(p)
+    return [targets.get(id, False) for id in ids]
+
+  def iter_targets(self, annot=False, gacounts=False, batch_size=500, start_after_id=0, columns=None, sections=None, protein_columns=None):
+    '''
+    Function  : Iterate over all TCRD targets, in id order
+    Arguments : The same optional arguments as get_target(), plus the
+                number of targets to fetch per batch and a target id to
+                start after
+    Yields    : Dictionaries containing target data
+    Example   : for t in dba.iter_targets(annot=True, start_after_id=last_tid):
+    Scope     : Public
+    Comments  : Targets are paged through by primary key (WHERE id > last
+                id ORDER BY id LIMIT batch_size) and each page is fetched
+                with get_targets(), so memory use is bounded by
+                batch_size and an interrupted walk can be resumed from
+                the last id processed.
+    '''
+    last_id = start_after_id
+    while True:
+      with closing(self._rconn.cursor()) as curs:
+        curs.execute("SELECT id FROM target WHERE id > %s ORDER BY id LIMIT %s", (last_id, batch_size))
+        ids = [row[0] for row in curs.fetchall()]
+      if not ids:
+        return
+      targets = self.get_targets(ids, annot, gacounts, columns=columns, sections=sections, protein_columns=protein_columns)
+      if targets is False:
+        return
+      for t in targets:
+        if t:
+          yield t
+      last_id = ids[-1]
+
+  def get_protein(self, id, annot=False, gacounts=False, columns=None, sections=None):
     '''
     Function  : Get protein data by id
-    Arguments : An integer and two optional booleans
+    Arguments : An integer and two optional booleans. Optionally, lists of
+                protein columns and annotation sections.
     Returns   : Dictionary containing target data
     Example   : target = dba->get_protein(42, annot=True) 
+    Example   : p = dba.get_protein(42, columns=['sym', 'geneid'])
     Scope     : Public
     Comments : By default, this returns only data in the protein table.
                To get all associated annotations (except Harmonizome
                gene attributes), call with annot=True. To include counts
                of Harmonizome gene attributes, call with gacounts=True.
+               To fetch only some annotations, pass their keys (eg.
+               ['xrefs', 'goas']) as sections; this implies annot=True.
+               To fetch only some protein columns (eg. to skip seq),
+               pass them as columns; id is always included.
     '''
-    with closing(self._conn.cursor(dictionary=True)) as curs:
-      curs.execute("SELECT * FROM protein WHERE id = %s", (id,))
+    psql = self._select_sql('protein', columns)
+    secs = self._select_sections(self._ProteinSections, annot, gacounts, sections)
+    if psql is None or secs is None:
+      self.warning(f"Invalid parameters sent to get_protein(): columns={columns} sections={sections}")
+      return False
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
+      curs.execute(psql.format('= %s'), (id,))
       p = curs.fetchone()
       if not p: return False
-      if annot:
-        # aliases
-        p['aliases'] = []
-        curs.execute("SELECT * FROM alias WHERE protein_id = %s", (id,))
-        for a in curs:
-          p['aliases'].append(a)
-        if not p['aliases']: del(p['aliases'])
-        # tdl_info
+      if secs:
+        rows = {}
+        for (key, sql, idcol) in secs:
+          curs.execute(sql.format('= %s'), (id,))
+          rows[key] = curs.fetchall()
+          for row in rows[key]:
+            row.pop('_pid', None)
+        self._assemble_protein(p, rows)
+    return p
+
+  def get_proteins_annotated(self, ids, gacounts=False, columns=None, sections=None):
+    '''
+    Function  : Get protein data, with all associated annotations, for many protein ids
+    Arguments : A list of integers and an optional boolean. Optionally,
+                lists of protein columns and annotation sections.
+    Returns   : A list of dictionaries (or False for ids not found), in the
+                same order as ids
+    Example   : proteins = dba.get_proteins_annotated(dba.get_protein_ids())
+    Scope     : Public
+    Comments  : Returns the same data as calling get_protein(id, annot=True)
+                for each id, but each annotation section is fetched with
+                one "IN (...)" query per batch of up to _AnnotBatchSize ids,
+                instead of one query per protein.
+    '''
+    if self._select_sql('protein', columns) is None or self._select_sections(self._ProteinSections, True, gacounts, sections) is None:
+      self.warning(f"Invalid parameters sent to get_proteins_annotated(): columns={columns} sections={sections}")
+      return False
+    return self._get_proteins(list(ids), True, gacounts, columns, sections)
+
+  def _get_proteins(self, ids, annot, gacounts, columns=None, sections=None):
+    psql = self._select_sql('protein', columns)
+    secs = self._select_sections(self._ProteinSections, annot, gacounts, sections)
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
+      proteins = {}
+      for row in self._fetch_by_ids(curs, psql, ids, 'id').values():
+        proteins[row[0]['id']] = row[0]
+      found = list(proteins.keys())
+      if secs:
+        fetched = {}
+        for (key, sql, idcol) in secs:
+          fetched[key] = self._fetch_by_ids(curs, sql, found, idcol)
+        for pid,p in proteins.items():
+          rows = {key: fetched[key].get(pid, []) for key in fetched}
+          self._assemble_protein(p, rows)
+    return [proteins.get(id, False) for id in ids]
+
+  def _select_sql(self, table, columns):
+    '''
+    Function  : Build the main SELECT pattern for get_protein()/get_target()
+    Arguments : A table name and a list of column names (or None for all)
+    Returns   : SQL pattern with {} where the id predicate goes, or None
+                if a column name is invalid
+    Scope     : Private
+    '''
+    if columns is None:
+      return "SELECT * FROM %s WHERE id {}" % table
+    cols = ['id'] + [c for c in columns if c != 'id']
+    if not all([self._ColumnRE.match(c) for c in cols]):
+      return None
+    return "SELECT %s FROM %s WHERE id {}" % (', '.join(cols), table)
+
+  def _select_sections(self, table_sections, annot, gacounts, sections):
+    '''
+    Function  : Select the annotation section queries to run
+    Arguments : _ProteinSections or _TargetSections, annot and gacounts
+                booleans and a list of section keys (or None)
+    Returns   : A list of (key, SQL pattern, id column) tuples, or None if
+                sections contains an unknown key
+    Scope     : Private
+    '''
+    if sections is None:
+      if not annot:
+        return []
+      sections = [key for (key, sql, idcol) in table_sections if key != 'gene_attribute_counts']
+    else:
+      known = set([s[0] for s in self._ProteinSections + self._TargetSections])
+      if not set(sections) <= known:
+        return None
+    if gacounts:
+      sections = list(sections) + ['gene_attribute_counts']
+    return [s for s in table_sections if s[0] in sections]
+
+  def _fetch_by_ids(self, curs, sql, ids, idcol):
+    '''
+    Function  : Run a query for many ids, in batches
+    Arguments : A cursor, a SQL pattern with {} where the id predicate
+                goes, a list of ids and the name of the result column to
+                group rows by
+    Returns   : Dictionary of id => list of rows, in query result order
+    Scope     : Private
+    Comments  : A _pid grouping column is removed from the rows.
+    '''
+    rows = defaultdict(list)
+    for i in range(0, len(ids), self._AnnotBatchSize):
+      batch = ids[i:i+self._AnnotBatchSize]
+      curs.execute(sql.format("IN ({})".format(','.join(['%s']*len(batch)))), tuple(batch))
+      for row in curs.fetchall():
+        if idcol == '_pid':
+          rows[row.pop('_pid')].append(row)
+        else:
+          rows[row[idcol]].append(row)
+    return rows
+
+  def _assemble_target(self, t, rows):
+    '''
+    Function  : Add annotation sections to a target dictionary
+    Arguments : A target dictionary and a dictionary of section key =>
+                list of rows for that target
+    Returns   : N/A
+    Scope     : Private
+    Comments  : Only sections present in rows are added.
+    '''
+    # tdl_info
+    if 'tdl_infos' in rows:
+      t['tdl_infos'] = {}
+      for ti in rows['tdl_infos']:
+        self._logger.debug("  tdl_info: %s" % str(ti))
+        itype = ti['itype']
+        val_col = self._info_types[itype]
+        t['tdl_infos'][itype] = {'id': ti['id'], 'value': ti[val_col]}
+      if not t['tdl_infos']: del(t['tdl_infos'])
+    # tdl_updates (always present, even if empty)
+    if 'tdl_updates' in rows:
+      t['tdl_updates'] = []
+      for u in rows['tdl_updates']:
+        u['datetime'] = str(u['datetime'])
+        t['tdl_updates'].append(u)
+    # xrefs
+    if 'xrefs' in rows:
+      t['xrefs'] = self._group_xrefs(rows['xrefs'])
+      if not t['xrefs']: del(t['xrefs'])
+    # Drug and Cmpd Activities
+    for key in ['drug_activities', 'cmpd_activities']:
+      if key in rows:
+        t[key] = list(rows[key])
+        if not t[key]: del(t[key])
+
+  def _group_xrefs(self, rows):
+    '''
+    Function  : Group xref rows by xtype
+    Arguments : A list of xref rows
+    Returns   : Dictionary of xtype => list of {'id', 'value'[, 'xtra']},
+                with xtypes in _xref_types order
+    Scope     : Private
+    '''
+    by_type = defaultdict(list)
+    for x in rows:
+      init = {'id': x['id'], 'value': x['value']}
+      if x['xtra']:
+        init['xtra'] = x['xtra']
+      by_type[x['xtype']].append(init)
+    return {xt: by_type[xt] for xt in self._xref_types if xt in by_type}
+
+  def _assemble_protein(self, p, rows):
+    '''
+    Function  : Add annotation sections to a protein dictionary
+    Arguments : A protein dictionary and a dictionary of section key =>
+                list of rows for that protein
+    Returns   : N/A
+    Scope     : Private
+    Comments  : Only sections present in rows are added. tdl_infos and
+                xrefs are kept even when empty and tinx_novelty is ''
+                when there is none.
+    '''
+    for (key, sql, idcol) in self._ProteinSections:
+      if key not in rows:
+        continue
+      if key == 'tdl_infos':
         p['tdl_infos'] = {}
-        curs.execute("SELECT * FROM tdl_info WHERE protein_id = %s", (id,))
         decs = []
-        for ti in curs:
+        for ti in rows['tdl_infos']:
           itype = ti['itype']
           val_col = self._info_types[itype]
           if itype == 'Drugable Epigenome Class':
@@ -428,74 +954,16 @@ class ReadMethodsMixin:
             p['tdl_infos'][itype] = {'id': ti['id'], 'value': str(ti[val_col])}
         if decs:
           p['tdl_infos']['Drugable Epigenome Class'] = decs
-        # xrefs
-        p['xrefs'] = {}
-        for xt in self._xref_types:
-          l = []
-          curs.execute("SELECT * FROM xref WHERE protein_id = %s AND xtype = %s", (id, xt))
-          for x in curs:
-            init = {'id': x['id'], 'value': x['value']}
-            if x['xtra']:
-              init['xtra'] = x['xtra']
-            l.append(init)
-          if l:
-            p['xrefs'][xt] = l
-        # generifs
+      elif key == 'xrefs':
+        p['xrefs'] = self._group_xrefs(rows['xrefs'])
+      elif key == 'generifs':
         p['generifs'] = []
-        curs.execute("SELECT * FROM generif WHERE protein_id = %s", (id,))
-        for gr in curs:
+        for gr in rows['generifs']:
           p['generifs'].append({'id': gr['id'], 'pubmed_ids': gr['pubmed_ids'], 'text': gr['text']})
         if not p['generifs']: del(p['generifs'])
-        # goas
-        p['goas'] = []
-        curs.execute("SELECT * FROM goa WHERE protein_id = %s", (id,))
-        for g in curs:
-          p['goas'].append(g)
-        if not p['goas']: del(p['goas'])
-        # pmscores
-        p['pmscores'] = []
-        curs.execute("SELECT * FROM pmscore WHERE protein_id = %s", (id,))
-        for pms in curs:
-          p['pmscores'].append(pms)
-        if not p['pmscores']: del(p['pmscores'])
-        # phenotypes
-        p['phenotypes'] = []
-        curs.execute("SELECT * FROM phenotype WHERE protein_id = %s", (id,))
-        for pt in curs:
-          p['phenotypes'].append(pt)
-        if not p['phenotypes']: del(p['phenotypes'])
-        # GWAS
-        p['gwases'] = []
-        curs.execute("SELECT * FROM gwas WHERE protein_id = %s", (id,))
-        for gw in curs:
-          p['gwases'].append(gw)
-        if not p['gwases']: del(p['gwases'])
-        # IMPC phenotypes (via Mouse ortholog)
-        p['impcs'] = []
-        curs.execute("SELECT DISTINCT pt.term_id, pt.term_name, pt.p_value FROM ortholog o, nhprotein nhp, phenotype pt WHERE o.symbol = nhp.sym AND o.species = 'Mouse' AND nhp.species = 'Mus musculus' AND nhp.id = pt.nhprotein_id AND o.protein_id = %s", (id,))
-        for pt in curs:
-          p['impcs'].append(pt)
-        if not p['impcs']: del(p['impcs'])
-        # RGD QTLs (via Rat ortholog)
-        # TBD
-        # diseases
-        p['diseases'] = []
-        bad_diseases = ['Disease', 'Disease by infectious agent', 'Bacterial infectious disease', 'Fungal infectious disease', 'Parasitic infectious disease', 'Viral infectious disease', 'Disease of anatomical entity', 'Cardiovascular system disease', 'Endocrine system disease', 'Gastrointestinal system disease', 'Immune system disease', 'Integumentary system disease', 'Musculoskeletal system disease', 'Nervous system disease', 'Reproductive system disease', 'Respiratory system disease', 'Thoracic disease', 'Urinary system disease', 'Disease of cellular proliferation', 'Benign neoplasm', 'Cancer', 'Pre-malignant neoplasm', 'Disease of mental health', 'Cognitive disorder', 'Developmental disorder of mental health', 'Dissociative disorder', 'Factitious disorder', 'Gender identity disorder', 'Impulse control disorder', 'Personality disorder', 'Sexual disorder', 'Sleep disorder', 'Somatoform disorder', 'Substance-related disorder', 'Disease of metabolism', 'Acquired metabolic disease', 'Inherited metabolic disorder', 'Genetic disease', 'Physical disorder', 'Syndrome']
-        curs.execute("SELECT * FROM disease WHERE protein_id = %s ORDER BY zscore DESC", (id,))
-        for d in curs:
-          #if d['name'] not in bad_diseases:
-          p['diseases'].append(d)
-        if not p['diseases']: del(p['diseases'])
-        # ortholog_diseases
-        p['ortholog_diseases'] = []
-        curs.execute("SELECT od.did, od.name, od.ortholog_id, od.score, o.taxid, o.species, o.db_id, o.geneid, o.symbol, o.name FROM ortholog o, ortholog_disease od WHERE o.id = od.ortholog_id AND od.protein_id = %s", (id,))
-        for od in curs:
-          p['ortholog_diseases'].append(od)
-        if not p['ortholog_diseases']: del(p['ortholog_diseases'])
-        # expression
+      elif key == 'expressions':
         p['expressions'] = []
-        curs.execute("SELECT * FROM expression WHERE protein_id = %s", (id,))
-        for ex in curs:
+        for ex in rows['expressions']:
           etype = ex['etype']
           val_col = self._expression_types[etype]
           ex['value'] = ex[val_col]
@@ -503,42 +971,10 @@ class ReadMethodsMixin:
           del(ex['boolean_value'])
           del(ex['string_value'])
           p['expressions'].append(ex)
-          #p['expressions'].append({'id': ex['id'], 'etype': etype, 'tissue': ex['tissue'], 'evidence': ex['evidence'], 'zscore': str(ex['zscore']), 'conf': ex['conf'], 'oid': ex['oid'], 'value': ex[val_col], 'qual_value': ex['qual_value'], 'confidence': ex['confidence'], 'gender': ex['gender']})
         if not p['expressions']: del(p['expressions'])
-        # gtex
-        p['gtexs'] = []
-        curs.execute("SELECT * FROM gtex WHERE protein_id = %s", (id,))
-        for gtex in curs:
-          p['gtexs'].append(gtex)
-        if not p['gtexs']: del(p['gtexs'])
-        # compartments
-        p['compartments'] = []
-        curs.execute("SELECT * FROM compartment WHERE protein_id = %s", (id,))
-        for comp in curs:
-          p['compartments'].append(comp)
-        if not p['compartments']: del(p['compartments'])
-        # phenotypes
-        p['phenotypes'] = []
-        curs.execute("SELECT * FROM phenotype WHERE protein_id = %s", (id,))
-        for pt in curs:
-          p['phenotypes'].append(pt)
-        if not p['phenotypes']: del(p['phenotypes'])
-        # pathways
-        p['pathways'] = []
-        curs.execute("SELECT * FROM pathway WHERE protein_id = %s", (id,))
-        for pw in curs:
-          p['pathways'].append(pw)
-        if not p['pathways']: del(p['pathways'])
-        # pubmeds
-        p['pubmeds'] = []
-        curs.execute("SELECT pm.* FROM pubmed pm, protein2pubmed p2p WHERE pm.id = p2p.pubmed_id AND p2p.protein_id = %s", (id,))
-        for pm in curs:
-          p['pubmeds'].append(pm)
-        if not p['pubmeds']: del(p['pubmeds'])
-        # features
+      elif key == 'features':
         p['features'] = {}
-        curs.execute("SELECT * FROM feature WHERE protein_id = %s", (id,))
-        for f in curs:
+        for f in rows['features']:
           ft = f['type']
           del(f['type'])
           if ft in p['features']:
@@ -546,55 +982,25 @@ class ReadMethodsMixin:
           else:
             p['features'][ft] = [f]
         if not p['features']: del(p['features'])
-        # panther_classes
-        p['panther_classes'] = []
-        curs.execute("SELECT pc.pcid, pc.name FROM panther_class pc, p2pc WHERE p2pc.panther_class_id = pc.id AND p2pc.protein_id = %s", (id,))
-        for pc in curs:
-          p['panther_classes'].append(pc)
-        if not p['panther_classes']: del(p['panther_classes'])
-        # orthologs
-        p['orthologs'] = []
-        curs.execute("SELECT * FROM ortholog WHERE protein_id = %s", (id,))
-        for o in curs:
-          p['orthologs'].append(o)
-        if not p['orthologs']: del(p['orthologs'])
-        ## DTO classification
-        #if p['dtoid']:
-        #  p['dto_classification'] = "::".join(self.get_protein_dto(p['dtoid']))
-        # patent_counts
-        p['patent_counts'] = []
-        curs.execute("SELECT * FROM patent_count WHERE protein_id = %s", (id,))
-        for pc in curs:
-          p['patent_counts'].append(pc)
-        if not p['patent_counts']: del(p['patent_counts'])
-        # TIN-X Novelty and Importance(s)
-        curs.execute("SELECT * FROM tinx_novelty WHERE protein_id = %s", (id,))
-        row = curs.fetchone()
-        if row:
-          p['tinx_novelty'] = row['score']
+      elif key == 'tinx_novelty':
+        if rows['tinx_novelty']:
+          p['tinx_novelty'] = rows['tinx_novelty'][0]['score']
         else:
           p['tinx_novelty'] = ''
+      elif key == 'tinx_importances':
         p['tinx_importances'] = []
-        bad_diseases = ['disease', 'disease by infectious agent', 'bacterial infectious disease', 'fungal infectious disease', 'parasitic infectious disease', 'viral infectious disease', 'disease of anatomical entity', 'cardiovascular system disease', 'endocrine system disease', 'gastrointestinal system disease', 'immune system disease', 'integumentary system disease', 'musculoskeletal system disease', 'nervous system disease', 'reproductive system disease', 'respiratory system disease', 'thoracic disease', 'urinary system disease', 'disease of cellular proliferation', 'benign neoplasm', 'cancer', 'pre-malignant neoplasm', 'disease of mental health', 'cognitive disorder', 'developmental disorder of mental health', 'dissociative disorder', 'factitious disorder', 'gender identity disorder', 'impulse control disorder', 'personality disorder', 'sexual disorder', 'sleep disorder', 'somatoform disorder', 'substance-related disorder', 'disease of metabolism', 'acquired metabolic disease', 'inherited metabolic disorder', 'genetic disease', 'physical disorder', 'syndrome']
-        curs.execute("SELECT td.name, ti.score FROM tinx_disease td, tinx_importance ti WHERE ti.protein_id = %s AND ti.disease_id = td.id ORDER BY ti.score DESC", (id,))
-        for txi in curs:
-          if txi['name'] not in bad_diseases:
+        for txi in rows['tinx_importances']:
+          if txi['name'] not in self._TINXBadDiseases:
             p['tinx_importances'].append({'disease': txi['name'], 'score': txi['score']})
         if not p['tinx_importances']: del(p['tinx_importances'])
-        # gene_attribute counts
-        if gacounts:
-          p['gene_attribute_counts'] = {}
-          curs.execute("SELECT gat.name AS type, COUNT(*) AS attr_count FROM gene_attribute_type gat, gene_attribute ga WHERE gat.id = ga.gat_id AND ga.protein_id = %s GROUP BY type", (id,))
-          for gact in curs:
-            p['gene_attribute_counts'][gact['type']] = gact['attr_count']
-          if not p['gene_attribute_counts']: del(p['gene_attribute_counts'])
-        # KEGG Nearest Tclin(s)
-        p['kegg_nearest_tclins'] = []
-        curs.execute("SELECT p.name, p.geneid, p.uniprot, p.description, n.* FROM protein p, kegg_nearest_tclin n WHERE p.id = tclin_id AND n.protein_id = %s", (id,))
-        for knt in curs:
-          p['kegg_nearest_tclins'].append(knt)
-        if not p['kegg_nearest_tclins']: del(p['kegg_nearest_tclins'])
-    return p
+      elif key == 'gene_attribute_counts':
+        p['gene_attribute_counts'] = {}
+        for gact in rows['gene_attribute_counts']:
+          p['gene_attribute_counts'][gact['type']] = gact['attr_count']
+        if not p['gene_attribute_counts']: del(p['gene_attribute_counts'])
+      else:
+        p[key] = list(rows[key])
+        if not p[key]: del(p[key])
 
   def get_target4tdlcalc(self, id):
     '''
@@ -603,7 +1009,7 @@ class ReadMethodsMixin:
     Returns   : Dictionary containing target data.
     Scope     : Public
     '''
-    with closing(self._conn.cursor(dictionary=True, buffered=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True, buffered=True)) as curs:
       self._logger.debug("ID: %s" % id)
       curs.execute("SELECT * FROM target WHERE id = %s", (id,))
       t = curs.fetchone()
@@ -633,14 +1039,16 @@ class ReadMethodsMixin:
       p['id'] = t2tc['protein_id']
       curs.execute("SELECT * FROM tdl_info WHERE itype = 'JensenLab PubMed Score' AND protein_id = %s", (p['id'],))
       pms = curs.fetchone()
-      p['tdl_infos']['JensenLab PubMed Score'] = {'id': pms['id'], 'value': str(pms['number_value'])}
+      if pms:
+        p['tdl_infos']['JensenLab PubMed Score'] = {'id': pms['id'], 'value': str(pms['number_value'])}
       curs.execute("SELECT * FROM tdl_info WHERE itype = 'Experimental MF/BP Leaf Term GOA' AND protein_id = %s", (p['id'],))
       efl_goa = curs.fetchone()
       if efl_goa:
         p['tdl_infos']['Experimental MF/BP Leaf Term GOA'] = {'id': efl_goa['id'], 'value': '1'}
       curs.execute("SELECT * FROM tdl_info WHERE itype = 'Ab Count' AND protein_id = %s", (p['id'],))
       abct = curs.fetchone()
-      p['tdl_infos']['Ab Count'] = {'id': abct['id'], 'value': str(abct['integer_value'])}
+      if abct:
+        p['tdl_infos']['Ab Count'] = {'id': abct['id'], 'value': str(abct['integer_value'])}
       curs.execute("SELECT * FROM generif WHERE protein_id = %s", (p['id'],))
       for gr in curs:
         p['generifs'].append({'id': gr['id'], 'pubmed_ids': gr['pubmed_ids'], 'text': gr['text']})
@@ -648,6 +1056,113 @@ class ReadMethodsMixin:
     t['components']['protein'].append(p)
     return t
 
+  def get_target_tdls(self):
+    '''
+    Function  : Get the current TDL of every target
+    Arguments : N/A
+    Returns   : Dictionary of target id => TDL (or None)
+    Scope     : Public
+    '''
+    with closing(self._rconn.cursor()) as curs:
+      curs.execute("SELECT id, tdl FROM target")
+      tdls = dict(curs.fetchall())
+    return tdls
+
+  def get_dataset(self, name):
+    '''
+    Function  : Get a dataset by name
+    Arguments : A string
+    Returns   : Dictionary containing dataset data, or None if there is no
+                such dataset
+    Scope     : Public
+    '''
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
+      curs.execute("SELECT * FROM dataset WHERE name = %s ORDER BY datetime DESC", (name,))
+      rows = curs.fetchall()
+    return rows[0] if rows else None
+
+  def get_provenance_since(self, since):
+    '''
+    Function  : Get provenance of datasets loaded at or after a given time
+    Arguments : A datetime (or timestamp string)
+    Returns   : A list of dictionaries with keys dataset_id, dataset_name,
+                datetime, table_name, column_name and where_clause
+    Example   : provs = dba.get_provenance_since(dba.get_dataset('TDLs')['datetime'])
+    Scope     : Public
+    '''
+    sql = "SELECT d.id AS dataset_id, d.name AS dataset_name, d.datetime, p.table_name, p.column_name, p.where_clause FROM dataset d, provenance p WHERE p.dataset_id = d.id AND d.datetime >= %s ORDER BY d.datetime"
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
+      curs.execute(sql, (since,))
+      rows = curs.fetchall()
+    return rows
+
+  def get_tdl_inputs(self):
+    '''
+    Function  : Get the data required for TDL calculation for all targets
+    Arguments : N/A
+    Returns   : Dictionary of column name => array.array, one element per
+                target, in target id order. Columns are:
+                  target_id, protein_id: ints (protein_id is the target's
+                    first component protein, 0 if it has none)
+                  has_drug, has_moa, has_cmpd: 0/1 flags for any drug
+                    activity, any MoA drug activity and any cmpd activity
+                  pms: JensenLab PubMed Score (0.0 if none)
+                  generif_ct, ab_ct: GeneRIF count and Ab Count (0 if none)
+                  efl_goa: 0/1 flag for Experimental MF/BP Leaf Term GOA
+    Example   : tdlins = dba.get_tdl_inputs()
+    Scope     : Public
+    Comments  : Set-based equivalent of calling get_target4tdlcalc() for
+                every target: five aggregate queries in total.
+    '''
+    cols = {'target_id': array.array('q'), 'protein_id': array.array('q'),
+            'has_drug': array.array('b'), 'has_moa': array.array('b'),
+            'has_cmpd': array.array('b'), 'pms': array.array('d'),
+            'generif_ct': array.array('l'), 'ab_ct': array.array('l'),
+            'efl_goa': array.array('b')}
+    with closing(self._rconn.cursor()) as curs:
+      curs.execute("SELECT t.id, MIN(t2tc.protein_id) FROM target t LEFT JOIN t2tc ON t2tc.target_id = t.id GROUP BY t.id ORDER BY t.id")
+      rows = curs.fetchall()
+      ct = len(rows)
+      tidx = {}
+      pidx = defaultdict(list)
+      for (i, (tid, pid)) in enumerate(rows):
+        cols['target_id'].append(tid)
+        cols['protein_id'].append(pid or 0)
+        tidx[tid] = i
+        if pid:
+          pidx[pid].append(i)
+      for col in ('has_drug', 'has_moa', 'has_cmpd', 'efl_goa'):
+        cols[col].frombytes(bytes(ct))
+      cols['pms'].fromlist([0.0]*ct)
+      cols['generif_ct'].fromlist([0]*ct)
+      cols['ab_ct'].fromlist([0]*ct)
+      # Drug and Cmpd Activities
+      curs.execute("SELECT target_id, MAX(has_moa = 1) FROM drug_activity GROUP BY target_id")
+      for (tid, moa) in curs.fetchall():
+        if tid in tidx:
+          cols['has_drug'][tidx[tid]] = 1
+          cols['has_moa'][tidx[tid]] = 1 if moa else 0
+      curs.execute("SELECT DISTINCT target_id FROM cmpd_activity")
+      for (tid,) in curs.fetchall():
+        if tid in tidx:
+          cols['has_cmpd'][tidx[tid]] = 1
+      # Protein tdl_infos
+      curs.execute("SELECT protein_id, itype, number_value, integer_value FROM tdl_info WHERE protein_id IS NOT NULL AND itype IN ('JensenLab PubMed Score', 'Ab Count', 'Experimental MF/BP Leaf Term GOA')")
+      for (pid, itype, nval, ival) in curs.fetchall():
+        for i in pidx.get(pid, []):
+          if itype == 'JensenLab PubMed Score':
+            cols['pms'][i] = float(nval or 0)
+          elif itype == 'Ab Count':
+            cols['ab_ct'][i] = ival or 0
+          else:
+            cols['efl_goa'][i] = 1
+      # GeneRIFs
+      curs.execute("SELECT protein_id, COUNT(*) FROM generif GROUP BY protein_id")
+      for (pid, rif_ct) in curs.fetchall():
+        for i in pidx.get(pid, []):
+          cols['generif_ct'][i] = rif_ct
+    return cols
+
   def get_target4impcrpt(self, id):
     '''
     Function  : Get a target with associated IMPC Ortholog Phenotypes
@@ -655,7 +1170,7 @@ class ReadMethodsMixin:
     Returns   : Dictionary containing target data.
     Scope     : Public
     '''
-    with closing(self._conn.cursor(dictionary=True, buffered=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True, buffered=True)) as curs:
       self._logger.debug("ID: %s" % id)
       curs.execute("SELECT * FROM target WHERE id = %s", (id,))
       t = curs.fetchone()
@@ -683,21 +1198,31 @@ class ReadMethodsMixin:
     Scope     : Public
     '''
     tigas = []
-    with closing(self._conn.cursor(dictionary=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
       curs.execute("SELECT DISTINCT protein_id, ensg FROM tiga")
       tigas = [row for row in curs.fetchall()]
     return tigas
 
+  def iter_tigas(self, chunk_size=None):
+    '''
+    Function  : Iterate over distinct tiga.protein_id and tiga.ensg values (for extlinks).
+    Arguments : An optional integer
+    Yields    : Dictionaries, or lists of up to chunk_size dictionaries
+    Scope     : Public
+    Comments  : Streaming version of get_tigas().
+    '''
+    yield from self._stream("SELECT DISTINCT protein_id, ensg FROM tiga", chunk_size=chunk_size)
+
   def get_tinx_pmids(self):
     pmids = []
-    with closing(self._conn.cursor()) as curs:
+    with closing(self._rconn.cursor()) as curs:
       curs.execute("SELECT DISTINCT pmid FROM tinx_articlerank")
       pmids = [row[0] for row in curs.fetchall()]
     return pmids
 
   def get_pmids(self):
     pmids = []
-    with closing(self._conn.cursor()) as curs:
+    with closing(self._rconn.cursor()) as curs:
       curs.execute("SELECT id FROM pubmed")
       pmids = [row[0] for row in curs.fetchall()]
     return pmids
@@ -705,7 +1230,7 @@ class ReadMethodsMixin:
   def get_missing_tinx_pmids(self):
     '''Returns strings, not ints, so ids can be sent to EUtils'''
     pmids = []
-    with closing(self._conn.cursor()) as curs:
+    with closing(self._rconn.cursor()) as curs:
       sql = "SELECT DISTINCT pmid FROM tinx_articlerank WHERE pmid NOT IN (SELECT id FROM pubmed)"
       curs.execute(sql)
       pmids = [str(row[0]) for row in curs.fetchall()]
@@ -713,6 +1238,23 @@ class ReadMethodsMixin:
 
   def get_diseases(self, dtype=None, with_did=False):
     diseases = []
+    sql = self._diseases_sql(dtype, with_did)
+    with closing(self._rconn.cursor(dictionary=True, buffered=True)) as curs:
+      curs.execute(sql)
+      diseases = [d for d in curs.fetchall()]
+    return diseases
+  
+  def iter_diseases(self, dtype=None, with_did=False, chunk_size=None):
+    '''
+    Function  : Iterate over disease rows, optionally of one dtype and/or with a did
+    Arguments : An optional string, boolean and integer
+    Yields    : Dictionaries, or lists of up to chunk_size dictionaries
+    Scope     : Public
+    Comments  : Streaming version of get_diseases().
+    '''
+    yield from self._stream(self._diseases_sql(dtype, with_did), chunk_size=chunk_size)
+
+  def _diseases_sql(self, dtype, with_did):
     sql = "SELECT * FROM disease"
     if dtype:
       if with_did:
@@ -721,15 +1263,12 @@ class ReadMethodsMixin:
         sql += f" WHERE dtype = '{dtype}'"
     elif with_did:
       sql += " WHERE did IS NOT NULL"
-    with closing(self._conn.cursor(dictionary=True, buffered=True)) as curs:
-      curs.execute(sql)
-      diseases = [d for d in curs.fetchall()]
-    return diseases
-  
+    return sql
+
   def get_diseases_without_mondoid(self):
     diseases = []
     sql = "SELECT * FROM disease WHERE mondoid IS NULL"
-    with closing(self._conn.cursor(dictionary=True, buffered=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True, buffered=True)) as curs:
       curs.execute(sql)
       diseases = [d for d in curs.fetchall()]
     return diseases
@@ -740,17 +1279,18 @@ class ReadMethodsMixin:
       sql = "SELECT uid FROM uberon_xref WHERE db = %s AND value = %s"
       params = (db, val)
     elif 'name' in q:
-      name = q['name'].lower()
-      sql = "SELECT uid FROM uberon WHERE LOWER(name) = %s"
-      params = (name,)
+      # name has a case-insensitive collation, so this matches regardless
+      # of case and can use uberon_idx1
+      sql = "SELECT uid FROM uberon WHERE name = %s"
+      params = (q['name'],)
     else:
       self.warning("Invalid query parameters sent to find_uberon_id(): ", q)
       return False
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql, read=True) as curs:
       curs.execute(sql, params)
-      row = curs.fetchone()
-    if row:
-      return row[0]
+      rows = curs.fetchall()
+    if rows:
+      return rows[0][0]
     else:
       return None
 
@@ -763,33 +1303,74 @@ class ReadMethodsMixin:
       sql = "SELECT mondoid FROM mondo_xref WHERE db = %s AND value = %s AND equiv_to"
       params = (db, q['value'])
     elif 'name' in q:
-      name = q['name'].lower()
-      sql = "SELECT mondoid FROM mondo WHERE LOWER(name) = %s"
-      params = (name,)
+      # name has a case-insensitive collation, so this matches regardless
+      # of case and can use mondo_idx1
+      sql = "SELECT mondoid FROM mondo WHERE name = %s"
+      params = (q['name'],)
     else:
       self.warning("Invalid query parameters sent to find_mondo_id(): ", q)
       return False
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql, read=True) as curs:
       curs.execute(sql, params)
-      row = curs.fetchone()
-    if row:
-      return row[0]
+      rows = curs.fetchall()
+    if rows:
+      return rows[0][0]
     else:
       return None
 
+  def get_mondo_name_map(self):
+    '''
+    Function  : Get a map of all Mondo term names to Mondo IDs, for doing
+                many find_mondoid() name lookups from memory
+    Arguments : N/A
+    Returns   : Dictionary of lowercased name => mondoid
+    Example   : name2mondoid = dba.get_mondo_name_map()
+                mondoid = name2mondoid.get(name.lower())
+    Scope     : Public
+    Comments  : If several terms have the same name, the lowest mondoid is
+                kept.
+    '''
+    name2mondoid = {}
+    for (mondoid, name) in self._stream("SELECT mondoid, name FROM mondo ORDER BY mondoid", dictionary=False):
+      name2mondoid.setdefault(name.lower(), mondoid)
+    return name2mondoid
+
   def get_cmpd_activities(self, catype=None):
     cmpd_activities = []
     sql = "SELECT * FROM cmpd_activity"
     if catype:
       sql += " WHERE catype = '%s'" % catype
-    with closing(self._conn.cursor(dictionary=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
       curs.execute(sql)
       cmpd_activities = [row for row in curs.fetchall()]
     return cmpd_activities
 
+  def iter_cmpd_activities(self, catype=None, chunk_size=None):
+    '''
+    Function  : Iterate over cmpd_activity rows, optionally of one catype
+    Arguments : An optional string and integer
+    Yields    : Dictionaries, or lists of up to chunk_size dictionaries
+    Scope     : Public
+    Comments  : Streaming version of get_cmpd_activities().
+    '''
+    sql = "SELECT * FROM cmpd_activity"
+    if catype:
+      sql += " WHERE catype = '%s'" % catype
+    yield from self._stream(sql, chunk_size=chunk_size)
+
   def get_drug_activities(self):
     drug_activities = []
-    with closing(self._conn.cursor(dictionary=True)) as curs:
+    with closing(self._rconn.cursor(dictionary=True)) as curs:
       curs.execute("SELECT * FROM drug_activity")
       drug_activities = [row for row in curs.fetchall()]
     return drug_activities
+
+  def iter_drug_activities(self, chunk_size=None):
+    '''
+    Function  : Iterate over all drug_activity rows
+    Arguments : An optional integer
+    Yields    : Dictionaries, or lists of up to chunk_size dictionaries
+    Scope     : Public
+    Comments  : Streaming version of get_drug_activities().
+    '''
+    yield from self._stream("SELECT * FROM drug_activity", chunk_size=chunk_size)
@@ -0,0 +1,539 @@
+'''
+In-memory identifier resolver for TCRD loaders
+
+A Resolver reads protein sym/uniprot/geneid/stringid/name values, symbol
+and uniprot aliases, protein xrefs of selected xtypes and t2tc rows once,
+and then answers find_protein_ids(), find_protein_ids_by_xref() and
+find_target_ids() lookups from memory, instead of with a query per
+lookup.
+
+With a snapshot_dir, the indexes are also written to a snapshot file
+there, tagged with dbinfo.data_ver and checksums of the rows the indexes
+were read from (see DBAdaptor.get_rows_checksum()). Later Resolvers with the same options memory-map that
+file read-only instead of reading the tables, as long as the tags still
+match, so parallel loader processes share one copy of the indexes.
+
+Usage:
+  from TCRD.Resolver import Resolver
+  res = Resolver(dba, xtypes=['STRING'], snapshot_dir='../data/resolver/')
+  pids = res.resolve_protein_ids({'stringid': ensp}, {'xtype': 'STRING', 'value': '9606.'+ensp})
+
+Steve Mathias
+smathias@salud.unm.edu
+'''
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import tempfile
+from array import array
+
+def warning(*objs):
+  print("TCRD Resolver WARNING: ", *objs, file=sys.stderr)
+
+def _norm(val):
+  return str(val).lower()
+
+def _add(index, val, id, norm=True):
+  # index a value, storing a bare id for the first and a tuple once there
+  # are several
+  if val is None or val == '':
+    return
+  key = _norm(val) if norm else val
+  cur = index.get(key)
+  if cur is None:
+    index[key] = id
+  elif isinstance(cur, tuple):
+    if id not in cur:
+      index[key] = cur + (id,)
+  elif cur != id:
+    index[key] = (cur, id)
+
+def _ids(val):
+  if val is None:
+    return []
+  if isinstance(val, tuple):
+    return list(val)
+  return [val]
+
+
+class _SnapshotIndex:
+  '''
+  Read-only sorted string table in a memory-mapped snapshot file, with
+  the same get()/len() interface as the dict indexes. Keys are looked up
+  by binary search. Values set on it (eg. by
+  Resolver.add_protein_value()) go to an in-memory overlay.
+  '''
+  def __init__(self, mm, base, meta):
+    n = meta['count']
+    mv = memoryview(mm)
+    (koffs, ioffs, ids) = (base + meta['koffs'], base + meta['ioffs'], base + meta['ids'])
+    self._mm = mm
+    self._count = n
+    self._koffs = mv[koffs:koffs+8*(n+1)].cast('Q')
+    self._keys = base + meta['keys']
+    self._ioffs = mv[ioffs:ioffs+8*(n+1)].cast('Q')
+    self._ids = mv[ids:ids+8*meta['id_count']].cast('q')
+    self._overlay = {}
+
+  def get(self, key, default=None):
+    if key in self._overlay:
+      return self._overlay[key]
+    i = self._find(str(key).encode('utf-8'))
+    if i is None:
+      return default
+    (a, b) = (self._ioffs[i], self._ioffs[i+1])
+    if b - a == 1:
+      return self._ids[a]
+    return tuple(self._ids[a:b])
+
+  def __setitem__(self, key, val):
+    self._overlay[key] = val
+
+  def __len__(self):
+    return self._count + len([k for k in self._overlay if self._find(str(k).encode('utf-8')) is None])
+
+  def _find(self, kb):
+    (lo, hi) = (0, self._count)
+    base = self._keys
+    while lo < hi:
+      mid = (lo + hi) // 2
+      k = self._mm[base+self._koffs[mid]:base+self._koffs[mid+1]]
+      if k < kb:
+        lo = mid + 1
+      elif k > kb:
+        hi = mid
+      else:
+        return mid
+    return None
+
+
+class Resolver:
+  '''
+  Hash indexes of normalized identifier => protein id(s), and protein
+  id => target id(s). Matching is case-insensitive, as with the
+  DBAdaptor find_* methods on MySQL. To keep the indexes compact, a key
+  that maps to a single id stores the bare integer, and only keys that
+  map to several ids store a tuple.
+  '''
+  _ProteinFields = ('sym', 'uniprot', 'geneid', 'stringid', 'name')
+  # protein fields searched in the alias table with incl_alias, and their alias.type
+  _AliasTypes = {'sym': 'symbol', 'uniprot': 'uniprot'}
+  _DefaultXrefTypes = ('STRING', 'Ensembl')
+  _SnapshotMagic = b'TCRDRSV1'
+
+  def __init__(self, dba, xtypes=None, targets=True, snapshot_dir=None):
+    '''
+    Function  : Load the indexes
+    Arguments : A TCRD.DBAdaptor, an optional list of xref types to index
+                (default _DefaultXrefTypes), an optional boolean to index
+                t2tc for find_target_ids() (default True) and an optional
+                directory to keep a snapshot of the indexes in
+    '''
+    self._dba = dba
+    if xtypes is None:
+      xtypes = self._DefaultXrefTypes
+    xtypes = sorted(set([xt.lower() for xt in xtypes]))
+    self._targets = targets
+    self._snapshot = None
+    if snapshot_dir:
+      # tags are read before the tables, so a snapshot of rows that
+      # change while it is being built is rebuilt next time
+      tags = self._snapshot_tags(xtypes)
+      opts = json.dumps({'xtypes': xtypes, 'targets': targets}, sort_keys=True)
+      fn = 'resolver-{}.snap'.format(hashlib.sha1(opts.encode('utf-8')).hexdigest()[:12])
+      path = os.path.join(snapshot_dir, fn)
+      if self._open_snapshot(path, tags):
+        return
+    self._fields = {f: {} for f in self._ProteinFields}
+    self._aliases = {f: {} for f in self._AliasTypes}
+    self._xrefs = {xt: {} for xt in xtypes}
+    self._p2tids = {} if targets else None
+    for row in dba.iter_protein_identifiers():
+      pid = row[0]
+      for f, val in zip(self._ProteinFields, row[1:]):
+        _add(self._fields[f], val, pid)
+    atype2field = {t: f for f, t in self._AliasTypes.items()}
+    for (pid, atype, val) in dba.iter_aliases(types=list(atype2field.keys())):
+      _add(self._aliases[atype2field[atype]], val, pid)
+    if xtypes:
+      for (pid, xtype, val) in dba.iter_protein_xrefs(xtypes):
+        _add(self._xrefs[xtype.lower()], val, pid)
+    if targets:
+      for (tid, pid) in dba.iter_t2tcs():
+        _add(self._p2tids, pid, tid, norm=False)
+    if snapshot_dir:
+      self._save_snapshot(path, tags)
+
+  def find_protein_ids(self, q, incl_alias=False):
+    '''
+    Function  : Find id(s) of protein(s) that satisfy the input query criteria
+    Arguments : A dictionary containing query criteria and an optional boolean flag
+    Returns   : A list of integers, or False if the query is invalid
+    Examples  : pids = res.find_protein_ids({'uniprot': 'O00302'}, incl_alias=True)
+    Scope     : Public
+    Comments  : Takes the same queries as DBAdaptor.find_protein_ids().
+    '''
+    field = self._query_field(q)
+    if not field:
+      warning("Invalid query parameters sent to Resolver.find_protein_ids(): ", q)
+      return False
+    key = _norm(q[field])
+    ids = _ids(self._fields[field].get(key))
+    if incl_alias and field in self._aliases:
+      for pid in _ids(self._aliases[field].get(key)):
+        if pid not in ids:
+          ids.append(pid)
+    return ids
+
+  def find_protein_ids_by_xref(self, q):
+    '''
+    Function  : Find id(s) of protein(s) that satisfy the input query criteria of xref type and value
+    Arguments : A dictionary containing query criteria
+    Returns   : A list of integers, or False if the query is invalid
+    Examples  : pids = res.find_protein_ids_by_xref({'xtype': 'Ensembl', 'value': 'ENSG00000186090'})
+    Scope     : Public
+    Comments  : Xref types that were not indexed are looked up with
+                DBAdaptor.find_protein_ids_by_xref().
+    '''
+    if 'xtype' not in q or 'value' not in q:
+      warning(f"Invalid query parameters sent to Resolver.find_protein_ids_by_xref(): {q}")
+      return False
+    index = self._xrefs.get(q['xtype'].lower())
+    if index is None:
+      return self._dba.find_protein_ids_by_xref(q)
+    return _ids(index.get(_norm(q['value'])))
+
+  def find_target_ids(self, q, incl_alias=False):
+    '''
+    Function  : Find id(s) of target(s) that satisfy the input query criteria
+    Arguments : A dictionary containing query criteria and an optional boolean flag
+    Returns   : A list of integers, or False if the query is invalid
+    Examples  : tids = res.find_target_ids({'name': '5HT1A_HUMAN'})
+    Scope     : Public
+    Comments  : Takes the same queries as DBAdaptor.find_target_ids().
+                Proteins found by alias are mapped to target ids through
+                t2tc, as with DBAdaptor.find_target_ids_batch().
+    '''
+    if self._p2tids is None:
+      warning("Resolver.find_target_ids() called on a Resolver built with targets=False")
+      return False
+    pids = self.find_protein_ids(q, incl_alias=incl_alias)
+    if pids is False:
+      return False
+    ids = []
+    for pid in pids:
+      for tid in _ids(self._p2tids.get(pid)):
+        if tid not in ids:
+          ids.append(tid)
+    return ids
+
+  def resolve_protein_ids(self, *qs, incl_alias=False):
+    '''
+    Function  : Find protein ids with a chain of fallback queries
+    Arguments : Query dictionaries, tried in order, and an optional boolean
+                flag. Queries with an 'xtype' key are xref queries, as
+                for find_protein_ids_by_xref(); the rest are as for
+                find_protein_ids().
+    Returns   : A list of integers from the first query that finds any,
+                or an empty list
+    Examples  : pids = res.resolve_protein_ids({'sym': sym}, {'xtype': 'Ensembl', 'value': ensg})
+    Scope     : Public
+    Comments  : Queries with a None value are skipped.
+    '''
+    for q in qs:
+      if None in q.values():
+        continue
+      if 'xtype' in q:
+        ids = self.find_protein_ids_by_xref(q)
+      else:
+        ids = self.find_protein_ids(q, incl_alias=incl_alias)
+      if ids:
+        return ids
+    return []
+
+  def resolve_target_ids(self, *qs, incl_alias=False):
+    '''
+    Function  : Find target ids with a chain of fallback queries
+    Arguments : find_target_ids() query dictionaries, tried in order, and
+                an optional boolean flag
+    Returns   : A list of integers from the first query that finds any,
+                or an empty list
+    Examples  : tids = res.resolve_target_ids({'uniprot': up}, {'name': sp})
+    Scope     : Public
+    Comments  : Queries with a None value are skipped.
+    '''
+    for q in qs:
+      if None in q.values():
+        continue
+      ids = self.find_target_ids(q, incl_alias=incl_alias)
+      if ids:
+        return ids
+    return []
+
+  def add_protein_value(self, pid, field, val):
+    '''
+    Function  : Index a protein identifier value, eg. after a loader has
+                set a missing protein.sym
+    Arguments : A protein id, one of the _ProteinFields and a value
+    Returns   : N/A
+    Scope     : Public
+    '''
+    _add(self._fields[field], val, pid)
+
+  def counts(self):
+    '''
+    Function  : Get the number of keys in each index
+    Arguments : N/A
+    Returns   : Dictionary of index name => key count
+    Scope     : Public
+    '''
+    counts = {f: len(idx) for f, idx in self._fields.items()}
+    for f, idx in self._aliases.items():
+      counts[f"alias {self._AliasTypes[f]}"] = len(idx)
+    for xt, idx in self._xrefs.items():
+      counts[f"xref {xt}"] = len(idx)
+    if self._p2tids is not None:
+      counts['t2tc'] = len(self._p2tids)
+    return counts
+
+  def snapshot_path(self):
+    '''
+    Function  : Get the path of the snapshot the indexes were read from
+    Arguments : N/A
+    Returns   : A path, or None if the indexes were read from the database
+    Scope     : Public
+    '''
+    return self._snapshot
+
+  def _snapshot_sources(self, xtypes):
+    # (table, columns, where, params) of the rows the indexes are read
+    # from; the xref rows are covered by xref_idx7, so only the selected
+    # xtypes' index entries are read, not the whole table
+    sources = [('protein', ['id'] + list(self._ProteinFields), None, None),
+               ('alias', ['id', 'protein_id', 'type', 'value'], "type IN (%s,%s)", tuple(self._AliasTypes.values()))]
+    if xtypes:
+      sources.append( ('xref', ['id', 'protein_id', 'xtype', 'value'],
+                       "protein_id IS NOT NULL AND target_id IS NULL AND xtype IN ({})".format(','.join(['%s']*len(xtypes))), tuple(xtypes)) )
+    if self._targets:
+      sources.append( ('t2tc', ['target_id', 'protein_id'], None, None) )
+    return sources
+
+  def _snapshot_tags(self, xtypes):
+    dbi = self._dba.get_dbinfo()
+    checksums = {}
+    for (table, cols, where, params) in self._snapshot_sources(xtypes):
+      checksums[table] = self._dba.get_rows_checksum(table, cols, where, params)
+    return {'data_ver': dbi['data_ver'], 'checksums': checksums}
+
+  def _indexes(self):
+    # name => index, in snapshot file order
+    indexes = {f"field:{f}": idx for f, idx in self._fields.items()}
+    indexes.update({f"alias:{f}": idx for f, idx in self._aliases.items()})
+    indexes.update({f"xref:{xt}": idx for xt, idx in self._xrefs.items()})
+    if self._p2tids is not None:
+      indexes['t2tc'] = self._p2tids
+    return indexes
+
+  def _save_snapshot(self, path, tags):
+    # File layout: magic, header length, JSON header, then for each index
+    # (n+1) key offsets, the sorted key bytes, (n+1) id offsets and the
+    # ids. Section offsets in the header are relative to the end of the
+    # header, every section starts on an 8-byte boundary, and the header's
+    # length is the total size of the sections. The file is
+    # written under a temporary name and renamed into place, so readers
+    # never see a partial snapshot.
+    sections = []
+    metas = {}
+    pos = 0
+    for (name, index) in self._indexes().items():
+      items = sorted([(str(k).encode('utf-8'), v) for k, v in index.items()])
+      koffs = array('Q', [0])
+      ioffs = array('Q', [0])
+      ids = array('q')
+      for (kb, v) in items:
+        koffs.append(koffs[-1] + len(kb))
+        ids.extend(v if isinstance(v, tuple) else (v,))
+        ioffs.append(len(ids))
+      keys = b''.join([kb for (kb, v) in items])
+      meta = {'count': len(items), 'id_count': len(ids)}
+      for (part, data) in (('koffs', koffs.tobytes()), ('keys', keys), ('ioffs', ioffs.tobytes()), ('ids', ids.tobytes())):
+        meta[part] = pos
+        pad = -len(data) % 8
+        sections.append(data + b'\0'*pad)
+        pos += len(data) + pad
+      metas[name] = meta
+    header = json.dumps({'tags': tags, 'indexes': metas, 'length': pos}, sort_keys=True).encode('utf-8')
+    header += b' '*(-len(header) % 8)
+    try:
+      os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+      (fd, tmp) = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.resolver-')
+      with os.fdopen(fd, 'wb') as ofh:
+        ofh.write(self._SnapshotMagic)
+        ofh.write(struct.pack('<Q', len(header)))
+        ofh.write(header)
+        for data in sections:
+          ofh.write(data)
+      # mkstemp() creates the file 0600; the snapshot is shared by loaders
+      # run as other users
+      os.chmod(tmp, 0o644)
+      os.replace(tmp, path)
+    except OSError as e:
+      warning(f"Could not write resolver snapshot {path}: {e}")
+
+  def _open_snapshot(self, path, tags):
+    try:
+      with open(path, 'rb') as ifh:
+        mm = mmap.mmap(ifh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+      return False
+    mlen = len(self._SnapshotMagic)
+    try:
+      if mm[:mlen] != self._SnapshotMagic:
+        raise ValueError('bad magic number')
+      hlen = struct.unpack('<Q', mm[mlen:mlen+8])[0]
+      header = json.loads(mm[mlen+8:mlen+8+hlen].decode('utf-8'))
+      # round trip through JSON so tuples etc. compare equal
+      if header['tags'] != json.loads(json.dumps(tags)):
+        return False
+      base = mlen + 8 + hlen
+      if len(mm) != base + header['length']:
+        raise ValueError('truncated')
+      idxs = {name: _SnapshotIndex(mm, base, meta) for name, meta in header['indexes'].items()}
+      fields = {f: idxs[f"field:{f}"] for f in self._ProteinFields}
+      aliases = {f: idxs[f"alias:{f}"] for f in self._AliasTypes}
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+      # truncated or corrupt; UnicodeDecodeError and JSONDecodeError are
+      # ValueErrors, and a short section makes memoryview.cast() raise one
+      warning(f"Ignoring invalid resolver snapshot {path}: {e}")
+      return False
+    self._fields = fields
+    self._aliases = aliases
+    self._xrefs = {name[5:]: idx for name, idx in idxs.items() if name.startswith('xref:')}
+    self._p2tids = idxs.get('t2tc')
+    self._snapshot = path
+    return True
+
+  def _query_field(self, q):
+    # same precedence as DBAdaptor.find_protein_ids()
+    for f in ('sym', 'uniprot', 'name', 'geneid', 'stringid'):
+      if f in q:
+        return f
+    return None
+
+
+class NHProteinResolver:
+  '''
+  Hash indexes of (species, normalized identifier) => nhprotein id(s),
+  for mouse and rat loaders and ortholog mapping. Matching is
+  case-insensitive, as with DBAdaptor.find_nhprotein_ids() on MySQL.
+  '''
+  _NHProteinFields = ('sym', 'uniprot', 'geneid', 'name')
+  _DefaultXrefTypes = ('Ensembl',)
+
+  def __init__(self, dba, species=None, xtypes=None):
+    '''
+    Function  : Load the indexes
+    Arguments : A TCRD.DBAdaptor, an optional list of species to index
+                (default all) and an optional list of xref types to index
+                (default _DefaultXrefTypes)
+    '''
+    self._dba = dba
+    if xtypes is None:
+      xtypes = self._DefaultXrefTypes
+    xtypes = sorted(set([xt.lower() for xt in xtypes]))
+    self._fields = {f: {} for f in self._NHProteinFields}
+    self._xrefs = {xt: {} for xt in xtypes}
+    self._species = {} # nhprotein id => species
+    for row in dba.iter_nhprotein_identifiers(species=species):
+      (nhpid, sp) = (row[0], row[1])
+      self._species[nhpid] = sp
+      sp = _norm(sp)
+      for f, val in zip(self._NHProteinFields, row[2:]):
+        if val is not None and val != '':
+          _add(self._fields[f], (sp, _norm(val)), nhpid, norm=False)
+    if xtypes:
+      for (nhpid, xtype, val) in dba.iter_nhprotein_xrefs(xtypes):
+        if nhpid in self._species:
+          _add(self._xrefs[xtype.lower()], (_norm(self._species[nhpid]), _norm(val)), nhpid, norm=False)
+    self._all_species = sorted(set([_norm(sp) for sp in self._species.values()]))
+
+  def find_nhprotein_ids(self, q, species=False):
+    '''
+    Function  : Find id(s) of nhprotein(s) that satisfy the input query criteria
+    Arguments : A dictionary containing query criteria and an optional string specifying species
+    Returns   : A list of integers, or False if the query is invalid
+    Examples  : nhpids = res.find_nhprotein_ids({'sym': 'Dact2'}, species='Mus musculus')
+    Scope     : Public
+    Comments  : Takes the same queries as DBAdaptor.find_nhprotein_ids().
+                Without a species, ids for all indexed species are returned.
+    '''
+    for f in ('sym', 'uniprot', 'geneid', 'name'):
+      if f in q:
+        return self._lookup(self._fields[f], q[f], species)
+    warning("Invalid query parameters sent to NHProteinResolver.find_nhprotein_ids(): ", q)
+    return False
+
+  def find_nhprotein_ids_by_xref(self, q, species=False):
+    '''
+    Function  : Find id(s) of nhprotein(s) by xref type and value
+    Arguments : A dictionary containing query criteria and an optional string specifying species
+    Returns   : A list of integers, or False if the query is invalid
+    Examples  : nhpids = res.find_nhprotein_ids_by_xref({'xtype': 'Ensembl', 'value': 'ENSMUSG00000062743'}, species='Mus musculus')
+    Scope     : Public
+    '''
+    if 'xtype' not in q or 'value' not in q:
+      warning(f"Invalid query parameters sent to NHProteinResolver.find_nhprotein_ids_by_xref(): {q}")
+      return False
+    index = self._xrefs.get(q['xtype'].lower())
+    if index is None:
+      warning(f"NHProteinResolver.find_nhprotein_ids_by_xref() called with unindexed xtype: {q}")
+      return False
+    return self._lookup(index, q['value'], species)
+
+  def resolve_nhprotein_ids(self, *qs, species=False):
+    '''
+    Function  : Find nhprotein ids with a chain of fallback queries
+    Arguments : Query dictionaries, tried in order, and an optional string
+                specifying species. Queries with an 'xtype' key are xref
+                queries; the rest are as for find_nhprotein_ids().
+    Returns   : A list of integers from the first query that finds any,
+                or an empty list
+    Examples  : nhpids = res.resolve_nhprotein_ids({'sym': sym}, {'geneid': geneid}, species='Rattus norvegicus')
+    Scope     : Public
+    Comments  : Queries with a None value are skipped.
+    '''
+    for q in qs:
+      if None in q.values():
+        continue
+      if 'xtype' in q:
+        ids = self.find_nhprotein_ids_by_xref(q, species=species)
+      else:
+        ids = self.find_nhprotein_ids(q, species=species)
+      if ids:
+        return ids
+    return []
+
+  def counts(self):
+    '''
+    Function  : Get the number of keys in each index
+    Arguments : N/A
+    Returns   : Dictionary of index name => key count
+    Scope     : Public
+    '''
+    counts = {f: len(idx) for f, idx in self._fields.items()}
+    for xt, idx in self._xrefs.items():
+      counts[f"xref {xt}"] = len(idx)
+    counts['nhproteins'] = len(self._species)
+    return counts
+
+  def _lookup(self, index, val, species):
+    key = _norm(val)
+    if species:
+      return _ids(index.get((_norm(species), key)))
+    ids = []
+    for sp in self._all_species:
+      ids.extend(_ids(index.get((sp, key))))
+    return ids
@@ -0,0 +1,503 @@
+'''
+SQLite backend for TCRD.DBadaptor
+
+Lets the DBAdaptor mixin methods run against an in-process SQLite
+database instead of a MySQL server, for benchmarking loaders and for
+small derived builds. The connection and cursor classes here mimic the
+parts of the mysql.connector API that the mixins use: %s placeholders,
+dictionary cursors, prepared cursors, lastrowid/rowcount and
+mysql.connector Error exceptions. The handful of MySQL-only statements
+the mixins issue (INSERT IGNORE, TRUNCATE, ALTER TABLE ... AUTO_INCREMENT,
+SELECT @@max_allowed_packet, LOAD DATA LOCAL INFILE, SHOW WARNINGS,
+CHECKSUM TABLE) are translated or emulated, as are the MySQL functions
+CRC32(), CONCAT_WS() and BIT_XOR().
+
+The schema is translated from the mysqldump file SQL/create-TCRDv7.sql.
+
+Steve Mathias
+smathias@salud.unm.edu
+'''
+import os
+import re
+import sqlite3
+import zlib
+from mysql.connector import errors
+
+# SQLite's default SQLITE_MAX_SQL_LENGTH
+MAX_STMT_BYTES = 1000000000
+if sqlite3.sqlite_version_info >= (3, 32, 0):
+  MAX_PARAMS = 32766
+else:
+  MAX_PARAMS = 999
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'SQL', 'create-TCRDv7.sql')
+
+_InsIgnoreRE = re.compile(r"^\s*INSERT\s+IGNORE\s+", re.I)
+_TruncateRE = re.compile(r"^\s*TRUNCATE\s+(?:TABLE\s+)?`?(\w+)`?\s*$", re.I)
+_AutoIncRE = re.compile(r"^\s*ALTER\s+TABLE\s+`?(\w+)`?\s+AUTO_INCREMENT\s*=\s*(\d+)\s*$", re.I)
+_MaxPacketRE = re.compile(r"^\s*SELECT\s+@@max_allowed_packet\s*$", re.I)
+_ShowWarningsRE = re.compile(r"^\s*SHOW\s+WARNINGS\s*$", re.I)
+_ChecksumRE = re.compile(r"^\s*CHECKSUM\s+TABLE\s+(.+?)\s*$", re.I|re.S)
+_LoadDataRE = re.compile(r"^\s*LOAD\s+DATA\s+LOCAL\s+INFILE\s+%s\s+INTO\s+TABLE\s+`?(\w+)`?\s+FIELDS\s+TERMINATED\s+BY\s+'\\t'\s+ESCAPED\s+BY\s+'(\\\\)?'\s+LINES\s+TERMINATED\s+BY\s+'\\n'\s+IGNORE\s+(\d+)\s+LINES\s+\((.*)\)\s*$", re.I|re.S)
+_TSVEscapes = {'N': None, 't': '\t', 'n': '\n', 'r': '\r', '\\': '\\', '0': '\0'}
+
+def connect(dbfile, schema=SCHEMA_FILE):
+  '''
+  Function  : Open (and if need be, create) a SQLite TCRD database
+  Arguments : Path to database file (or ':memory:') and optional path to
+              a MySQL create script to build the schema from
+  Returns   : SQLiteConnection object
+  Scope     : Public
+  Comments  : The schema is only loaded into a database with no tables.
+  '''
+  try:
+    cnx = sqlite3.connect(dbfile, check_same_thread=False)
+  except sqlite3.Error as e:
+    raise _map_error(e)
+  cnx.execute("PRAGMA foreign_keys = ON")
+  # MySQL functions used by DBAdaptor.get_rows_checksum()
+  cnx.create_function('CRC32', 1, lambda s: None if s is None else zlib.crc32(str(s).encode('utf-8')), deterministic=True)
+  cnx.create_function('CONCAT_WS', -1, lambda sep, *vals: sep.join([str(v) for v in vals if v is not None]), deterministic=True)
+  cnx.create_aggregate('BIT_XOR', 1, _BitXor)
+  ct = cnx.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+  if ct == 0 and schema:
+    with open(schema, 'r') as ifh:
+      cnx.executescript(translate_schema(ifh.read()))
+  return SQLiteConnection(cnx)
+
+def translate_schema(mysql_sql):
+  '''
+  Function  : Translate a mysqldump create script to SQLite DDL
+  Arguments : String containing the MySQL script
+  Returns   : String containing a SQLite script
+  Scope     : Public
+  Comments  : Handles what mysqldump 5.6 emits for TCRD: CREATE TABLE
+              statements (types, AUTO_INCREMENT, keys and foreign keys),
+              INSERTs of seed data and the final definitions of views.
+              Index names are prefixed with their table name since
+              SQLite index names are global. Columns with a
+              utf8_unicode_ci collation get COLLATE NOCASE to keep
+              lookups case-insensitive.
+  '''
+  out = ["PRAGMA foreign_keys = OFF;", "BEGIN;"]
+  views = []
+  for stmt in _split_statements(mysql_sql):
+    if stmt.startswith('/*!50001 CREATE ALGORITHM'):
+      m = re.search(r"VIEW\s+`(\w+)`\s+AS\s+(.*?)\s*\*/\s*$", stmt.replace('*/\n/*!50013', '').replace('*/\n/*!50001', ''), re.S)
+      if m:
+        views.append(f"DROP VIEW IF EXISTS `{m.group(1)}`;\nCREATE VIEW `{m.group(1)}` AS {m.group(2)};")
+    elif stmt.startswith('CREATE TABLE'):
+      out.extend(_translate_create(stmt))
+    elif stmt.startswith('INSERT INTO'):
+      out.append(_translate_literals(stmt) + ';')
+  out.extend(views)
+  out.append("COMMIT;")
+  out.append("PRAGMA foreign_keys = ON;")
+  return '\n'.join(out)
+
+def _split_statements(sql):
+  # split on semicolons outside of string literals, dropping -- comments
+  stmts = []
+  buf = []
+  quote = None
+  i = 0
+  n = len(sql)
+  while i < n:
+    c = sql[i]
+    if quote:
+      buf.append(c)
+      if c == '\\' and i+1 < n:
+        buf.append(sql[i+1])
+        i += 1
+      elif c == quote:
+        quote = None
+    elif c in ("'", '"'):
+      quote = c
+      buf.append(c)
+    elif c == '-' and sql.startswith('--', i) and (i == 0 or sql[i-1] == '\n'):
+      j = sql.find('\n', i)
+      i = n if j == -1 else j
+      continue
+    elif c == ';':
+      stmt = ''.join(buf).strip()
+      if stmt:
+        stmts.append(stmt)
+      buf = []
+    else:
+      buf.append(c)
+    i += 1
+  stmt = ''.join(buf).strip()
+  if stmt:
+    stmts.append(stmt)
+  return stmts
+
+def _translate_literals(stmt):
+  # MySQL backslash escapes in string literals -> SQLite literals
+  out = []
+  quote = None
+  i = 0
+  n = len(stmt)
+  while i < n:
+    c = stmt[i]
+    if quote:
+      if c == '\\' and i+1 < n:
+        e = stmt[i+1]
+        if e == 'n':
+          out.append('\n')
+        elif e == 't':
+          out.append('\t')
+        elif e == 'r':
+          out.append('\r')
+        elif e == '0':
+          out.append('\0')
+        elif e == "'":
+          out.append("''")
+        else:
+          out.append(e)
+        i += 2
+        continue
+      if c == quote:
+        quote = None
+        out.append("'")
+      elif c == "'":
+        out.append("''")
+      else:
+        out.append(c)
+    elif c in ("'", '"'):
+      quote = c
+      out.append("'")
+    else:
+      out.append(c)
+    i += 1
+  return ''.join(out)
+
+_ColRE = re.compile(r"^`(\w+)`\s+(\w+)(\([^)]*\))?\s*(.*?),?$")
+_KeyRE = re.compile(r"^(UNIQUE\s+|FULLTEXT\s+)?KEY\s+`(\w+)`\s+\((.*)\),?$")
+_PKRE = re.compile(r"^PRIMARY\s+KEY\s+\((.*)\),?$")
+_FKRE = re.compile(r"^(CONSTRAINT\s+`\w+`\s+FOREIGN\s+KEY.*?),?$")
+
+def _translate_create(stmt):
+  lines = stmt.split('\n')
+  table = re.match(r"CREATE TABLE `(\w+)`", lines[0]).group(1)
+  cols = []
+  pk = None
+  autoinc = None
+  indexes = []
+  fks = []
+  for line in lines[1:-1]:
+    line = line.strip()
+    m = _ColRE.match(line)
+    if m:
+      (name, mtype, size, rest) = m.groups()
+      mtype = mtype.lower()
+      if mtype in ('int', 'tinyint', 'smallint', 'mediumint', 'bigint'):
+        stype = 'INTEGER'
+      elif mtype in ('decimal', 'float', 'double'):
+        stype = 'REAL'
+      elif mtype in ('blob', 'longblob', 'mediumblob'):
+        stype = 'BLOB'
+      else:
+        stype = 'TEXT'
+      nocase = 'utf8_unicode_ci' in rest
+      rest = re.sub(r"\s*(unsigned|COLLATE \w+|CHARACTER SET \w+|ON UPDATE CURRENT_TIMESTAMP)", '', rest)
+      if 'AUTO_INCREMENT' in rest:
+        autoinc = name
+        rest = rest.replace('AUTO_INCREMENT', '').strip()
+      coldef = f"`{name}` {stype}"
+      if nocase:
+        coldef += " COLLATE NOCASE"
+      if rest:
+        coldef += ' ' + _translate_literals(rest.strip())
+      cols.append([name, coldef])
+      continue
+    m = _PKRE.match(line)
+    if m:
+      pk = m.group(1)
+      continue
+    m = _KeyRE.match(line)
+    if m:
+      (kind, iname, icols) = m.groups()
+      if kind and kind.strip().upper() == 'FULLTEXT':
+        continue
+      if not iname.startswith(table + '_'):
+        iname = f"{table}_{iname}"
+      icols = re.sub(r"\(\d+\)", '', icols)
+      unique = 'UNIQUE ' if kind else ''
+      indexes.append(f"CREATE {unique}INDEX `{iname}` ON `{table}` ({icols});")
+      continue
+    m = _FKRE.match(line)
+    if m:
+      fks.append(m.group(1))
+  defs = []
+  for (name, coldef) in cols:
+    if autoinc and name == autoinc and pk == f"`{name}`":
+      coldef = coldef.replace(f"`{name}` INTEGER", f"`{name}` INTEGER PRIMARY KEY AUTOINCREMENT", 1).replace(' NOT NULL', '', 1)
+    defs.append(coldef)
+  if pk and not (autoinc and pk == f"`{autoinc}`"):
+    defs.append(f"PRIMARY KEY ({pk})")
+  defs.extend(fks)
+  ddl = [f"CREATE TABLE `{table}` (\n  " + ',\n  '.join(defs) + "\n);"]
+  ddl.extend(indexes)
+  return ddl
+
+def _map_error(e):
+  '''
+  Map a sqlite3 exception to the equivalent mysql.connector one, so the
+  mixins' "except Error" handling (and checks for eg. 'Duplicate entry')
+  work unchanged.
+  '''
+  msg = str(e)
+  if isinstance(e, sqlite3.IntegrityError):
+    if msg.startswith('UNIQUE') or 'PRIMARY KEY' in msg:
+      return errors.IntegrityError(msg=f"Duplicate entry: {msg}", errno=1062)
+    if 'FOREIGN KEY' in msg:
+      return errors.IntegrityError(msg=f"Cannot add or update a child row: {msg}", errno=1452)
+    return errors.IntegrityError(msg=msg, errno=1048)
+  if isinstance(e, sqlite3.OperationalError):
+    if 'no such table' in msg:
+      return errors.ProgrammingError(msg=msg, errno=1146)
+    if 'no such column' in msg or 'has no column' in msg:
+      return errors.ProgrammingError(msg=msg, errno=1054)
+    if 'syntax error' in msg:
+      return errors.ProgrammingError(msg=msg, errno=1064)
+    return errors.OperationalError(msg=msg)
+  if isinstance(e, sqlite3.ProgrammingError):
+    return errors.ProgrammingError(msg=msg)
+  if isinstance(e, sqlite3.DataError):
+    return errors.DataError(msg=msg)
+  return errors.DatabaseError(msg=msg)
+
+
+class _BitXor:
+  # MySQL's BIT_XOR() aggregate, which is 0 for no rows
+  def __init__(self):
+    self.val = 0
+
+  def step(self, val):
+    if val is not None:
+      self.val ^= int(val)
+
+  def finalize(self):
+    return self.val
+
+
+class SQLiteConnection:
+  '''
+  mysql.connector-style wrapper around a sqlite3 connection.
+  '''
+  def __init__(self, cnx):
+    self._cnx = cnx
+
+  def cursor(self, dictionary=False, buffered=False, prepared=False):
+    # sqlite3 keeps its own cache of compiled statements, so prepared
+    # and buffered cursors need no special handling
+    return SQLiteCursor(self, dictionary)
+
+  def commit(self):
+    try:
+      self._cnx.commit()
+    except sqlite3.Error as e:
+      raise _map_error(e)
+
+  def rollback(self):
+    self._cnx.rollback()
+
+  def close(self):
+    self._cnx.close()
+
+  def is_connected(self):
+    try:
+      self._cnx.execute("SELECT 1")
+    except sqlite3.Error:
+      return False
+    return True
+
+
+class SQLiteCursor:
+  '''
+  mysql.connector-style cursor over a sqlite3 cursor.
+  '''
+  def __init__(self, conn, dictionary=False):
+    self._conn = conn
+    self._curs = conn._cnx.cursor()
+    self._dictionary = dictionary
+    self._rows = None # result rows for emulated statements
+    self._rowcount = -1
+    self._warnings = []
+
+  @property
+  def rowcount(self):
+    if self._rowcount != -1:
+      return self._rowcount
+    return self._curs.rowcount
+
+  @property
+  def lastrowid(self):
+    return self._curs.lastrowid
+
+  @property
+  def description(self):
+    if self._rows is not None:
+      return None
+    return self._curs.description
+
+  @property
+  def with_rows(self):
+    return self._rows is not None or self._curs.description is not None
+
+  @property
+  def column_names(self):
+    if not self._curs.description:
+      return ()
+    return tuple([d[0] for d in self._curs.description])
+
+  def execute(self, sql, params=None):
+    self._rows = None
+    self._rowcount = -1
+    try:
+      if self._emulate(sql, params):
+        return
+      self._curs.execute(self._translate(sql), params or ())
+    except sqlite3.Error as e:
+      raise _map_error(e)
+
+  def executemany(self, sql, seq_params):
+    self._rows = None
+    self._rowcount = -1
+    try:
+      self._curs.executemany(self._translate(sql), seq_params)
+    except sqlite3.Error as e:
+      raise _map_error(e)
+
+  def fetchone(self):
+    if self._rows is not None:
+      return self._rows.pop(0) if self._rows else None
+    row = self._curs.fetchone()
+    if row is not None and self._dictionary:
+      row = dict(zip(self.column_names, row))
+    return row
+
+  def fetchmany(self, size=1):
+    if self._rows is not None:
+      (rows, self._rows) = (self._rows[:size], self._rows[size:])
+      return rows
+    rows = self._curs.fetchmany(size)
+    if self._dictionary:
+      names = self.column_names
+      rows = [dict(zip(names, row)) for row in rows]
+    return rows
+
+  def fetchall(self):
+    if self._rows is not None:
+      (rows, self._rows) = (self._rows, [])
+      return rows
+    rows = self._curs.fetchall()
+    if self._dictionary:
+      names = self.column_names
+      rows = [dict(zip(names, row)) for row in rows]
+    return rows
+
+  def __iter__(self):
+    return iter(self.fetchone, None)
+
+  def close(self):
+    self._curs.close()
+
+  def _translate(self, sql):
+    # %s placeholders outside of string literals -> ?
+    if '%s' in sql:
+      parts = sql.split("'")
+      for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace('%s', '?')
+      sql = "'".join(parts)
+    sql = _InsIgnoreRE.sub('INSERT OR IGNORE ', sql)
+    return sql.replace('NOW()', 'CURRENT_TIMESTAMP')
+
+  def _emulate(self, sql, params):
+    '''
+    Run MySQL-only statements that have no direct SQLite translation.
+    Returns True if the statement was handled.
+    '''
+    m = _MaxPacketRE.match(sql)
+    if m:
+      self._rows = [{'@@max_allowed_packet': MAX_STMT_BYTES} if self._dictionary else (MAX_STMT_BYTES,)]
+      return True
+    m = _ShowWarningsRE.match(sql)
+    if m:
+      self._rows = self._warnings
+      self._warnings = []
+      return True
+    m = _ChecksumRE.match(sql)
+    if m:
+      self._rows = []
+      for table in [t.strip().strip('`') for t in m.group(1).split(',')]:
+        crc = self._checksum(table)
+        self._rows.append({'Table': table, 'Checksum': crc} if self._dictionary else (table, crc))
+      return True
+    m = _TruncateRE.match(sql)
+    if m:
+      self._curs.execute(f"DELETE FROM `{m.group(1)}`")
+      self._curs.execute("DELETE FROM sqlite_sequence WHERE name = ?", (m.group(1),))
+      self._rowcount = 0
+      return True
+    m = _AutoIncRE.match(sql)
+    if m:
+      self._curs.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (int(m.group(2)) - 1, m.group(1)))
+      return True
+    m = _LoadDataRE.match(sql)
+    if m:
+      self._load_data(params[0], m.group(1), bool(m.group(2)), int(m.group(3)),
+                      [c.strip().strip('`') for c in m.group(4).split(',')])
+      return True
+    return False
+
+  def _checksum(self, table):
+    # emulates CHECKSUM TABLE: a CRC over all rows, 0 for an empty table
+    # and None for a table that does not exist
+    try:
+      curs = self._conn._cnx.execute(f"SELECT * FROM `{table}` ORDER BY rowid")
+    except sqlite3.OperationalError:
+      return None
+    crc = 0
+    for row in curs:
+      crc = zlib.crc32(repr(row).encode('utf-8'), crc)
+    return crc
+
+  def _load_data(self, fn, table, escaped, ignore_lines, columns):
+    # emulates LOAD DATA LOCAL INFILE, including its warnings for rows
+    # with too few or too many fields
+    ncols = len(columns)
+    sql = "INSERT INTO `{}` ({}) VALUES ({})".format(table, ','.join([f"`{c}`" for c in columns]), ','.join(['?']*ncols))
+    self._warnings = []
+    def rows():
+      with open(fn, 'r') as ifh:
+        for (ln, line) in enumerate(ifh, start=1):
+          if ln <= ignore_lines:
+            continue
+          vals = line.rstrip('\n').split('\t')
+          if escaped:
+            vals = [_tsv_unescape(v) for v in vals]
+          if len(vals) < ncols:
+            self._warnings.append(('Warning', 1261, f"Row {ln-ignore_lines} doesn't contain data for all columns"))
+            vals.extend([None]*(ncols-len(vals)))
+          elif len(vals) > ncols:
+            self._warnings.append(('Warning', 1262, f"Row {ln-ignore_lines} was truncated; it contained more data than there were input columns"))
+            vals = vals[:ncols]
+          yield vals
+    self._curs.executemany(sql, rows())
+    self._rowcount = self._curs.rowcount
+
+def _tsv_unescape(val):
+  if val == '\\N':
+    return None
+  if '\\' not in val:
+    return val
+  out = []
+  i = 0
+  while i < len(val):
+    if val[i] == '\\' and i+1 < len(val):
+      out.append(_TSVEscapes.get(val[i+1], val[i+1]) or '')
+      i += 2
+    else:
+      out.append(val[i])
+      i += 1
+  return ''.join(out)
@@ -7,8 +7,10 @@ Time-stamp: <2022-09-02 14:26:59 smathias>
 '''
 from mysql.connector import Error
 from contextlib import closing
+from collections import defaultdict
 
 class UpdateMethodsMixin:
+  _BulkUpdateSize = 10000 # ids per UPDATE ... WHERE id IN (...)
 
   def upd_dataset_by_name(self, name, updates):
     colsvals = []
@@ -46,7 +48,7 @@ class UpdateMethodsMixin:
     sql = "UPDATE {} SET {} = %s WHERE id = %s".format(init['table'], init['col'])
     self._logger.debug(f"SQLpat: {sql}")
     self._logger.debug(f"SQLparams: {params}")
-    with closing(self._conn.cursor()) as curs:
+    with self._stmt_cursor(sql) as curs:
       try:
         curs.execute(sql, tuple(params))
         self._conn.commit()
@@ -77,6 +79,77 @@ class UpdateMethodsMixin:
         return False
     return row_ct
 
+  def upd_tdls(self, tdls):
+    '''
+    Function  : Set target.tdl for many targets at once
+    Arguments : A dictionary of target id => TDL
+    Returns   : Integer count of rows updated
+    Comments  : Runs one "UPDATE ... WHERE id IN (...)" per TDL (in chunks
+                of _BulkUpdateSize ids), all committed together.
+    '''
+    tdl2tids = defaultdict(list)
+    for tid,tdl in tdls.items():
+      tdl2tids[tdl].append(tid)
+    size = self._BulkUpdateSize
+    if self._max_params:
+      size = min(size, self._max_params - 1)
+    row_ct = 0
+    with closing(self._conn.cursor()) as curs:
+      try:
+        for tdl,tids in tdl2tids.items():
+          for i in range(0, len(tids), size):
+            chunk = tids[i:i+size]
+            sql = "UPDATE target SET tdl = %s WHERE id IN ({})".format(','.join(['%s']*len(chunk)))
+            self._logger.debug(f"SQLpat: {sql}")
+            curs.execute(sql, tuple([tdl] + chunk))
+            row_ct += curs.rowcount
+        self._conn.commit()
+      except Error as e:
+        self._logger.error(f"MySQL Error in upd_tdls(): {e}")
+        self._conn.rollback()
+        return False
+    return row_ct
+
+  def refresh_target_summary(self):
+    '''
+    Function  : Rebuild the target_summary table
+    Arguments : N/A
+    Returns   : Integer count of rows inserted
+    Comments  : target_summary is emptied and refilled with one
+                INSERT ... SELECT in a single transaction, so readers see
+                either the old or the new summary. Each target is
+                summarized with its lowest-id component protein.
+    '''
+    counts = [('generif_count', 'generif'), ('pubmed_count', 'protein2pubmed'),
+              ('goa_count', 'goa'), ('disease_count', 'disease'),
+              ('ortholog_count', 'ortholog')]
+    tcounts = [('drug_activity_count', 'drug_activity'), ('cmpd_activity_count', 'cmpd_activity')]
+    cols = ['target_id', 'protein_id', 'name', 'sym', 'uniprot', 'geneid', 'tdl', 'fam', 'idg', 'novelty', 'pubmed_score', 'ab_count'] + [c for (c,t) in counts + tcounts]
+    sels = ['t.id', 'p.id', 'p.name', 'p.sym', 'p.uniprot', 'p.geneid', 't.tdl', 't.fam', 't.idg', 'n.score', 'pms.number_value', 'COALESCE(ab.integer_value, 0)']
+    joins = ["LEFT JOIN (SELECT protein_id, MAX(score) AS score FROM tinx_novelty GROUP BY protein_id) n ON n.protein_id = p.id",
+             "LEFT JOIN (SELECT protein_id, MAX(number_value) AS number_value FROM tdl_info WHERE itype = 'JensenLab PubMed Score' GROUP BY protein_id) pms ON pms.protein_id = p.id",
+             "LEFT JOIN (SELECT protein_id, MAX(integer_value) AS integer_value FROM tdl_info WHERE itype = 'Ab Count' GROUP BY protein_id) ab ON ab.protein_id = p.id"]
+    for (col, table) in counts:
+      sels.append(f"COALESCE({col}.ct, 0)")
+      joins.append(f"LEFT JOIN (SELECT protein_id, COUNT(*) AS ct FROM {table} GROUP BY protein_id) {col} ON {col}.protein_id = p.id")
+    for (col, table) in tcounts:
+      sels.append(f"COALESCE({col}.ct, 0)")
+      joins.append(f"LEFT JOIN (SELECT target_id, COUNT(*) AS ct FROM {table} GROUP BY target_id) {col} ON {col}.target_id = t.id")
+    sql = "INSERT INTO target_summary ({}) SELECT {} FROM target t JOIN (SELECT target_id, MIN(protein_id) AS protein_id FROM t2tc GROUP BY target_id) tc ON tc.target_id = t.id JOIN protein p ON p.id = tc.protein_id {}".format(', '.join(cols), ', '.join(sels), ' '.join(joins))
+    self._logger.debug(f"SQL: {sql}")
+    with closing(self._conn.cursor()) as curs:
+      try:
+        curs.execute("DELETE FROM target_summary")
+        curs.execute(sql)
+        row_ct = curs.rowcount
+        self._conn.commit()
+      except Error as e:
+        self._logger.error(f"MySQL Error in refresh_target_summary(): {e}")
+        self._logger.error(f"SQL: {sql}")
+        self._conn.rollback()
+        return False
+    return row_ct
+
   def upd_pmstdlis_zero(self):
     '''
     Function  : Set all JensenLab PubMed Score' tdl_info values to 0
@@ -11,6 +11,7 @@ Time-stamp: <2021-03-03 14:14:34 smathias>
 from functools import cmp_to_key
 import logging
 from collections import defaultdict
+from TCRD.Resolver import Resolver
 import slm_util_functions as slmf
 
 def cmp_pmids_scores(a, b):
@@ -35,7 +36,7 @@ class TINX():
   _LogFile = '/tmp/TINX.log'
   _LogLevel = logging.INFO
   
-  def __init__(self, cfg, dba, do):
+  def __init__(self, cfg, dba, do, resolver=None):
     # input JensenLab mentions files:
     self._protein_file = cfg['TINX_PROTEIN_FILE']
     self._disease_file = cfg['TINX_DISEASE_FILE']
@@ -46,6 +47,9 @@ class TINX():
     # our TCRD.DBAdaptor:
     self._dba = dba
 
+    # our TCRD.Resolver, built when first needed if not passed in:
+    self._resolver = resolver
+
     # our parsed DO names and defs
     self._do = do
     
@@ -76,6 +80,8 @@ class TINX():
   def parse_protein_mentions(self):
     line_ct = slmf.wcl( self._protein_file )
     self._logger.info("Processing {} lines in protein file {}".format(line_ct, self._protein_file))
+    if not self._resolver:
+      self._resolver = Resolver(self._dba, xtypes=['Ensembl'], targets=False)
     with open(self._protein_file, 'r') as tsvf:
       ct = 0
       skip_ct = 0
@@ -88,14 +94,12 @@ class TINX():
         data = line.rstrip().split('\t')
         ensp = data[0]
         pmids = set([int(pmid) for pmid in data[1].split()])
-        pids = self._dba.find_protein_ids({'stringid': ensp})
+        # if we don't find a protein by stringid, which is the more reliable and
+        # prefered way, try by Ensembl xref
+        pids = self._resolver.resolve_protein_ids({'stringid': ensp}, {'xtype': 'Ensembl', 'value': ensp})
         if not pids:
-          # if we don't find a protein by stringid, which is the more reliable and
-          # prefered way, try by Ensembl xref
-          pids = self._dba.find_protein_ids_by_xref({'xtype': 'Ensembl', 'value': ensp})
-          if not pids:
-            notfnd.add(ensp)
-            continue
+          notfnd.add(ensp)
+          continue
         for pid in pids:
           self._pid2pmids[pid] = self._pid2pmids[pid].union(pmids)
           for pmid in pmids:
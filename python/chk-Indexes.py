@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# Time-stamp: <2026-10-17 10:12:40 smathias>
+"""Check that the TCRD.DBAdaptor find_* lookup queries use indexes.
+
+Each find_* method is called with sample queries, the statements it runs
+are captured, and their EXPLAIN plans are checked for full table (or full
+index) scans. Exits with status 1 if any statement scans.
+
+Usage:
+    chk-Indexes.py [--verbose] [--dbhost=<str>] [--dbname=<str>] [--dbfile=<file>]
+    chk-Indexes.py -h | --help
+
+Options:
+  -h --dbhost DBHOST   : MySQL database host name [default: localhost]
+  -n --dbname DBNAME   : MySQL database name [default: tcrdev]
+  -f --dbfile DBFILE   : check a SQLite TCRD database file instead
+  -v --verbose         : print the plan of every statement, not just scans
+  -? --help            : print this message and exit
+"""
+__author__    = "Steve Mathias"
+__email__     = "smathias @salud.unm.edu"
+__org__       = "Translational Informatics Division, UNM School of Medicine"
+__copyright__ = "Copyright 2026, Steve Mathias"
+__license__   = "Creative Commons Attribution-NonCommercial (CC BY-NC)"
+__version__   = "1.0.0"
+
+import os,sys,time
+from docopt import docopt
+from mysql.connector import Error
+from TCRD.DBAdaptor import DBAdaptor
+import slm_util_functions as slmf
+
+PROGRAM = os.path.basename(sys.argv[0])
+
+# (method, positional args, keyword args) for every find_* query shape
+CASES = [
+  ('find_target_ids', [{'sym': 'CHERP'}], {}),
+  ('find_target_ids', [{'sym': 'CHERP'}], {'incl_alias': True}),
+  ('find_target_ids', [{'uniprot': 'O00302'}], {}),
+  ('find_target_ids', [{'uniprot': 'O00302'}], {'incl_alias': True}),
+  ('find_target_ids', [{'name': '5HT1A_HUMAN'}], {}),
+  ('find_target_ids', [{'geneid': 167359}], {}),
+  ('find_target_ids', [{'stringid': 'ENSP00000300161'}], {}),
+  ('find_target_ids_by_xref', [{'xtype': 'Ensembl', 'value': 'ENSG00000186090'}], {}),
+  ('find_protein_ids', [{'sym': 'CHERP'}], {}),
+  ('find_protein_ids', [{'sym': 'CHERP'}], {'incl_alias': True}),
+  ('find_protein_ids', [{'uniprot': 'O00302'}], {}),
+  ('find_protein_ids', [{'uniprot': 'O00302'}], {'incl_alias': True}),
+  ('find_protein_ids', [{'name': '5HT1A_HUMAN'}], {}),
+  ('find_protein_ids', [{'geneid': 167359}], {}),
+  ('find_protein_ids', [{'stringid': 'ENSP00000300161'}], {}),
+  ('find_protein_ids_by_xref', [{'xtype': 'STRING', 'value': '9606.ENSP00000300161'}], {}),
+  ('find_target_ids_batch', [{'sym': ['CHERP', 'DRD2']}], {'incl_alias': True}),
+  ('find_target_ids_batch', [{'uniprot': ['O00302', 'P14416']}], {'incl_alias': True}),
+  ('find_target_ids_batch', [{'name': ['5HT1A_HUMAN', 'DRD2_HUMAN']}], {}),
+  ('find_target_ids_batch', [{'geneid': [167359, 1813]}], {}),
+  ('find_target_ids_batch', [{'stringid': ['ENSP00000300161', 'ENSP00000354859']}], {}),
+  ('find_protein_ids_batch', [{'sym': ['CHERP', 'DRD2']}], {'incl_alias': True}),
+  ('find_protein_ids_batch', [{'uniprot': ['O00302', 'P14416']}], {'incl_alias': True}),
+  ('find_protein_ids_batch', [{'name': ['5HT1A_HUMAN', 'DRD2_HUMAN']}], {}),
+  ('find_protein_ids_batch', [{'geneid': [167359, 1813]}], {}),
+  ('find_protein_ids_batch', [{'stringid': ['ENSP00000300161', 'ENSP00000354859']}], {}),
+  ('find_nhprotein_ids', [{'sym': 'Dact2'}], {'species': 'Mus musculus'}),
+  ('find_nhprotein_ids', [{'sym': 'Dact2'}], {}),
+  ('find_nhprotein_ids', [{'uniprot': 'Q7TN50'}], {'species': 'Mus musculus'}),
+  ('find_nhprotein_ids', [{'geneid': 240025}], {'species': 'Mus musculus'}),
+  ('find_nhprotein_ids', [{'name': 'DACT2_MOUSE'}], {'species': 'Mus musculus'}),
+  ('find_uberon_id', [{'oid': 'FMA:7088'}], {}),
+  ('find_uberon_id', [{'name': 'heart'}], {}),
+  ('find_mondoid', [{'db': 'DOID', 'value': '9352'}], {}),
+  ('find_mondoid', [{'name': 'type 2 diabetes mellitus'}], {}),
+]
+
+class CapturingConnection:
+  '''
+  Connection proxy whose cursors record the statements they execute.
+  '''
+  def __init__(self, conn):
+    self._cnx = conn
+    self.statements = []
+
+  def cursor(self, *args, **kwargs):
+    return CapturingCursor(self._cnx.cursor(*args, **kwargs), self.statements)
+
+  def __getattr__(self, name):
+    return getattr(self._cnx, name)
+
+
+class CapturingCursor:
+  def __init__(self, curs, statements):
+    self._curs = curs
+    self._statements = statements
+
+  def execute(self, sql, params=None, *args, **kwargs):
+    self._statements.append((sql, params))
+    return self._curs.execute(sql, params, *args, **kwargs)
+
+  def __getattr__(self, name):
+    return getattr(self._curs, name)
+
+
+def explain(cnx, sqlite, sql, params):
+  '''
+  Returns a list of (plan step, True if it is a full scan) tuples.
+  '''
+  steps = []
+  curs = cnx.cursor()
+  try:
+    if sqlite:
+      curs.execute("EXPLAIN QUERY PLAN " + sql, params)
+      for row in curs.fetchall():
+        detail = row[-1]
+        steps.append( (detail, detail.startswith('SCAN ') and 'CONSTANT ROW' not in detail) )
+    else:
+      curs.execute("EXPLAIN " + sql, params)
+      cols = curs.column_names
+      for row in curs.fetchall():
+        r = dict(zip(cols, row))
+        # <unionM,N> and <derivedN> rows are temporary tables
+        if r['table'] is None or r['table'].startswith('<'):
+          continue
+        step = f"{r['table']}: type={r['type']} key={r['key']}"
+        if r['Extra']:
+          step += f" ({r['Extra']})"
+        steps.append( (step, r['type'] in ('ALL', 'index')) )
+  finally:
+    curs.close()
+  return steps
+
+def check(dba, sqlite, verbose):
+  cnx = dba._dbconn
+  capture = CapturingConnection(cnx)
+  dba._dbconn = capture
+  scan_ct = 0
+  err_ct = 0
+  try:
+    for (method, args, kwargs) in CASES:
+      label = "{}({})".format(method, ', '.join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()]))
+      del capture.statements[:]
+      try:
+        getattr(dba, method)(*args, **kwargs)
+        plans = [explain(cnx, sqlite, sql, params) for (sql, params) in capture.statements]
+      except Error as e:
+        if e.errno == 1146:
+          # table doesn't exist (eg. mondo before load-Mondo.py is run)
+          print(f"SKIP  {label}\n  {e}")
+        else:
+          print(f"ERROR {label}\n  {e}")
+          err_ct += 1
+        continue
+      scans = [step for steps in plans for (step, scan) in steps if scan]
+      if scans:
+        scan_ct += 1
+        print(f"SCAN  {label}")
+      elif verbose:
+        print(f"OK    {label}")
+      if scans or verbose:
+        for ((sql, params), steps) in zip(capture.statements, plans):
+          print(f"  {sql}")
+          for (step, scan) in steps:
+            print("    {} {}".format('*' if scan else ' ', step))
+  finally:
+    dba._dbconn = cnx
+  return (scan_ct, err_ct)
+
+
+if __name__ == '__main__':
+  print("\n{} (v{}) [{}]:\n".format(PROGRAM, __version__, time.strftime("%c")))
+  start_time = time.time()
+  args = docopt(__doc__, version=__version__)
+  # statements must run on the connection being captured, so the
+  # prepared statement cache is turned off
+  if args['--dbfile']:
+    dba = DBAdaptor({'backend': 'sqlite', 'dbfile': args['--dbfile'], 'stmt_cache_size': 0})
+    print(f"Connected to SQLite TCRD database {args['--dbfile']}")
+  else:
+    dba = DBAdaptor({'dbhost': args['--dbhost'], 'dbname': args['--dbname'], 'stmt_cache_size': 0})
+    dbi = dba.get_dbinfo()
+    print("Connected to TCRD database {} (schema ver {}; data ver {})".format(args['--dbname'], dbi['schema_ver'], dbi['data_ver']))
+  (scan_ct, err_ct) = check(dba, bool(args['--dbfile']), args['--verbose'])
+  print(f"\n{len(CASES)} find_* queries checked.")
+  if scan_ct:
+    print(f"  {scan_ct} queries do full scans.")
+  else:
+    print("  All queries use indexes.")
+  if err_ct:
+    print(f"WARNING: {err_ct} queries failed.")
+  elapsed = time.time() - start_time
+  print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
+  if scan_ct or err_ct:
+    sys.exit(1)
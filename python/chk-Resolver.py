@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# Time-stamp: <2026-10-17 12:40:18 smathias>
+"""Check offline that TCRD.Resolver indexes and snapshots match the database.
+
+Builds an in-memory SQLite TCRD with generated targets, each with a
+symbol alias and Ensembl and STRING xrefs, plus mouse nhproteins with
+Ensembl and STRING xrefs of their own, some sharing values with the
+human ones (as load-UniProt writes them). A Resolver is built with a
+snapshot directory, then again from the snapshot, and every lookup of
+both is compared with the rows generated. Adding an nhprotein xref
+must leave the snapshot in use; adding a protein xref must rebuild it.
+Exits with status 1 if any check fails.
+
+Usage:
+    chk-Resolver.py [--targets=<int>]
+    chk-Resolver.py -h | --help
+
+Options:
+  -t --targets TARGETS : number of targets to generate [default: 100]
+  -? --help            : print this message and exit
+"""
+__author__    = "Steve Mathias"
+__email__     = "smathias @salud.unm.edu"
+__org__       = "Translational Informatics Division, UNM School of Medicine"
+__copyright__ = "Copyright 2026, Steve Mathias"
+__license__   = "Creative Commons Attribution-NonCommercial (CC BY-NC)"
+__version__   = "1.0.0"
+
+import os,sys,time
+import shutil,tempfile
+from docopt import docopt
+from TCRD.DBAdaptor import DBAdaptor
+from TCRD.Resolver import Resolver
+import slm_util_functions as slmf
+
+PROGRAM = os.path.basename(sys.argv[0])
+
+XTYPES = ['Ensembl', 'STRING']
+
+def load_targets(dba, n):
+  '''
+  Returns a dictionary of (field or xtype, value) => set of protein ids,
+  and a dictionary of target id => symbol alias
+  '''
+  dataset_id = dba.ins_dataset({'name': 'Resolver Check', 'source': 'Generated by ' + PROGRAM, 'app': PROGRAM, 'app_version': __version__})
+  expected = {}
+  t2alias = {}
+  for i in range(n):
+    up = f"R{i:05d}"
+    tid = dba.ins_target({'name': f"Target {i}", 'ttype': 'Single Protein',
+                          'components': {'protein': [{'name': f"{up}_HUMAN", 'description': f"Protein {i}",
+                                                      'uniprot': up, 'sym': f"SYM{i}", 'geneid': 100000+i}]}})
+    assert tid, f"Error inserting target {i}"
+    pid = dba.find_protein_ids({'uniprot': up})[0]
+    t2alias[tid] = f"ALIAS{i}"
+    # every tenth protein shares an Ensembl gene with the one before
+    ensg = "ENSG{:011d}".format(i - 1 if i % 10 == 9 else i)
+    xrefs = {'Ensembl': ensg, 'STRING': f"9606.ENSP{i:011d}"}
+    for (xtype, val) in xrefs.items():
+      assert dba.ins_xref({'protein_id': pid, 'xtype': xtype, 'dataset_id': dataset_id, 'value': val}), f"Error inserting {xtype} xref for protein {pid}"
+      expected.setdefault((xtype, val), set()).add(pid)
+    dba.ins_alias({'protein_id': pid, 'type': 'symbol', 'dataset_id': dataset_id, 'value': f"ALIAS{i}"})
+    expected.setdefault(('sym', f"SYM{i}"), set()).add(pid)
+    expected.setdefault(('uniprot', up), set()).add(pid)
+    # a mouse ortholog, half of them with a human Ensembl gene xref
+    nhpid = dba.ins_nhprotein({'uniprot': f"M{i:05d}", 'name': f"M{i:05d}_MOUSE", 'species': 'Mus musculus',
+                               'taxid': 10090, 'sym': f"Sym{i}"})
+    assert nhpid, f"Error inserting nhprotein {i}"
+    nhvals = {'Ensembl': ensg if i % 2 else f"ENSMUSG{i:011d}", 'STRING': f"10090.ENSMUSP{i:011d}"}
+    for (xtype, val) in nhvals.items():
+      assert dba.ins_xref({'nhprotein_id': nhpid, 'xtype': xtype, 'dataset_id': dataset_id, 'value': val}), f"Error inserting {xtype} xref for nhprotein {nhpid}"
+      expected.setdefault((xtype, val), set())
+  return (expected, t2alias)
+
+def check(res, expected, t2alias):
+  '''
+  Returns a list of (lookup, resolver result, expected result) for
+  lookups that differ.
+  '''
+  bad = []
+  for ((k, val), pids) in expected.items():
+    if k in XTYPES:
+      q = {'xtype': k, 'value': val}
+      got = res.find_protein_ids_by_xref(q)
+    else:
+      q = {k: val}
+      got = res.find_protein_ids(q)
+    if sorted(got or []) != sorted(pids) or None in (got or []):
+      bad.append( (q, got, sorted(pids)) )
+  for (tid, alias) in t2alias.items():
+    q = {'sym': alias}
+    got = res.find_target_ids(q, incl_alias=True)
+    if got != [tid]:
+      bad.append( (q, got, [tid]) )
+  return bad
+
+
+if __name__ == '__main__':
+  print("\n{} (v{}) [{}]:\n".format(PROGRAM, __version__, time.strftime("%c")))
+  start_time = time.time()
+  args = docopt(__doc__, version=__version__)
+  dba = DBAdaptor({'backend': 'sqlite', 'dbfile': ':memory:'})
+  (expected, t2alias) = load_targets(dba, int(args['--targets']))
+  print(f"Generated {len(t2alias)} targets and {len(t2alias)} nhproteins")
+  snapshot_dir = tempfile.mkdtemp(prefix='chk-Resolver-')
+  errs = []
+  try:
+    res = Resolver(dba, xtypes=XTYPES, snapshot_dir=snapshot_dir)
+    if res.snapshot_path():
+      errs.append("first Resolver was read from a snapshot, not the database")
+    for (q, got, exp) in check(res, expected, t2alias):
+      errs.append(f"database indexes: {q} => {got}, expected {exp}")
+    res = Resolver(dba, xtypes=XTYPES, snapshot_dir=snapshot_dir)
+    if not res.snapshot_path():
+      errs.append("second Resolver was not read from the snapshot")
+    for (q, got, exp) in check(res, expected, t2alias):
+      errs.append(f"snapshot indexes: {q} => {got}, expected {exp}")
+    # nhprotein xrefs aren't indexed, so they must not change the tags
+    nhpid = dba.ins_nhprotein({'uniprot': 'MNEW01', 'name': 'MNEW01_MOUSE', 'species': 'Mus musculus', 'taxid': 10090})
+    dba.ins_xref({'nhprotein_id': nhpid, 'xtype': 'Ensembl', 'dataset_id': 1, 'value': 'ENSMUSGNEW'})
+    if not Resolver(dba, xtypes=XTYPES, snapshot_dir=snapshot_dir).snapshot_path():
+      errs.append("adding an nhprotein xref rebuilt the snapshot")
+    pid = list(expected[('uniprot', 'R00000')])[0]
+    dba.ins_xref({'protein_id': pid, 'xtype': 'Ensembl', 'dataset_id': 1, 'value': 'ENSGNEW'})
+    expected[('Ensembl', 'ENSGNEW')] = set([pid])
+    res = Resolver(dba, xtypes=XTYPES, snapshot_dir=snapshot_dir)
+    if res.snapshot_path():
+      errs.append("adding a protein xref did not rebuild the snapshot")
+    for (q, got, exp) in check(res, expected, t2alias):
+      errs.append(f"rebuilt indexes: {q} => {got}, expected {exp}")
+  finally:
+    shutil.rmtree(snapshot_dir, True)
+  for err in errs:
+    print(f"ERROR: {err}")
+  if errs:
+    print(f"\n{len(errs)} Resolver errors.")
+  else:
+    print(f"\n{len(expected)} lookups agree, from the database and the snapshot.")
+  elapsed = time.time() - start_time
+  print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
+  if errs:
+    sys.exit(1)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Time-stamp: <2026-10-17 11:02:15 smathias>
+"""Check that the TCRD.DBAdaptor prepared statement cache prepares each statement once.
+
+Each find_* query shape is run repeatedly, with its SQL built anew on
+every call as the methods do, and the number of statements sent to be
+prepared is compared with the number of distinct statements. Exits with
+status 1 if any statement is prepared more than once.
+
+Usage:
+    chk-StmtCache.py [--reps=<int>] [--dbhost=<str>] [--dbname=<str>] [--dbfile=<file>]
+    chk-StmtCache.py -h | --help
+
+Options:
+  -h --dbhost DBHOST   : MySQL database host name [default: localhost]
+  -n --dbname DBNAME   : MySQL database name [default: tcrdev]
+  -f --dbfile DBFILE   : check a SQLite TCRD database file (or :memory:) instead
+  -r --reps REPS       : number of times each query is run [default: 5]
+  -? --help            : print this message and exit
+"""
+__author__    = "Steve Mathias"
+__email__     = "smathias @salud.unm.edu"
+__org__       = "Translational Informatics Division, UNM School of Medicine"
+__copyright__ = "Copyright 2026, Steve Mathias"
+__license__   = "Creative Commons Attribution-NonCommercial (CC BY-NC)"
+__version__   = "1.0.0"
+
+import os,sys,time
+from docopt import docopt
+from TCRD.DBAdaptor import DBAdaptor
+import slm_util_functions as slmf
+
+PROGRAM = os.path.basename(sys.argv[0])
+
+# (method, query, keyword args) for the find_* methods that use the cache
+CASES = [
+  ('find_protein_ids', {'sym': 'CHERP'}, {}),
+  ('find_protein_ids', {'uniprot': 'O00302'}, {'incl_alias': True}),
+  ('find_protein_ids', {'geneid': 167359}, {}),
+  ('find_target_ids', {'sym': 'CHERP'}, {}),
+  ('find_target_ids', {'stringid': 'ENSP00000300161'}, {}),
+  ('find_protein_ids_by_xref', {'xtype': 'STRING', 'value': '9606.ENSP00000300161'}, {}),
+]
+
+def check(dba, reps):
+  '''
+  Returns a list of (method, query, prepares, statements) tuples for
+  queries with statements that were prepared more than once.
+  '''
+  bad = []
+  for (method, q, kwargs) in CASES:
+    before = dba.get_stmt_cache_stats()
+    for i in range(reps):
+      # a new dict on each call, as loaders pass
+      getattr(dba, method)(dict(q), **kwargs)
+    after = dba.get_stmt_cache_stats()
+    prepares = after['prepares'] - before['prepares']
+    stmts = after['misses'] - before['misses']
+    if prepares > stmts:
+      bad.append( (method, q, prepares, stmts) )
+  return bad
+
+
+if __name__ == '__main__':
+  print("\n{} (v{}) [{}]:\n".format(PROGRAM, __version__, time.strftime("%c")))
+  start_time = time.time()
+  args = docopt(__doc__, version=__version__)
+  if args['--dbfile']:
+    dba = DBAdaptor({'backend': 'sqlite', 'dbfile': args['--dbfile']})
+    print(f"Connected to SQLite TCRD database {args['--dbfile']}")
+  else:
+    dba = DBAdaptor({'dbhost': args['--dbhost'], 'dbname': args['--dbname']})
+    dbi = dba.get_dbinfo()
+    print("Connected to TCRD database {} (schema ver {}; data ver {})".format(args['--dbname'], dbi['schema_ver'], dbi['data_ver']))
+  reps = int(args['--reps'])
+  bad = check(dba, reps)
+  for (method, q, prepares, stmts) in bad:
+    print(f"REPREPARED {method}({q!r}): {prepares} prepares for {stmts} statements")
+  stats = dba.get_stmt_cache_stats()
+  print(f"\n{len(CASES)} find_* queries run {reps} times each.")
+  print("  Statement cache: {} hits, {} misses, {} prepares".format(stats['hits'], stats['misses'], stats['prepares']))
+  if bad:
+    print(f"  {len(bad)} queries re-prepare their statements.")
+  else:
+    print("  No statement was prepared more than once.")
+  elapsed = time.time() - start_time
+  print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
+  if bad:
+    sys.exit(1)
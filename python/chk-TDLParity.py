@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Time-stamp: <2026-10-17 11:48:02 smathias>
+"""Check offline that all-at-once and per-target TDL calculation agree.
+
+Builds an in-memory SQLite TCRD with one generated target for every
+combination of TDL inputs - drug activities with and without MoA,
+cmpd activities, PubMed Score, GeneRIF and Ab Count values either side
+of the dark point thresholds, Experimental MF/BP Leaf Term GOA and
+missing tdl_infos - and runs check_tdl_parity() on it. The only
+differences allowed are per-target calculation failures for targets
+with missing tdl_infos, which compute_tdls() counts as 0. Exits with
+status 1 if there are any others.
+
+Usage:
+    chk-TDLParity.py [--verbose]
+    chk-TDLParity.py -h | --help
+
+Options:
+  -v --verbose         : print the TDL of every generated target
+  -? --help            : print this message and exit
+"""
+__author__    = "Steve Mathias"
+__email__     = "smathias @salud.unm.edu"
+__org__       = "Translational Informatics Division, UNM School of Medicine"
+__copyright__ = "Copyright 2026, Steve Mathias"
+__license__   = "Creative Commons Attribution-NonCommercial (CC BY-NC)"
+__version__   = "1.0.0"
+
+import os,sys,time
+import itertools
+from docopt import docopt
+from TCRD.DBAdaptor import DBAdaptor
+import slm_util_functions as slmf
+from tcrd_functions import compute_tdls, check_tdl_parity
+
+PROGRAM = os.path.basename(sys.argv[0])
+
+# values of each TDL input; None means no tdl_info row
+DRUGS = [None, 'moa', 'non-moa']
+CMPDS = [False, True]
+PMSS = [None, 4.99, 5.0]
+RIF_CTS = [3, 4]
+AB_CTS = [None, 50, 51]
+EFL_GOAS = [False, True]
+
+def load_targets(dba):
+  '''
+  Returns a dictionary of target id => (drug, cmpd, pms, rif_ct, ab_ct, efl_goa)
+  '''
+  dba.ins_dataset({'name': 'TDL Parity Check', 'source': 'Generated by ' + PROGRAM, 'app': PROGRAM, 'app_version': __version__})
+  combos = {}
+  generifs = []
+  for (i, combo) in enumerate(itertools.product(DRUGS, CMPDS, PMSS, RIF_CTS, AB_CTS, EFL_GOAS)):
+    (drug, cmpd, pms, rif_ct, ab_ct, efl_goa) = combo
+    up = f"T{i:05d}"
+    tid = dba.ins_target({'name': f"Target {i}", 'ttype': 'Single Protein',
+                          'components': {'protein': [{'name': f"{up}_HUMAN", 'description': f"Protein {i}", 'uniprot': up}]}})
+    assert tid, f"Error inserting target {i}"
+    pid = dba.find_protein_ids({'uniprot': up})[0]
+    if drug:
+      dba.ins_drug_activity({'target_id': tid, 'drug': f"drug{i}", 'dcid': i, 'has_moa': int(drug == 'moa')})
+    if cmpd:
+      dba.ins_cmpd_activity({'target_id': tid, 'catype': 'ChEMBL', 'cmpd_id_in_src': f"CHEMBL{i}"})
+    if pms is not None:
+      dba.ins_tdl_info({'protein_id': pid, 'itype': 'JensenLab PubMed Score', 'number_value': pms})
+    if ab_ct is not None:
+      dba.ins_tdl_info({'protein_id': pid, 'itype': 'Ab Count', 'integer_value': ab_ct})
+    if efl_goa:
+      dba.ins_tdl_info({'protein_id': pid, 'itype': 'Experimental MF/BP Leaf Term GOA', 'integer_value': 1})
+    generifs.extend([(pid, str(n), f"GeneRIF {n}") for n in range(rif_ct)])
+    combos[tid] = combo
+  rv = dba.bulk_load_tsv('generif', ['protein_id', 'pubmed_ids', 'text'], generifs)
+  assert rv == len(generifs), "Error loading generifs"
+  return combos
+
+def check(dba, combos, verbose=False):
+  '''
+  Returns a list of (target id, inputs, per-target result, all-at-once
+  result) for unexpected differences.
+  '''
+  bad = []
+  for (tid, scalar, vect) in check_tdl_parity(dba):
+    (drug, cmpd, pms, rif_ct, ab_ct, efl_goa) = combos[tid]
+    missing = (pms is None or ab_ct is None) and not drug and not cmpd
+    if type(scalar) == str and missing:
+      continue
+    bad.append( (tid, combos[tid], scalar, vect) )
+  if verbose:
+    (tdls, bumped, counts) = compute_tdls(dba.get_tdl_inputs())
+    for (tid, combo) in combos.items():
+      print("  {}: {} {}{}".format(tid, combo, tdls[tid], ' (bumped)' if tid in bumped else ''))
+  return bad
+
+
+if __name__ == '__main__':
+  print("\n{} (v{}) [{}]:\n".format(PROGRAM, __version__, time.strftime("%c")))
+  start_time = time.time()
+  args = docopt(__doc__, version=__version__)
+  dba = DBAdaptor({'backend': 'sqlite', 'dbfile': ':memory:'})
+  combos = load_targets(dba)
+  print(f"Generated {len(combos)} targets")
+  bad = check(dba, combos, args['--verbose'])
+  (tdls, bumped, counts) = compute_tdls(dba.get_tdl_inputs())
+  print("  {} Tclin, {} Tchem, {} Tbio ({} bumped from Tdark), {} Tdark".format(counts['Tclin'], counts['Tchem'], counts['Tbio'], len(bumped), counts['Tdark']))
+  for (tid, combo, scalar, vect) in bad:
+    print(f"MISMATCH target {tid} {combo}: per-target {scalar}, all-at-once {vect}")
+  if bad:
+    print(f"\n{len(bad)} TDL mismatches.")
+  else:
+    print("\nAll-at-once and per-target TDLs agree.")
+  elapsed = time.time() - start_time
+  print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
+  if bad:
+    sys.exit(1)
@@ -21,13 +21,12 @@ OUTFILE = f'{OUTDIR}PharosTCRD_UniProt_Mapping.tsv'
 ARCHIVE_FILEPAT = OUTDIR + 'old_versions/PharosTCRDv{}_UniProt_Mapping.tsv'
 
 def run(dba):
-  uptdls = dba.get_uniprots_tdls()
-  ct = len(uptdls)
+  ct = dba.get_row_count('t2tc')
   exp_ct = 0
   print(f"\nExporting UniProts/TDLs for {ct} TCRD targets")
   with open(OUTFILE, 'w') as ofh:
     ofh.write(f"UniProt_accession\tPharos_target\tTDL\n")
-    for d in uptdls:
+    for d in dba.iter_uniprots_tdls():
       ofh.write(f"{d['uniprot']}\t{d['uniprot']}\t{d['tdl']}\n")
       exp_ct += 1
       slmf.update_progress(exp_ct/ct)
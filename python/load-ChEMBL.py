@@ -40,6 +40,7 @@ from operator import itemgetter
 import copy
 import logging
 import slm_util_functions as slmf
+from tcrd_functions import refresh_target_summary
 
 PROGRAM = os.path.basename(sys.argv[0])
 TCRD_VER = '6' ## !!! CHECK THIS IS CORRECT !!! ##
@@ -371,6 +372,8 @@ if __name__ == '__main__':
   for prov in provs:
     rv = dba.ins_provenance(prov)
     assert rv, "Error inserting provenance. See logfile {logfile} for details."
+  # cmpd activity counts are in target_summary
+  refresh_target_summary(dba, logfile)
     
   elapsed = time.time() - start_time
   print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
@@ -31,10 +31,12 @@ __version__   = "6.0.1"
 import os,sys,time
 from docopt import docopt
 from TCRD.DBAdaptor import DBAdaptor
+from TCRD.Resolver import Resolver
 import logging
 import csv
 from collections import defaultdict
 import slm_util_functions as slmf
+from tcrd_functions import refresh_target_summary
 
 PROGRAM = os.path.basename(sys.argv[0])
 TCRD_VER = '6' ## !!! CHECK THIS IS CORRECT !!! ##
@@ -46,6 +48,7 @@ TCHEM_FILE = f'../data/DrugCentral/tcrd{DC_RELEASE}/tchem_drugs.tsv'
 DRUGINFO_FILE = f'../data/DrugCentral/tcrd{DC_RELEASE}/drug_info.tsv'
 DRUGIND_FILE = f'../data/DrugCentral/tcrd{DC_RELEASE}/drug_indications.tsv'
 DRUGNAME_FILE = f'../data/DrugCentral/tcrd{DC_RELEASE}/drug_names.tsv'
+RESOLVER_DIR = '../data/resolver/' # shared TCRD.Resolver snapshots
 SRC_FILES = [os.path.basename(TCLIN_FILE),
              os.path.basename(TCHEM_FILE),
              os.path.basename(DRUGINFO_FILE),
@@ -97,6 +100,7 @@ def load(args, dba, logfile, logger):
   # MOA activities
   #
   drug2tids = defaultdict(set)
+  res = Resolver(dba, xtypes=[], snapshot_dir=RESOLVER_DIR)
   line_ct = slmf.wcl(TCLIN_FILE)
   if not args['--quiet']:
     print(f"\nProcessing {line_ct} lines from DrugDB MOA activities file {TCLIN_FILE}")
@@ -123,12 +127,10 @@ def load(args, dba, logfile, logger):
         logger.warning(f"No DrugCentral id found for MoA drug: '{drug}'")
         continue
       dcid = name2id[drug]
-      tids = dba.find_target_ids({'uniprot': up})
+      tids = res.resolve_target_ids({'uniprot': up}, {'name': sp})
       if not tids:
-        tids = dba.find_target_ids({'name': sp})
-        if not tids:
-          notfnd.append(f'{up}|{sp}')
-          continue
+        notfnd.append(f'{up}|{sp}')
+        continue
       tid = tids[0]
       drug2tids[drug].add(tid)
       init = {'target_id': tid, 'drug': drug, 'dcid': dcid, 'has_moa': 1, 'source': row[5]}
@@ -192,12 +194,10 @@ def load(args, dba, logfile, logger):
         logger.warning(f"No DrugCentral id found for drug: '{drug}'")
         continue
       dcid = name2id[drug]
-      tids = dba.find_target_ids({'uniprot': up})
+      tids = res.resolve_target_ids({'uniprot': up}, {'name': sp})
       if not tids:
-        tids = dba.find_target_ids({'name': sp})
-        if not tids:
-          notfnd.append(f'{up}|{sp}')
-          continue
+        notfnd.append(f'{up}|{sp}')
+        continue
       tid = tids[0]
       drug2tids[drug].add(tid)
       init = {'target_id': tid, 'drug': drug, 'dcid': dcid, 'has_moa': 0, 'source': row[5]}
@@ -325,6 +325,8 @@ if __name__ == '__main__':
   for prov in provs:
     rv = dba.ins_provenance(prov)
     assert rv, "Error inserting provenance. See logfile {logfile} for details."
+  # drug activity and disease counts are in target_summary
+  refresh_target_summary(dba, logfile)
 
   elapsed = time.time() - start_time
   print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
@@ -46,14 +46,13 @@ GLYGEN_PROTEIN_PAGE_URL = 'https://glygen.org/protein/{}'
 TIGA_PAGE_URL = 'https://unmtid-shinyapps.net/shiny/tiga/?gene={}' #ENSG00000115977
 
 def do_tiga(dba, logger, logfile):
-  tigas = dba.get_tigas()
-  tigact = len(tigas)
+  tigact = dba.get_row_count('tiga', distinct='protein_id, ensg')
   print(f"\nLoading {tigact} TIGA ExtLinks for TCRD proteins")
   ct = 0
   el_ct = 0
   pmark = {}
   dba_err_ct = 0
-  for d in tigas:
+  for d in dba.iter_tigas():
     ct += 1
     slmf.update_progress(ct/tigact)
     rv = dba.ins_extlink( {'source': 'TIGA', 'protein_id': d['protein_id'],
@@ -68,15 +67,14 @@ def do_tiga(dba, logger, logfile):
     print(f"ERROR: {dba_err_ct} DB errors occurred. See logfile {logfile} for details.")
 
 def do_glygen(dba, logger, logfile):
-  proteins = dba.get_proteins()
-  pct = len(proteins)
+  pct = dba.get_row_count('protein')
   print(f"\nChecking/Loading GlyGen ExtLinks for {pct} TCRD proteins")
   ct = 0
   el_ct = 0
   notfnd = set()
   api_err_ct = 0
   dba_err_ct = 0
-  for p in proteins:
+  for p in dba.iter_proteins():
     logger.info(f"Processing protein {p['id']}: {p['uniprot']}")
     ct += 1
     slmf.update_progress(ct/pct)
@@ -31,15 +31,18 @@ __version__ = "4.0.0"
 import os,sys,time
 from docopt import docopt
 from TCRD.DBAdaptor import DBAdaptor
+from TCRD.Resolver import Resolver
 import logging
 import csv
 import slm_util_functions as slmf
+from tcrd_functions import refresh_target_summary
 
 PROGRAM = os.path.basename(sys.argv[0])
 TCRD_VER = '7' ## !!! CHECK THIS IS CORRECT !!! ##
 LOGDIR = f"../log/tcrd{TCRD_VER}logs/"
 LOGFILE = f"{LOGDIR}/{PROGRAM}.log"
 HGNC_TSV_FILE = '../data/HGNC/HGNC_20210120.tsv'
+RESOLVER_DIR = '../data/resolver/' # shared TCRD.Resolver snapshots
 
 def load(args, dba, dataset_id, logger, logfile):
   line_ct = slmf.wcl(HGNC_TSV_FILE)
@@ -56,6 +59,7 @@ def load(args, dba, dataset_id, logger, logfile):
   notfnd = set()
   pmark = {}
   db_err_ct = 0
+  res = Resolver(dba, xtypes=[], targets=False, snapshot_dir=RESOLVER_DIR)
   with open(HGNC_TSV_FILE, 'r') as ifh:
     tsvreader = csv.reader(ifh, delimiter='\t')
     for row in tsvreader:
@@ -82,11 +86,7 @@ def load(args, dba, dataset_id, logger, logfile):
         up = row[7]
       else:
         up = None
-      pids = dba.find_protein_ids({'sym': sym})
-      if not pids and geneid:
-        pids = dba.find_protein_ids({'geneid': geneid})
-      if not pids and up:
-        pids = dba.find_protein_ids({'uniprot': up})
+      pids = res.resolve_protein_ids({'sym': sym}, {'geneid': geneid}, {'uniprot': up})
       if up and not pids:
         notfnd.add(f"{sym}|{geneid}|{up}")
         logger.warning(f"No protein found for {sym}|{geneid}|{up}")
@@ -115,12 +115,13 @@ def load(args, dba, dataset_id, logger, logfile):
           chr_ct += 1
         else:
           db_err_ct += 1
-        p = dba.get_protein(pid)
+        p = dba.get_protein(pid, columns=['sym', 'geneid', 'uniprot'])
         # Add missing syms
         if p['sym'] == None:
           rv = dba.do_update({'table': 'protein', 'col': 'sym', 'id': pid, 'val': sym})
           if rv:
             logger.info("Inserted new sym {} for protein {}|{}".format(sym, pid, p['uniprot']))
+            res.add_protein_value(pid, 'sym', sym)
             sym_ct += 1
           else:
             db_err_ct += 1
@@ -135,6 +136,7 @@ def load(args, dba, dataset_id, logger, logfile):
             rv = dba.do_update({'table': 'protein', 'col': 'geneid', 'id': pid, 'val': geneid})
             if rv:
               logger.info("Inserted new geneid {} for protein {}, {}".format(geneid, pid, p['uniprot']))
+              res.add_protein_value(pid, 'geneid', geneid)
               geneid_ct += 1
             else:
               db_err_ct += 1
@@ -203,6 +205,8 @@ if __name__ == '__main__':
     assert rv, f"Error inserting provenance. See logfile {logfile} for details."
 
   load(args, dba, dataset_id, logger, logfile)
+  # syms and geneids are in target_summary
+  refresh_target_summary(dba, logfile)
     
   elapsed = time.time() - start_time
   print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
@@ -34,6 +34,7 @@ from TCRD.DBAdaptor import DBAdaptor
 import logging
 import json
 import slm_util_functions as slmf
+from tcrd_functions import refresh_target_summary
 
 PROGRAM = os.path.basename(sys.argv[0])
 TCRD_VER = '6' ## !!! CHECK THIS IS CORRECT !!! ##
@@ -54,6 +55,7 @@ def load(args, dba, logger, logfile):
     idglist = json.load(ifh)
   lstct = len(idglist)
   print(f"Got {lstct} eligible targets from current IDG target list")
+  sym2tids = dba.find_target_ids_batch({'sym': [d['Gene'] for d in idglist]})
   for d in idglist:
     ct += 1
     slmf.update_progress(ct/lstct)
@@ -61,7 +63,7 @@ def load(args, dba, logger, logfile):
     fam = d['IDGFamily']
     if fam == 'IonChannel':
       fam = 'IC'
-    tids = dba.find_target_ids({'sym': sym})
+    tids = sym2tids[sym]
     if not tids:
       notfnd.append(sym)
       continue
@@ -135,6 +137,8 @@ if __name__ == '__main__':
   for prov in provs:
     rv = dba.ins_provenance(prov)
     assert rv, f"Error inserting provenance. See logfile {logfile} for details."
+  # IDG flags and families are in target_summary
+  refresh_target_summary(dba, logfile)
 
   elapsed = time.time() - start_time
   print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
@@ -31,6 +31,7 @@ __version__   = "3.0.0"
 import os,sys,time
 from docopt import docopt
 from TCRD.DBAdaptor import DBAdaptor
+from TCRD.Resolver import NHProteinResolver
 from urllib.request import urlretrieve
 import gzip
 import csv
@@ -45,6 +46,7 @@ DOWNLOAD_DIR = '../data/IMPC/'
 BASE_URL = 'ftp://ftp.ebi.ac.uk/pub/databases/impc/all-data-releases/latest/results/'
 GENO_PHENO_FILE = 'genotype-phenotype-assertions-IMPC.csv.gz'
 STAT_RES_FILE = 'statistical-results-ALL.csv.gz'
+BULK_INS_SIZE = 10000 # rows per dba.ins_many() call
 
 def download(args):
   for gzfn in [GENO_PHENO_FILE, STAT_RES_FILE]:
@@ -67,14 +69,16 @@ def download(args):
     ofh.close()
 
 def load(args, dba, logger, logfile):
+  # mouse symbol => nhprotein id lookups for both files are done from memory
+  nhres = NHProteinResolver(dba, species=['Mus musculus'], xtypes=[])
   fn = DOWNLOAD_DIR + GENO_PHENO_FILE.replace('.gz', '')
   line_ct = slmf.wcl(fn)
   if not args['--quiet']:
     print(f"\nProcessing {line_ct} lines in input file {fn}")
   ct = 0
+  pt_rows = []
   pt_ct = 0
   pmark = {}
-  sym2nhpids = {}
   notfnd = set()
   skip_ct = 0
   dba_err_ct = 0
@@ -120,19 +124,14 @@ def load(args, dba, logger, logfile):
         # skip data with neither a term_id or term_name
         skip_ct += 1
         continue
-      if sym in sym2nhpids:
-        # we've already found it
-        nhpids = sym2nhpids[sym]
-      elif sym in notfnd:
+      if sym in notfnd:
         # we've already not found it
         continue
-      else:
-        nhpids = dba.find_nhprotein_ids({'sym': sym}, species = 'Mus musculus')
-        if not nhpids:
-          notfnd.add(sym)
-          logger.warning("No nhprotein found for symbol {}".format(sym))
-          continue
-        sym2nhpids[sym] = nhpids # save this mapping so we only lookup each symbol once
+      nhpids = nhres.find_nhprotein_ids({'sym': sym}, species = 'Mus musculus')
+      if not nhpids:
+        notfnd.add(sym)
+        logger.warning("No nhprotein found for symbol {}".format(sym))
+        continue
       pval = None
       if row[23] and row[23] != '':
         try:
@@ -143,12 +142,24 @@ def load(args, dba, logger, logfile):
       if row[4] and len(row[4]) <= 8:
         sex = row[4]
       for nhpid in nhpids:
-        rv = dba.ins_phenotype({'nhprotein_id': nhpid, 'ptype': 'IMPC', 'top_level_term_id': row[19], 'top_level_term_name': row[20], 'term_id': row[21], 'term_name': row[22], 'p_value': pval, 'percentage_change': row[24], 'effect_size': row[25], 'procedure_name': row[16], 'parameter_name': row[18], 'statistical_method': row[26], 'sex': sex, 'gp_assoc': 1})
-        if rv:
-          pmark[nhpid] = True
-          pt_ct += 1
+        pt_rows.append({'nhprotein_id': nhpid, 'ptype': 'IMPC', 'top_level_term_id': row[19], 'top_level_term_name': row[20], 'term_id': row[21], 'term_name': row[22], 'p_value': pval, 'percentage_change': row[24], 'effect_size': row[25], 'procedure_name': row[16], 'parameter_name': row[18], 'statistical_method': row[26], 'sex': sex, 'gp_assoc': 1})
+      if len(pt_rows) >= BULK_INS_SIZE:
+        rv = dba.ins_many('phenotype', pt_rows)
+        if rv is False:
+          dba_err_ct += len(pt_rows)
         else:
-          dba_err_ct += 1
+          pt_ct += rv
+          for r in pt_rows:
+            pmark[r['nhprotein_id']] = True
+        pt_rows = []
+  if pt_rows:
+    rv = dba.ins_many('phenotype', pt_rows)
+    if rv is False:
+      dba_err_ct += len(pt_rows)
+    else:
+      pt_ct += rv
+      for r in pt_rows:
+        pmark[r['nhprotein_id']] = True
   print(f"{ct} lines processed.")
   print("Loaded {} IMPC phenotypes for {} nhproteins".format(pt_ct, len(pmark)))
   if notfnd:
@@ -163,9 +174,9 @@ def load(args, dba, logger, logfile):
   if not args['--quiet']:
     print(f"\nProcessing {line_ct} lines from input file {fn}")
   ct = 0
+  pt_rows = []
   pt_ct = 0
   pmark = {}
-  sym2nhpids = {}
   notfnd = set()
   skip_ct = 0
   pv_ct = 0
@@ -271,19 +282,14 @@ def load(args, dba, logger, logfile):
         # skip lines with neither a term_id or term_name
         skip_ct += 1
         continue
-      if sym in sym2nhpids:
-        # we've already found it
-        nhpids = sym2nhpids[sym]
-      elif sym in notfnd:
+      if sym in notfnd:
         # we've already not found it
         continue
-      else:
-        nhpids = dba.find_nhprotein_ids({'sym': sym}, species = 'Mus musculus')
-        if not nhpids:
-          notfnd.add(sym)
-          logger.warning("No nhprotein found for symbol {}".format(sym))
-          continue
-        sym2nhpids[sym] = nhpids # save this mapping so we only lookup each symbol once
+      nhpids = nhres.find_nhprotein_ids({'sym': sym}, species = 'Mus musculus')
+      if not nhpids:
+        notfnd.add(sym)
+        logger.warning("No nhprotein found for symbol {}".format(sym))
+        continue
       pval = None
       if row[40] and row[40] != '':
         try:
@@ -294,12 +300,24 @@ def load(args, dba, logger, logfile):
       if row[4] and len(row[4]) <= 8:
         sex = row[4]
       for nhpid in nhpids:
-        rv = dba.ins_phenotype({'nhprotein_id': nhpid, 'ptype': 'IMPC', 'top_level_term_id': row[36], 'top_level_term_name': row[56], 'term_id': row[62], 'term_name': row[28], 'p_value': pval, 'effect_size': row[72], 'procedure_name': row[34], 'parameter_name': row[16], 'statistical_method': row[65], 'sex': sex, 'gp_assoc': 0})
-        if rv:
-          pmark[nhpid] = True
-          pt_ct += 1
+        pt_rows.append({'nhprotein_id': nhpid, 'ptype': 'IMPC', 'top_level_term_id': row[36], 'top_level_term_name': row[56], 'term_id': row[62], 'term_name': row[28], 'p_value': pval, 'effect_size': row[72], 'procedure_name': row[34], 'parameter_name': row[16], 'statistical_method': row[65], 'sex': sex, 'gp_assoc': 0})
+      if len(pt_rows) >= BULK_INS_SIZE:
+        rv = dba.ins_many('phenotype', pt_rows)
+        if rv is False:
+          dba_err_ct += len(pt_rows)
         else:
-          dba_err_ct += 1
+          pt_ct += rv
+          for r in pt_rows:
+            pmark[r['nhprotein_id']] = True
+        pt_rows = []
+  if pt_rows:
+    rv = dba.ins_many('phenotype', pt_rows)
+    if rv is False:
+      dba_err_ct += len(pt_rows)
+    else:
+      pt_ct += rv
+      for r in pt_rows:
+        pmark[r['nhprotein_id']] = True
   print(f"{ct} lines processed.")
   print("Loaded {} IMPC phenotypes for {} nhproteins".format(pt_ct, len(pmark)))
   if notfnd:
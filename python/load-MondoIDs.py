@@ -68,8 +68,10 @@ if __name__ == '__main__':
   if not args['--quiet']:
     print("Connected to TCRD database {} (schema ver {}; data ver {})".format(args['--dbname'], dbi['schema_ver'], dbi['data_ver']))
 
-  diseases = dba.get_diseases()
-  dis_ct = len(diseases)
+  # names are matched case-insensitively, from memory
+  mondo_names = dba.get_mondo_name_map()
+  print(f"Loaded {len(mondo_names)} Mondo names")
+  dis_ct = dba.get_row_count('disease')
   print(f"Processing {dis_ct} disease rows")
   ct = 0
   notfnd = []
@@ -77,28 +79,29 @@ if __name__ == '__main__':
   did2mondoid = defaultdict(list)
   upd_ct = 0
   dba_err_ct = 0
-  for dis in diseases:
-    ct += 1
-    mondoid = None
-    if dis['did']:
-      (db, val) = dis['did'].split(':')
-      mondoid = dba.find_mondoid({'db': db, 'value': val})
-      if mondoid:
-        did2mondoid[did].append(mondoid)
-    if not mondoid:
-      mondoid = dba.find_mondoid({'name': dis['name']})
-      if mondoid:
-        name2mondoid[dis['name']].append(mondoid)
-    if not mondoid:
-      notfnd.append(dis)
-      continue
-    rv = dba.do_update({'table': 'disease', 'id': dis['id'],
-                        'col': 'mondoid', 'val': mondoid})
-    if rv:
-      upd_ct += 1
-    else:
-      dba_err_ct += 1
-    slmf.update_progress(ct/dis_ct)
+  with dba.batch(commit_every=10000):
+    for dis in dba.iter_diseases():
+      ct += 1
+      mondoid = None
+      if dis['did']:
+        (db, val) = dis['did'].split(':')
+        mondoid = dba.find_mondoid({'db': db, 'value': val})
+        if mondoid:
+          did2mondoid[dis['did']].append(mondoid)
+      if not mondoid:
+        mondoid = mondo_names.get(dis['name'].lower())
+        if mondoid:
+          name2mondoid[dis['name']].append(mondoid)
+      if not mondoid:
+        notfnd.append(dis)
+        continue
+      rv = dba.do_update({'table': 'disease', 'id': dis['id'],
+                          'col': 'mondoid', 'val': mondoid})
+      if rv:
+        upd_ct += 1
+      else:
+        dba_err_ct += 1
+      slmf.update_progress(ct/dis_ct)
   print(f"{ct} disease rows processed.")
   print(f"  Updated {upd_ct} rows with mondoids")
   
@@ -85,28 +85,28 @@ def get_chembl2pc():
 
     
 def load(args, dba, chembl2pc, logfile, logger):
-  cmpd_activities = dba.get_cmpd_activities(catype = 'ChEMBL')
-  ca_ct = len(cmpd_activities)
+  ca_ct = dba.get_row_count('cmpd_activity', where="catype = 'ChEMBL'")
   if not args['--quiet']:
-    print("\nLoading PubChem CIDs for {} ChEMBL cmpd_activities".format(len(cmpd_activities)))
-  logger.info("Loading PubChem CIDs for {} ChEMBL cmpd_activities".format(len(cmpd_activities)))
+    print("\nLoading PubChem CIDs for {} ChEMBL cmpd_activities".format(ca_ct))
+  logger.info("Loading PubChem CIDs for {} ChEMBL cmpd_activities".format(ca_ct))
   ct = 0
   pcid_ct = 0
   notfnd = set()
   dba_err_ct = 0
-  for ca in cmpd_activities:
-    ct += 1
-    slmf.update_progress(ct/ca_ct)
-    if ca['cmpd_id_in_src'] not in chembl2pc:
-      notfnd.add(ca['cmpd_id_in_src'])
-      continue
-    pccid = chembl2pc[ca['cmpd_id_in_src']]
-    rv = dba.do_update({'table': 'cmpd_activity', 'id': ca['id'],
-                        'col': 'cmpd_pubchem_cid', 'val': pccid})
-    if rv:
-      pcid_ct += 1
-    else:
-      dba_err_ct += 1
+  with dba.batch(commit_every=10000):
+    for ca in dba.iter_cmpd_activities(catype = 'ChEMBL'):
+      ct += 1
+      slmf.update_progress(ct/ca_ct)
+      if ca['cmpd_id_in_src'] not in chembl2pc:
+        notfnd.add(ca['cmpd_id_in_src'])
+        continue
+      pccid = chembl2pc[ca['cmpd_id_in_src']]
+      rv = dba.do_update({'table': 'cmpd_activity', 'id': ca['id'],
+                          'col': 'cmpd_pubchem_cid', 'val': pccid})
+      if rv:
+        pcid_ct += 1
+      else:
+        dba_err_ct += 1
   if notfnd:
     for chemblid in notfnd:
       logger.warning(f"No PubChem CID found for {chemblid}")
@@ -117,32 +117,32 @@ def load(args, dba, chembl2pc, logfile, logger):
   if dba_err_ct:
     print(f'WARNNING: {dba_err_ct} DB errors occurred. See logfile {logfile} for details.')
     
-  drug_activities = dba.get_drug_activities()
-  da_ct = len(drug_activities)
+  da_ct = dba.get_row_count('drug_activity')
   if not args['--quiet']:
-    print("\nLoading PubChem CIDs for {} drug activities".format(len(drug_activities)))
-  logger.info("Loading PubChem CIDs for {} drug activities".format(len(drug_activities)))
+    print("\nLoading PubChem CIDs for {} drug activities".format(da_ct))
+  logger.info("Loading PubChem CIDs for {} drug activities".format(da_ct))
   ct = 0
   pcid_ct = 0
   skip_ct = 0
   notfnd = set()
   dba_err_ct = 0
-  for da in drug_activities:
-    ct += 1
-    slmf.update_progress(ct/da_ct)
-    if not da['cmpd_chemblid']:
-      skip_ct += 1
-      continue
-    if da['cmpd_chemblid'] not in chembl2pc:
-      notfnd.add(da['cmpd_chemblid'])
-      continue
-    pccid = chembl2pc[da['cmpd_chemblid']]
-    rv = dba.do_update({'table': 'drug_activity', 'id': da['id'],
-                        'col': 'cmpd_pubchem_cid', 'val': pccid})
-    if rv:
-      pcid_ct += 1
-    else:
-      dba_err_ct += 1
+  with dba.batch(commit_every=10000):
+    for da in dba.iter_drug_activities():
+      ct += 1
+      slmf.update_progress(ct/da_ct)
+      if not da['cmpd_chemblid']:
+        skip_ct += 1
+        continue
+      if da['cmpd_chemblid'] not in chembl2pc:
+        notfnd.add(da['cmpd_chemblid'])
+        continue
+      pccid = chembl2pc[da['cmpd_chemblid']]
+      rv = dba.do_update({'table': 'drug_activity', 'id': da['id'],
+                          'col': 'cmpd_pubchem_cid', 'val': pccid})
+      if rv:
+        pcid_ct += 1
+      else:
+        dba_err_ct += 1
   if notfnd:
     for chemblid in notfnd:
       logger.warning(f"No PubChem CID found for {chemblid}")
@@ -34,6 +34,7 @@ import logging
 import shelve
 import slm_tcrd_functions as slmf
 import tcrd_pubmed as tpm
+from tcrd_functions import refresh_target_summary
 
 PROGRAM = os.path.basename(sys.argv[0])
 TCRD_VER = '6' ## !!! CHECK THIS IS CORRECT !!! ##
@@ -61,10 +62,10 @@ def load(args, dba, logger, logfile):
   ct = 0
   dba_err_ct = 0
   if args['--pastid']:
-    past_id = args['--pastid']
+    past_id = int(args['--pastid'])
   else:
     past_id = 0
-  for target in dba.get_targets(include_annotations=True, past_id=past_id):
+  for target in dba.iter_targets(sections=['xrefs'], protein_columns=['id'], start_after_id=past_id):
     ct += 1
     logger.info("Processing target {}: {}".format(target['id'], target['name']))
     p = target['components']['protein'][0]
@@ -124,7 +125,7 @@ def load(args, dba, logger, logfile):
     dba_err_ct = 0
     for tid,chunk_cts in s['errors']:
       ct += 1
-      target in dba.get_targets(tid, include_annotations=True)
+      target = dba.get_target(tid, sections=['xrefs'], protein_columns=['id'])
       logger.info("Processing target {}: {}".format(target['id'], target['name']))
       p = target['components']['protein'][0]
       chunk_ct = 0
@@ -218,6 +219,8 @@ if __name__ == '__main__':
   assert rv, f"Error inserting provenance. See logfile {logfile} for details."
   rv = dba.ins_provenance({'dataset_id': dataset_id, 'table_name': 'protein2pubmed'})
   assert rv, "Error inserting provenance. See logfile {} for details.".format(logfile)
+  # PubMed counts are in target_summary
+  refresh_target_summary(dba, logfile)
   elapsed = time.time() - start_time
 
   print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
@@ -226,7 +229,7 @@ if __name__ == '__main__':
 
 
 # Use this to manually insert errors
-# In [26]: t = dba.get_target(18821, include_annotations=True)
+# In [26]: t = dba.get_target(18821, annot=True)
 # In [27]: p = target['components']['protein'][0]
 # In [28]: pmids = [d['value'] for d in p['xrefs']['PubMed']]
 # In [29]: len(pmids)
@@ -3,7 +3,7 @@
 """Calculate and load target TDL assignments, and also export a new UniProt mapping file.
 
 Usage:
-    load-TDLs.py [--debug | --quiet] [--dbhost=<str>] [--dbname=<str>] [--logfile=<file>] [--loglevel=<int>]
+    load-TDLs.py [--debug | --quiet] [--dbhost=<str>] [--dbname=<str>] [--logfile=<file>] [--loglevel=<int>] [--check | --incremental]
     load-TDLs.py | --help
 
 Options:
@@ -17,6 +17,11 @@ Options:
                          20: INFO
                          10: DEBUG
                           0: NOTSET
+  -c --check           : compare TDLs computed for all targets at once with
+                         per-target calculation, then exit without loading
+  -i --incremental     : only update targets whose TDL has changed, logging
+                         changes to tdl_update_log, if TDL input data has
+                         been loaded since the last TDLs dataset
   -q --quiet           : set output verbosity to minimal level
   -d --debug           : turn on debugging output
   -? --help            : print this message and exit 
@@ -29,10 +34,12 @@ __license__   = "Creative Commons Attribution-NonCommercial (CC BY-NC)"
 __version__   = "4.4.0"
 
 import os,sys,time,shutil
+import getpass
 from docopt import docopt
 from TCRD.DBAdaptor import DBAdaptor
 import logging
 import slm_util_functions as slmf
+from tcrd_functions import compute_tdls, check_tdl_parity, tdl_input_changes, refresh_target_summary
 
 PROGRAM = os.path.basename(sys.argv[0])
 TCRD_VER = '6' ## !!! CHECK THIS IS CORRECT !!! ##
@@ -44,99 +51,98 @@ OUTFILE_PAT = OUTDIR + 'PharosTCRDv{}_UniProt_Mapping.tsv'
 #OUTFILE = f'{OUTDIR}PharosTCRD_UniProt_Mapping.tsv'
 
 def export_uniprot_mapping(dba, ofn):
-  uptdls = dba.get_uniprots_tdls()
-  ct = len(uptdls)
+  ct = dba.get_row_count('t2tc')
   exp_ct = 0
   print(f"\nExporting UniProts/TDLs for {ct} TCRD targets")
   with open(ofn, 'w') as ofh:
     ofh.write(f"UniProt_accession\tPharos_target\tTDL\n")
-    for d in uptdls:
+    for d in dba.iter_uniprots_tdls():
       ofh.write(f"{d['uniprot']}\t{d['uniprot']}\t{d['tdl']}\n")
       exp_ct += 1
       slmf.update_progress(exp_ct/ct)
   print(f"Wrote {exp_ct} lines to file {ofn}")
 
 def load_tdls(dba, logfile, logger):
-  tids = dba.get_target_ids()
-  tct = len(tids)
+  tdlins = dba.get_tdl_inputs()
+  tct = len(tdlins['target_id'])
   print(f"\nCalculating/Loading TDLs for {tct} TCRD targets")
-  ct = 0
-  tdl_cts = {'Tclin': 0, 'Tchem': 0, 'Tbio': 0, 'Tdark': 0}
-  bump_ct = 0
-  dba_err_ct = 0
-  upd_ct = 0
-  for tid in tids:
-    tinfo = dba.get_target4tdlcalc(tid)
-    ct += 1
-    slmf.update_progress(ct/tct)
-    (tdl, bump_flag) = compute_tdl(tinfo)
-    tdl_cts[tdl] += 1
-    if bump_flag:
-      bump_ct += 1
-    rv = dba.do_update({'table': 'target', 'id': tid, 'col': 'tdl', 'val': tdl})
-    if rv:
-      upd_ct += 1
-    else:
-      dba_err_ct += 1
-  print(f"{ct} TCRD targets processed.")
+  (tdls, bumped, tdl_cts) = compute_tdls(tdlins)
+  upd_ct = dba.upd_tdls(tdls)
+  print(f"{tct} TCRD targets processed.")
+  if upd_ct is False:
+    print(f"ERROR: DB error setting TDL values. See logfile {logfile} for details.")
+    return
   print(f"Set TDL value for {upd_ct} targets:")
   print("  {} targets are Tclin".format(tdl_cts['Tclin']))
   print("  {} targets are Tchem".format(tdl_cts['Tchem']))
-  print("  {} targets are Tbio - {} bumped from Tdark".format(tdl_cts['Tbio'], bump_ct))
+  print("  {} targets are Tbio - {} bumped from Tdark".format(tdl_cts['Tbio'], len(bumped)))
   print("  {} targets are Tdark".format(tdl_cts['Tdark']))
-  if dba_err_ct:
-    print(f"ERROR: {dba_err_ct} DB errors occurred. See logfile {logfile} for details.")
 
-def compute_tdl(tinfo):
+
+def load_tdls_incremental(dba, logfile, logger):
   '''
-  Input is a dictionary of target info, as returned by dba.get_target4tdlcalc()
-  Returns (tdl, bump_flag)
+  Returns True if TDLs were recalculated, False if there was nothing to do.
+  Exits if the TDL changes can't be saved.
   '''
-  bump_flag = False
-  if 'drug_activities' in tinfo:
-    if len([a for a in tinfo['drug_activities'] if a['has_moa'] == 1]) > 0:
-      # MoA drug activities qualify a target as Tclin
-      tdl = 'Tclin'
-    else:
-      # Non-MoA drug activities qualify a target as Tchem
-      tdl = 'Tchem'
-  elif 'cmpd_activities' in tinfo:
-    # cmpd activities qualify a target as Tchem
-    tdl = 'Tchem'
-  else:
-    # Collect info needed to decide between Tbio and Tdark
-    p = tinfo['components']['protein'][0]
-    ptdlis = p['tdl_infos']
-    # JensenLab PubMed Score
-    pms = float(ptdlis['JensenLab PubMed Score']['value'])
-    # GeneRIF Count
-    rif_ct = 0
-    if 'generifs' in p:
-      rif_ct = len(p['generifs'])
-    # Ab Count
-    ab_ct = int(ptdlis['Ab Count']['value']) 
-    # Experimental MF/BP Leaf Term GOA
-    efl_goa = False
-    if 'Experimental MF/BP Leaf Term GOA' in ptdlis:
-      efl_goa = True
-    # Decide between Tbio and Tdark
-    dark_pts = 0    
-    if pms < 5:     # PubMed Score < 5
-      dark_pts += 1
-    if rif_ct <= 3: # GeneRIF Count <= 3
-      dark_pts += 1
-    if ab_ct <= 50: # Ab Count <= 50
-      dark_pts += 1
-    if dark_pts >= 2:
-      # if at least 2 of the above, target is Tdark...
-      tdl = 'Tdark'
-      if efl_goa:
-        # ...unless target has Experimental MF/BP Leaf Term GOA, then bump to Tbio
-        tdl = 'Tbio'
-        bump_flag = True
-    else:
-      tdl = 'Tbio'
-  return (tdl, bump_flag)
+  ds = dba.get_dataset('TDLs')
+  if not ds:
+    print("\nNo previous TDLs dataset. Run a full load instead.")
+    return False
+  changes = tdl_input_changes(dba.get_provenance_since(ds['datetime']))
+  if not changes:
+    print(f"\nNo TDL input data loaded since last TDLs dataset ({ds['datetime']}). Nothing to do.")
+    return False
+  print(f"\nTDL input data loaded since last TDLs dataset ({ds['datetime']}):")
+  dsnames = []
+  for prov in changes:
+    print(f"  {prov['dataset_name']} ({prov['datetime']}): {prov['table_name']}")
+    if prov['dataset_name'] not in dsnames:
+      dsnames.append(prov['dataset_name'])
+  tdlins = dba.get_tdl_inputs()
+  tct = len(tdlins['target_id'])
+  print(f"Recalculating TDLs for {tct} TCRD targets")
+  (tdls, bumped, tdl_cts) = compute_tdls(tdlins)
+  current = dba.get_target_tdls()
+  changed = {tid: tdl for tid,tdl in tdls.items() if current.get(tid) != tdl}
+  print("  {} targets are Tclin".format(tdl_cts['Tclin']))
+  print("  {} targets are Tchem".format(tdl_cts['Tchem']))
+  print("  {} targets are Tbio - {} bumped from Tdark".format(tdl_cts['Tbio'], len(bumped)))
+  print("  {} targets are Tdark".format(tdl_cts['Tdark']))
+  if not changed:
+    print("No TDLs changed.")
+    return True
+  trans_cts = {}
+  log_rows = []
+  explanation = "Recalculated by {} after loading {}".format(PROGRAM, ', '.join(dsnames))
+  for tid,tdl in changed.items():
+    k = f"{current.get(tid)} -> {tdl}"
+    trans_cts[k] = trans_cts.get(k, 0) + 1
+    log_rows.append( {'target_id': tid, 'old_tdl': current.get(tid), 'new_tdl': tdl,
+                      'person': getpass.getuser(), 'explanation': explanation,
+                      'application': PROGRAM, 'app_version': __version__} )
+  # TDL changes and their tdl_update_log rows are committed together, so
+  # if either fails, both are rolled back and the next run finds the
+  # same changes to make
+  log_ct = False
+  with dba.batch() as batch:
+    upd_ct = dba.upd_tdls(changed)
+    if upd_ct is not False:
+      log_ct = dba.ins_many('tdl_update_log', log_rows)
+      if log_ct is False and not batch.failures:
+        # ins_many() rejected the rows without running a statement, so
+        # nothing rolled back the TDL updates
+        batch.rollback()
+  if upd_ct is False:
+    print(f"ERROR: DB error setting TDL values. See logfile {logfile} for details.")
+    exit(1)
+  if log_ct is False or batch.failures:
+    print(f"ERROR: DB error inserting tdl_update_log rows; TDL changes rolled back. See logfile {logfile} for details.")
+    exit(1)
+  print(f"Changed TDL value for {upd_ct} targets:")
+  for k in sorted(trans_cts):
+    print(f"  {k}: {trans_cts[k]}")
+  print(f"Inserted {log_ct} new tdl_update_log rows")
+  return True
 
 
 if __name__ == '__main__':
@@ -166,12 +172,28 @@ if __name__ == '__main__':
 
   start_time = time.time()
 
-  rv = dba.upd_tdls_null()
-  if type(rv) == int:
-    print(f"\nSet tdl to NULL for {rv} target rows")
+  if args['--check']:
+    mismatches = check_tdl_parity(dba)
+    err_ct = 0
+    for (tid, scalar, vect) in mismatches:
+      if type(scalar) == str:
+        err_ct += 1
+        logger.warning(f"Per-target TDL calculation failed for target {tid}: {scalar}; all-at-once {vect}")
+      else:
+        logger.warning(f"TDL mismatch for target {tid}: per-target {scalar}, all-at-once {vect}")
+    print(f"\n{len(mismatches)} TDL mismatches, including {err_ct} targets where per-target calculation failed. See logfile {logfile} for details.")
+    exit(1 if mismatches else 0)
+
+  if args['--incremental']:
+    if not load_tdls_incremental(dba, logfile, logger):
+      exit(0)
   else:
-    print(f"Error setting target.tdl values to NULL. See logfile {logfile} for details.")
-    exit(1)
+    rv = dba.upd_tdls_null()
+    if type(rv) == int:
+      print(f"\nSet tdl to NULL for {rv} target rows")
+    else:
+      print(f"Error setting target.tdl values to NULL. See logfile {logfile} for details.")
+      exit(1)
   rv = dba.del_dataset('TDLs')
   if rv:
     print(f"Deleted previous 'TDLs' dataset")
@@ -179,7 +201,8 @@ if __name__ == '__main__':
     print(f"Error deleting 'TDLs' dataset. See logfile {logfile} for details.")
     exit(1)
   
-  load_tdls(dba, logfile, logger)
+  if not args['--incremental']:
+    load_tdls(dba, logfile, logger)
   
   # Dataset
   dataset_id = dba.ins_dataset( {'name': 'TDLs', 'source': 'IDG-KMC generated data by Steve Mathias at UNM.', 'app': PROGRAM, 'app_version': __version__, 'comments': 'TDLs are calculated by the loading app from data in TCRD.'} )
@@ -187,6 +210,8 @@ if __name__ == '__main__':
   # Provenance
   rv = dba.ins_provenance({'dataset_id': dataset_id, 'table_name': 'target', 'column_name': 'tdl'})
   assert rv, f"Error inserting provenance. See logfile {logfile} for details."
+  # TDLs are in target_summary
+  refresh_target_summary(dba, logfile)
 
   # Add version number to filename
   mmver = '.'.join( dbi['data_ver'].split('.')[:2] )
@@ -32,9 +32,9 @@ __version__   = "2.0.0"
 import os,sys,time
 from docopt import docopt
 from TCRD.DBAdaptor import DBAdaptor
+from TCRD.Resolver import Resolver
 from urllib.request import urlretrieve
 import csv
-from collections import defaultdict
 import logging
 import slm_util_functions as slmf
 
@@ -47,6 +47,8 @@ DOWNLOAD_DIR = f'../data/TIGA/{TIGA_RELEASE}/'
 BASE_URL = f'https://unmtid-shinyapps.net/download/TIGA/{TIGA_RELEASE}/'
 TIGA_FILE = 'tiga_gene-trait_stats.tsv'
 TIGA_PROV_FILE = 'tiga_gene-trait_provenance.tsv'
+BULK_INS_SIZE = 10000 # rows per dba.ins_many() call
+RESOLVER_DIR = '../data/resolver/' # shared TCRD.Resolver snapshots
 
 def download():
   for fn in [TIGA_FILE, TIGA_PROV_FILE]:
@@ -62,9 +64,10 @@ def load(dba, logger, logfile):
   line_ct = slmf.wcl(infile)
   print(f"\nProcessing {line_ct} lines in TIGA file {infile}")
   ct = 0
-  k2pids = defaultdict(list) # maps sym|ENSG to TCRD protein_id(s)
+  res = Resolver(dba, xtypes=['Ensembl'], targets=False, snapshot_dir=RESOLVER_DIR) # sym/ENSG => TCRD protein_id(s)
   notfnd = set()
   pmark = {}
+  tiga_rows = []
   tiga_ct = 0
   dba_err_ct = 0
   with open(infile, 'r') as ifh:
@@ -102,22 +105,13 @@ def load(dba, logger, logfile):
       sym = row[16]
       ensg = row[0]
       k = sym + '|' + ensg
-      pids = []
-      if k in k2pids:
-        # we've already found it
-        pids = k2pids[k]
-      elif k in notfnd:
+      if k in notfnd:
         # we've already not found it
         continue
-      else:
-        # look it up
-        pids = dba.find_protein_ids({'sym': sym})
-        if not pids:
-          pids = dba.find_protein_ids_by_xref({'xtype': 'Ensembl', 'value': ensg})
-          if not pids:
-            notfnd.add(k)
-            continue
-        k2pids[k] = pids # save this mapping so we only lookup each sym/ENSG once
+      pids = res.resolve_protein_ids({'sym': sym}, {'xtype': 'Ensembl', 'value': ensg})
+      if not pids:
+        notfnd.add(k)
+        continue
       init = {'ensg': ensg, 'efoid': row[1], 'trait': row[2], 'n_study': row[3], 'n_snp': row[4],
               'n_snpw': row[5], 'geneNtrait': row[6], 'geneNstudy': row[7], 'traitNgene': row[8],
               'traitNstudy': row[9], 'pvalue_mlog_median': row[10], 'pvalue_mlog_max': row[11],
@@ -128,13 +122,24 @@ def load(dba, logger, logfile):
       #if row[] != 'NA':
       #  init[''] = row[]
       for pid in pids:
-        init['protein_id'] = pid
-        rv = dba.ins_tiga(init)
-        if not rv:
-          dba_err_ct += 1
-          continue
-        tiga_ct += 1
-        pmark[pid] = True
+        tiga_rows.append(dict(init, protein_id=pid))
+      if len(tiga_rows) >= BULK_INS_SIZE:
+        rv = dba.ins_many('tiga', tiga_rows)
+        if rv is False:
+          dba_err_ct += len(tiga_rows)
+        else:
+          tiga_ct += rv
+          for r in tiga_rows:
+            pmark[r['protein_id']] = True
+        tiga_rows = []
+  if tiga_rows:
+    rv = dba.ins_many('tiga', tiga_rows)
+    if rv is False:
+      dba_err_ct += len(tiga_rows)
+    else:
+      tiga_ct += rv
+      for r in tiga_rows:
+        pmark[r['protein_id']] = True
   for k in notfnd:
     logger.warning(f"No protein found for {k}")
   print(f"Processed {ct} lines")
@@ -148,6 +153,7 @@ def load(dba, logger, logfile):
   line_ct = slmf.wcl(infile)
   print(f"\nProcessing {line_ct} lines in TIGA provenance file {infile}")
   ct = 0
+  prov_rows = []
   tigaprov_ct = 0
   dba_err_ct = 0
   with open(infile, 'r') as ifh:
@@ -164,12 +170,21 @@ def load(dba, logger, logfile):
       # 4: efoId
       ct += 1
       slmf.update_progress(ct/line_ct)
-      rv = dba.ins_tiga_provenance( {'ensg': row[0], 'efoid': row[4],
-                                     'study_acc': row[2], 'pubmedid': row[3]} )
-      if not rv:
-        dba_err_ct += 1
-        continue
-      tigaprov_ct += 1
+      prov_rows.append( {'ensg': row[0], 'efoid': row[4],
+                         'study_acc': row[2], 'pubmedid': row[3]} )
+      if len(prov_rows) >= BULK_INS_SIZE:
+        rv = dba.ins_many('tiga_provenance', prov_rows)
+        if rv is False:
+          dba_err_ct += len(prov_rows)
+        else:
+          tigaprov_ct += rv
+        prov_rows = []
+  if prov_rows:
+    rv = dba.ins_many('tiga_provenance', prov_rows)
+    if rv is False:
+      dba_err_ct += len(prov_rows)
+    else:
+      tigaprov_ct += rv
   print(f"Processed {ct} lines")
   print(f"  Inserted {tigaprov_ct} new tiga_provenance rows")
   if dba_err_ct > 0:
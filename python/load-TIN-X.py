@@ -32,9 +32,11 @@ import os,sys,time
 from docopt import docopt
 import mysql.connector
 from mysql.connector import Error
+from TCRD.DBAdaptor import DBAdaptor
 import logging
 import csv
 import slm_util_functions as slmf
+from tcrd_functions import refresh_target_summary
 
 PROGRAM = os.path.basename(sys.argv[0])
 TCRD_VER = '6' ## !!! CHECK THIS IS CORRECT !!! ##
@@ -127,23 +129,22 @@ def create_tables(curs):
     curs.execute("GRANT SHOW VIEW on tinx.target TO appuser")
   print("Done.")
   
-def load_tinx(curs):
-  chunk_size = 50000
-  delim = '\t'
+def load_tinx(dba, logfile):
+  # TSV files have a header line, then columns in the same order as INS_SQL
+  cols = {'tinx_novelty': ['protein_id', 'score'],
+          'tinx_disease': ['doid', 'name', 'summary', 'score'],
+          'tinx_importance': ['doid', 'protein_id', 'score'],
+          'tinx_articlerank': ['doid', 'protein_id', 'pmid', 'rank']}
   print('\nLoading tinx tables...')
   for table in ['tinx_novelty', 'tinx_disease', 'tinx_importance', 'tinx_articlerank']:
     print(f"  Loading {table}: ", end='')
     fn = INFILES[table]
     st = time.time()
-    first_chunk = True
-    row_ct = 0
-    for values in slmf.file_chunker(fn, chunk_size, delim):
-      if first_chunk:
-        values.pop(0) # get rid of the header
-        first_chunk = False
-      row_ct += len(values)
-      curs.executemany(INS_SQL[table], [tuple(vals) for vals in values])
+    row_ct = dba.bulk_load_tsv(table, cols[table], fn, ignore_lines=1)
     ets = slmf.secs2str(time.time() - st)
+    if row_ct is False:
+      print(f"ERROR. See logfile {logfile} for details.")
+      continue
     print(f"OK - ({row_ct} rows).  Elapsed time: {ets}")
   print("Done.")
 
@@ -235,9 +236,12 @@ if __name__ == '__main__':
       del_dataset(curs)
       drop_tables(curs)
       create_tables(curs)
-      load_tinx(curs)
+      dba = DBAdaptor({'dbhost': args['--dbhost'], 'dbname': args['--dbname'], 'logger_name': __name__})
+      load_tinx(dba, logfile)
       load_pubmed(curs, logger, logfile)
       load_dataset(curs)
+      # novelty scores are in target_summary
+      refresh_target_summary(dba, logfile)
       curs.close()
   except Error as e:
     print(f"ERROR: {e}")
@@ -37,6 +37,7 @@ import gzip
 import obo
 from lxml import etree, objectify
 import slm_util_functions as slmf
+from tcrd_functions import refresh_target_summary
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
@@ -465,6 +466,8 @@ if __name__ == '__main__':
   rv = dba.ins_provenance({'dataset_id': dataset_id, 'table_name': 'nhprotein'})
   assert rv, f"Error inserting provenance. See logfile {logfile} for details."
   load_mouse_rat(args, dba, dataset_id, logger, logfile)
+  # targets, proteins and GOA and disease counts are in target_summary
+  refresh_target_summary(dba, logfile)
 
   elapsed = time.time() - start_time
   print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))
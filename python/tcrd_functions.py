@@ -59,3 +59,91 @@ def compute_tdl(tinfo):
     else:
       tdl = 'Tbio'
   return (tdl, bump_flag)
+
+# Tables (and tdl_info itypes) that TDLs are calculated from
+TDL_INPUT_TABLES = ['target', 't2tc', 'drug_activity', 'cmpd_activity', 'tdl_info', 'generif']
+TDL_INFO_ITYPES = ['JensenLab PubMed Score', 'Ab Count', 'Experimental MF/BP Leaf Term GOA']
+
+def refresh_target_summary(dba, logfile):
+  '''
+  Rebuild target_summary and report the result. Loaders of any table
+  target_summary is built from call this when they are done.
+  Returns the count of target_summary rows, or False on error
+  '''
+  rv = dba.refresh_target_summary()
+  if type(rv) == int:
+    print(f"\nRefreshed target_summary with {rv} rows")
+  else:
+    print(f"Error refreshing target_summary. See logfile {logfile} for details.")
+  return rv
+
+def tdl_input_changes(provs):
+  '''
+  Input is a list of provenance rows, as returned by dba.get_provenance_since()
+  Returns the rows for datasets that loaded TDL input data
+  '''
+  changes = []
+  for prov in provs:
+    if prov['dataset_name'] == 'TDLs' or prov['table_name'] not in TDL_INPUT_TABLES:
+      continue
+    if prov['table_name'] == 'target' and prov['column_name'] == 'tdl':
+      continue
+    if prov['table_name'] == 'tdl_info' and prov['where_clause'] and not [it for it in TDL_INFO_ITYPES if it in prov['where_clause']]:
+      continue
+    changes.append(prov)
+  return changes
+
+def compute_tdls(tdlins):
+  '''
+  Column-wise compute_tdl() for all targets at once.
+  Input is a dictionary of columns, as returned by dba.get_tdl_inputs()
+  Returns (tdls, bumped, counts): a dictionary of target id => TDL, a set
+  of target ids bumped from Tdark to Tbio, and a dictionary of TDL => count
+  '''
+  # "dark points": PubMed Score < 5, GeneRIF Count <= 3, Ab Count <= 50
+  dark = [(pms < 5) + (rif_ct <= 3) + (ab_ct <= 50) for (pms, rif_ct, ab_ct) in zip(tdlins['pms'], tdlins['generif_ct'], tdlins['ab_ct'])]
+  tdls = {}
+  bumped = set()
+  counts = {'Tclin': 0, 'Tchem': 0, 'Tbio': 0, 'Tdark': 0}
+  for (tid, has_drug, has_moa, has_cmpd, dark_pts, efl_goa) in zip(tdlins['target_id'], tdlins['has_drug'], tdlins['has_moa'], tdlins['has_cmpd'], dark, tdlins['efl_goa']):
+    if has_drug:
+      # MoA drug activities qualify a target as Tclin, non-MoA as Tchem
+      tdl = 'Tclin' if has_moa else 'Tchem'
+    elif has_cmpd:
+      # cmpd activities qualify a target as Tchem
+      tdl = 'Tchem'
+    elif dark_pts >= 2:
+      # Tdark, unless target has Experimental MF/BP Leaf Term GOA, then bump to Tbio
+      if efl_goa:
+        tdl = 'Tbio'
+        bumped.add(tid)
+      else:
+        tdl = 'Tdark'
+    else:
+      tdl = 'Tbio'
+    tdls[tid] = tdl
+    counts[tdl] += 1
+  return (tdls, bumped, counts)
+
+def check_tdl_parity(dba, tids=None):
+  '''
+  Compare compute_tdls() on dba.get_tdl_inputs() with compute_tdl() on
+  dba.get_target4tdlcalc() for each target (or just those in tids).
+  Returns a list of (target id, compute_tdl() result, compute_tdls() result)
+  for targets where they differ. If compute_tdl() fails for a target (eg.
+  one with no 'JensenLab PubMed Score' or 'Ab Count' tdl_info, which
+  compute_tdls() counts as 0), its result is the error message.
+  '''
+  (tdls, bumped, counts) = compute_tdls(dba.get_tdl_inputs())
+  if tids is None:
+    tids = list(tdls.keys())
+  mismatches = []
+  for tid in tids:
+    try:
+      scalar = compute_tdl(dba.get_target4tdlcalc(tid))
+    except (KeyError, TypeError, ValueError) as e:
+      scalar = f"{type(e).__name__}: {e}"
+    vect = (tdls.get(tid), tid in bumped)
+    if scalar != vect:
+      mismatches.append((tid, scalar, vect))
+  return mismatches
@@ -32,10 +32,12 @@ __version__   = "2.0.0"
 import os,sys,time
 from docopt import docopt
 from TCRD.DBAdaptor import DBAdaptor
+from TCRD.Resolver import Resolver
 import requests
 import csv
 import logging
 import slm_util_functions as slmf
+from tcrd_functions import refresh_target_summary
 
 PROGRAM = os.path.basename(sys.argv[0])
 DB_MAJVERNUM_VER = '6' ## !!! CHECK THIS IS CORRECT !!! ##
@@ -48,6 +50,8 @@ PM_SCORES_FILE = 'protein_counts.tsv' # in KMC dir on server
 DISEASES_FILE_K = 'human_disease_knowledge_filtered.tsv'
 DISEASES_FILE_E = 'human_disease_experiments_filtered.tsv'
 DISEASES_FILE_T = 'human_disease_textmining_filtered.tsv'
+BULK_INS_SIZE = 10000 # rows per dba.ins_many() call
+RESOLVER_DIR = '../data/resolver/' # shared TCRD.Resolver snapshots
 
 def download_pmscores(args):
   url = f"{JL_BASE_URL}KMC/{PM_SCORES_FILE}"
@@ -81,9 +85,19 @@ def download_DISEASES(args):
       print("Error downloading {}: {}.".format(url, r.status_code))
 
 
-def load_pmscores(dba, logger, logfile):
-  ensp2pids = {} # ENSP => list of TCRD protein ids
+def ins_rows(dba, table, rows):
+  '''
+  Bulk insert rows into table.
+  Returns (inserted row count, error row count)
+  '''
+  rv = dba.ins_many(table, rows)
+  if rv is False:
+    return (0, len(rows))
+  return (rv, 0)
+
+def load_pmscores(dba, res, logger, logfile):
   pmscores = {} # protein.id => sum(all scores)
+  pms_rows = []
   pms_ct = 0
   skip_ct = 0
   notfnd = set()
@@ -102,31 +116,29 @@ def load_pmscores(dba, logger, logfile):
         skip_ct += 1
         continue
       ensp = row[0]
-      if ensp in ensp2pids:
-        # we've already found it
-        pids = ensp2pids[ensp]
-      elif ensp in notfnd:
+      if ensp in notfnd:
         # we've already not found it
         continue
-      else:
-        pids = dba.find_protein_ids({'stringid': ensp})
-        if not pids:
-          pids = dba.find_protein_ids_by_xref({'xtype': 'STRING', 'value': '9606.'+ensp})
-          if not pids:
-            notfnd.add(ensp)
-            logger.warning("No protein found for {}".format(ensp))
-            continue
-        ensp2pids[ensp] = pids # save this mapping so we only lookup each ENSP once
+      pids = res.resolve_protein_ids({'stringid': ensp}, {'xtype': 'STRING', 'value': '9606.'+ensp})
+      if not pids:
+        notfnd.add(ensp)
+        logger.warning("No protein found for {}".format(ensp))
+        continue
       for pid in pids:
-        rv = dba.ins_pmscore({'protein_id': pid, 'year': row[1], 'score': row[2]} )
-        if rv:
-          pms_ct += 1
-        else:
-          dba_err_ct += 1
+        pms_rows.append({'protein_id': pid, 'year': row[1], 'score': row[2]})
         if pid in pmscores:
           pmscores[pid] += float(row[2])
         else:
           pmscores[pid] = float(row[2])
+      if len(pms_rows) >= BULK_INS_SIZE:
+        (ins_ct, err_ct) = ins_rows(dba, 'pmscore', pms_rows)
+        pms_ct += ins_ct
+        dba_err_ct += err_ct
+        pms_rows = []
+  if pms_rows:
+    (ins_ct, err_ct) = ins_rows(dba, 'pmscore', pms_rows)
+    pms_ct += ins_ct
+    dba_err_ct += err_ct
   print(f"{ct} input lines processed.")
   print("  Inserted {} new pmscore rows for {} proteins".format(pms_ct, len(pmscores)))
   if skip_ct:
@@ -151,7 +163,7 @@ def load_pmscores(dba, logger, logfile):
   if dba_err_ct:
     print(f"WARNING: {db_err_ct} DB errors occurred. See logfile {logfile} for details.")
 
-def load_DISEASES(dba, logger, logfile):
+def load_DISEASES(dba, res, logger, logfile):
   # Knowledge channel
   fn = JL_DOWNLOAD_DIR + DISEASES_FILE_K
   line_ct = slmf.wcl(fn)
@@ -159,10 +171,10 @@ def load_DISEASES(dba, logger, logfile):
   with open(fn, 'r') as ifh:
     tsvreader = csv.reader(ifh, delimiter='\t')
     ct = 0
-    k2pids = {} # ENSP|sym => list of TCRD protein ids
     pmark = {}
     skip_ct = 0
     notfnd = set()
+    dis_rows = []
     dis_ct = 0
     dba_err_ct = 0
     for row in tsvreader:
@@ -174,30 +186,28 @@ def load_DISEASES(dba, logger, logfile):
       ensp = row[0]
       sym = row[1]
       k = "%s|%s"%(ensp,sym)
-      if k in k2pids:
-        # we've already found it
-        pids = k2pids[k]
-      elif k in notfnd:
+      if k in notfnd:
         # we've already not found it
         continue
-      else:
-        pids = dba.find_protein_ids({'stringid': ensp})
-        if not pids:
-          pids = dba.find_protein_ids({'sym': sym})
-          if not pids:
-            notfnd.add(k)
-            logger.warning(f"No protein found for {k}")
-            continue
-        k2pids[k] = pids # save this mapping so we only lookup each ENSP|sym once
+      pids = res.resolve_protein_ids({'stringid': ensp}, {'sym': sym})
+      if not pids:
+        notfnd.add(k)
+        logger.warning(f"No protein found for {k}")
+        continue
       dtype = 'JensenLab Knowledge ' + row[4]
       for pid in pids:
-        rv = dba.ins_disease( {'protein_id': pid, 'dtype': dtype, 'name': row[3],
-                               'did': row[2], 'evidence': row[5], 'conf': row[6]} )
-        if rv:
-          dis_ct += 1
-          pmark[pid] = True
-        else:
-          dba_err_ct += 1
+        dis_rows.append( {'protein_id': pid, 'dtype': dtype, 'name': row[3],
+                          'did': row[2], 'evidence': row[5], 'conf': row[6]} )
+        pmark[pid] = True
+      if len(dis_rows) >= BULK_INS_SIZE:
+        (ins_ct, err_ct) = ins_rows(dba, 'disease', dis_rows)
+        dis_ct += ins_ct
+        dba_err_ct += err_ct
+        dis_rows = []
+    if dis_rows:
+      (ins_ct, err_ct) = ins_rows(dba, 'disease', dis_rows)
+      dis_ct += ins_ct
+      dba_err_ct += err_ct
   print(f"{ct} lines processed.")
   print("  Inserted {} new disease rows for {} proteins".format(dis_ct, len(pmark)))
   if skip_ct:
@@ -214,9 +224,9 @@ def load_DISEASES(dba, logger, logfile):
   with open(fn, 'r') as ifh:
     tsvreader = csv.reader(ifh, delimiter='\t')
     ct = 0
-    k2pids = {} # ENSP|sym => list of TCRD protein ids
     pmark = {}
     notfnd = set()
+    dis_rows = []
     dis_ct = 0
     skip_ct = 0
     dba_err_ct = 0
@@ -232,30 +242,28 @@ def load_DISEASES(dba, logger, logfile):
       ensp = row[0]
       sym = row[1]
       k = "%s|%s"%(ensp,sym)
-      if k in k2pids:
-        # we've already found it
-        pids = k2pids[k]
-      elif k in notfnd:
+      if k in notfnd:
         # we've already not found it
         continue
-      else:
-        pids = dba.find_protein_ids({'stringid': ensp})
-        if not pids:
-          pids = dba.find_protein_ids({'sym': sym})
-          if not pids:
-            notfnd.add(k)
-            logger.warning(f"No protein found for {k}")
-            continue
-        k2pids[k] = pids # save this mapping so we only lookup each ENSP|sym once
+      pids = res.resolve_protein_ids({'stringid': ensp}, {'sym': sym})
+      if not pids:
+        notfnd.add(k)
+        logger.warning(f"No protein found for {k}")
+        continue
       dtype = 'JensenLab Experiment ' + row[4]
       for pid in pids:
-        rv = dba.ins_disease( {'protein_id': pid, 'dtype': dtype, 'name': row[3],
-                               'did': row[2], 'evidence': row[5], 'conf': row[6]} )
-        if rv:
-          dis_ct += 1
-          pmark[pid] = True
-        else:
-          dba_err_ct += 1
+        dis_rows.append( {'protein_id': pid, 'dtype': dtype, 'name': row[3],
+                          'did': row[2], 'evidence': row[5], 'conf': row[6]} )
+        pmark[pid] = True
+      if len(dis_rows) >= BULK_INS_SIZE:
+        (ins_ct, err_ct) = ins_rows(dba, 'disease', dis_rows)
+        dis_ct += ins_ct
+        dba_err_ct += err_ct
+        dis_rows = []
+    if dis_rows:
+      (ins_ct, err_ct) = ins_rows(dba, 'disease', dis_rows)
+      dis_ct += ins_ct
+      dba_err_ct += err_ct
   print(f"{ct} lines processed.")
   print("  Inserted {} new disease rows for {} proteins".format(dis_ct, len(pmark)))
   if skip_ct:
@@ -272,9 +280,9 @@ def load_DISEASES(dba, logger, logfile):
   with open(fn, 'r') as ifh:
     tsvreader = csv.reader(ifh, delimiter='\t')
     ct = 0
-    k2pids = {} # ENSP|sym => list of TCRD protein ids
     pmark = {}
     notfnd = set()
+    dis_rows = []
     dis_ct = 0
     skip_ct = 0
     dba_err_ct = 0
@@ -291,30 +299,28 @@ def load_DISEASES(dba, logger, logfile):
       ensp = row[0]
       sym = row[1]
       k = "%s|%s"%(ensp,sym)
-      if k in k2pids:
-        # we've already found it
-        pids = k2pids[k]
-      elif k in notfnd:
+      if k in notfnd:
         # we've already not found it
         continue
-      else:
-        pids = dba.find_protein_ids({'stringid': ensp})
-        if not pids:
-          pids = dba.find_protein_ids({'sym': sym})
-          if not pids:
-            notfnd.add(k)
-            logger.warning(f"No protein found for {k}")
-            continue
-        k2pids[k] = pids # save this mapping so we only lookup each ENSP|sym once
+      pids = res.resolve_protein_ids({'stringid': ensp}, {'sym': sym})
+      if not pids:
+        notfnd.add(k)
+        logger.warning(f"No protein found for {k}")
+        continue
       dtype = 'JensenLab Text Mining'
       for pid in pids:
-        rv = dba.ins_disease( {'protein_id': pid, 'dtype': dtype, 'name': row[3],
-                               'did': row[2], 'zscore': row[4], 'conf': row[5]} )
-        if rv:
-          dis_ct += 1
-          pmark[pid] = True
-        else:
-          dba_err_ct += 1
+        dis_rows.append( {'protein_id': pid, 'dtype': dtype, 'name': row[3],
+                          'did': row[2], 'zscore': row[4], 'conf': row[5]} )
+        pmark[pid] = True
+      if len(dis_rows) >= BULK_INS_SIZE:
+        (ins_ct, err_ct) = ins_rows(dba, 'disease', dis_rows)
+        dis_ct += ins_ct
+        dba_err_ct += err_ct
+        dis_rows = []
+    if dis_rows:
+      (ins_ct, err_ct) = ins_rows(dba, 'disease', dis_rows)
+      dis_ct += ins_ct
+      dba_err_ct += err_ct
   print(f"{ct} lines processed.")
   print("  Inserted {} new disease rows for {} proteins".format(dis_ct, len(pmark)))
   if skip_ct:
@@ -355,6 +361,8 @@ if __name__ == '__main__':
   download_DISEASES(args)
 
   start_time = time.time()
+  # ENSP/symbol => protein id lookups are done from memory
+  res = Resolver(dba, xtypes=['STRING'], targets=False, snapshot_dir=RESOLVER_DIR)
   print("\nUpdating JensenLab PubMed Text-mining Scores...")
   # delete existing pmscores
   rv = dba.del_all_rows('pmscore')
@@ -372,7 +380,7 @@ if __name__ == '__main__':
     print(f"Error updating 'JensenLab PubMed Score' tdl_info values. Exiting.")
     exit(1)
   # load new pmsores and update 'JensenLab PubMed Score' TDL Infos
-  load_pmscores(dba, logger, logfile)
+  load_pmscores(dba, res, logger, logfile)
   # update dataset
   upds = {'app': PROGRAM, 'app_version': __version__,
           'source': f"File {JL_BASE_URL}KMC/{PM_SCORES_FILE}",
@@ -389,12 +397,14 @@ if __name__ == '__main__':
     print(f"Error deleting JensenLab rows from disease. Exiting.")
     exit(1)
   # load new DISEAESES
-  load_DISEASES(dba, logger, logfile)
+  load_DISEASES(dba, res, logger, logfile)
   # update dataset
   upds = {'app': PROGRAM, 'app_version': __version__,
           'datetime': time.strftime("%Y-%m-%d %H:%M:%S")}
   rv = dba.upd_dataset_by_name('JensenLab DISEASES', upds)
   assert rv, "Error updating dataset 'JensenLab DISEASES'. Exiting."
+  # PubMed scores and disease counts are in target_summary
+  refresh_target_summary(dba, logfile)
 
   elapsed = time.time() - start_time
   print("\n{}: Done. Elapsed time: {}\n".format(PROGRAM, slmf.secs2str(elapsed)))